@@ -0,0 +1,90 @@
+import math
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+import events
+import models
+
+DEFAULT_COOLDOWN_SECONDS = 3600
+
+threshold_table = models.StockThreshold.__table__
+
+
+def default_restore_level(low_level: int) -> int:
+    # Re-arm 20% (at least one unit) above the alert level
+    return low_level + max(1, math.ceil(low_level * 0.2))
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _set_state(db: Session, threshold_id: int, old_state: str, values: dict) -> bool:
+    # Conditional on the state we read, so concurrent writers fire a crossing once
+    result = db.execute(
+        threshold_table.update().where(
+            threshold_table.c.id == threshold_id,
+            threshold_table.c.state == old_state
+        ).values(**values)
+    )
+    return result.rowcount == 1
+
+
+def evaluate(db: Session, keys: Iterable[Tuple[int, int]]):
+    """
+    Check the thresholds of the (foodbank_id, food_item_id) pairs a write just
+    touched, in the writer's transaction. Crossing down to low_level records a
+    StockAlert (unless one was raised within the cooldown) and publishes
+    "stock.low"; climbing back to restore_level re-arms and publishes
+    "stock.restored". Untouched rows are never scanned.
+    """
+    keys = list(keys)
+    if not keys:
+        return
+
+    rows = db.query(
+        models.StockThreshold,
+        models.InventoryItem.quantity,
+        models.InventoryItem.reserved
+    ).join(
+        models.InventoryItem,
+        (models.InventoryItem.foodbank_id == models.StockThreshold.foodbank_id) &
+        (models.InventoryItem.food_item_id == models.StockThreshold.food_item_id)
+    ).filter(
+        tuple_(models.StockThreshold.foodbank_id, models.StockThreshold.food_item_id).in_(keys)
+    ).all()
+
+    now = datetime.utcnow()
+    for threshold, quantity, reserved in rows:
+        available = (quantity or 0) - (reserved or 0)
+        payload = {
+            "foodbank_id": threshold.foodbank_id,
+            "food_item_id": threshold.food_item_id,
+            "available": available,
+            "low_level": threshold.low_level,
+        }
+
+        if threshold.state == "ok" and available <= threshold.low_level:
+            last_alert_at = _naive_utc(threshold.last_alert_at)
+            cooled_down = last_alert_at is None or (now - last_alert_at).total_seconds() >= threshold.cooldown_seconds
+            values = {"state": "low"}
+            if cooled_down:
+                values["last_alert_at"] = now
+            if not _set_state(db, threshold.id, "ok", values) or not cooled_down:
+                continue
+            alert = models.StockAlert(created_at=now, **payload)
+            db.add(alert)
+            db.flush()
+            events.publish(db, "stock.low", {"alert_id": alert.id, **payload})
+
+        elif threshold.state == "low" and available >= threshold.restore_level:
+            if _set_state(db, threshold.id, "low", {"state": "ok"}):
+                events.publish(db, "stock.restored", payload)
+
+        # The ORM copy is stale after the Core UPDATE
+        db.expire(threshold)
@@ -0,0 +1,478 @@
+import calendar
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+import models
+import reference
+import shards
+from jobs import JobContext, job
+
+# numpy is imported lazily inside the functions below to keep worker startup fast
+
+ANALYTICS_SNAPSHOT_DIR = os.getenv("ANALYTICS_SNAPSHOT_DIR", "./analytics_snapshot")
+ANALYTICS_SNAPSHOT_INTERVAL_SECONDS = 15 * 60
+ANALYTICS_FULL_REBUILD_HOURS = 24
+ANALYTICS_STALE_SECONDS = 2 * ANALYTICS_SNAPSHOT_INTERVAL_SECONDS
+
+STATUSES = ["Pending", "Assigned", "Fulfilled", "Cancelled"]
+NONE = -1
+
+# Column layouts: one raw little-endian file per column, row counts live in meta.json
+TABLE_COLUMNS = {
+    "requests": {
+        "id": "<i8",
+        "district": "<i4",        # code into dictionaries["district"]
+        "status": "<i1",          # code into dictionaries["status"]
+        "created_at": "<i8",      # epoch seconds
+        "fulfilled_at": "<i8",    # epoch seconds, -1 when not fulfilled
+        "assigned_to_id": "<i4",  # -1 when unassigned
+    },
+    "request_items": {
+        "request_id": "<i8",
+        "food_item": "<i4",       # code into dictionaries["food_item"]
+        "quantity": "<i4",
+    },
+    "inventory": {
+        "foodbank_id": "<i4",
+        "food_item": "<i4",
+        "quantity": "<i4",
+        "reserved": "<i4",
+    },
+}
+
+_write_lock = threading.Lock()
+
+
+def _epoch(value: Optional[datetime]) -> int:
+    if value is None:
+        return NONE
+    if value.tzinfo is not None:
+        return int(value.timestamp())
+    return calendar.timegm(value.timetuple())
+
+
+def _column_path(directory: str, table: str, column: str) -> str:
+    return os.path.join(directory, f"{table}.{column}.bin")
+
+
+def _meta_path(directory: str) -> str:
+    return os.path.join(directory, "meta.json")
+
+
+def _read_meta(directory: str = ANALYTICS_SNAPSHOT_DIR) -> Optional[dict]:
+    try:
+        with open(_meta_path(directory)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_meta(directory: str, meta: dict):
+    # Readers trust the row counts in meta.json, so it is replaced last and atomically
+    tmp_path = _meta_path(directory) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, _meta_path(directory))
+
+
+class _Dictionary:
+    def __init__(self, values: List[str]):
+        self.values = list(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+    def encode(self, value) -> int:
+        if value is None:
+            return NONE
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+
+def _request_rows(db: Session, model, min_id: int = 0):
+    return db.query(
+        model.id, model.district, model.status, model.created_at,
+        model.fulfilled_at, model.assigned_to_id
+    ).filter(model.id > min_id).order_by(model.id)
+
+
+def _item_rows(db: Session, model, min_request_id: int = 0):
+    return db.query(model.request_id, model.food_item_id, model.quantity).filter(
+        model.request_id > min_request_id
+    ).order_by(model.request_id)
+
+
+def _inventory_rows(db: Session):
+    return db.query(
+        models.InventoryItem.foodbank_id, models.InventoryItem.food_item_id,
+        models.InventoryItem.quantity, models.InventoryItem.reserved
+    ).all()
+
+
+def _food_item_names(*row_lists) -> Dict[int, str]:
+    # Food items live on the primary, so names come from the reference cache rather than a join
+    food_items = reference.food_items_by_id({row[1] for rows in row_lists for row in rows})
+    return {food_item_id: food_item.name for food_item_id, food_item in food_items.items()}
+
+
+def _encode_requests(rows, dictionaries: Dict[str, _Dictionary]):
+    import numpy as np
+
+    columns = TABLE_COLUMNS["requests"]
+    data = {column: [] for column in columns}
+    for request_id, district, status, created_at, fulfilled_at, assigned_to_id in rows:
+        data["id"].append(request_id)
+        data["district"].append(dictionaries["district"].encode(district or ""))
+        data["status"].append(dictionaries["status"].encode(status))
+        data["created_at"].append(_epoch(created_at))
+        data["fulfilled_at"].append(_epoch(fulfilled_at))
+        data["assigned_to_id"].append(assigned_to_id or NONE)
+    return {column: np.array(values, dtype=columns[column]) for column, values in data.items()}
+
+
+def _encode_items(rows, dictionaries: Dict[str, _Dictionary], names: Dict[int, str]):
+    import numpy as np
+
+    columns = TABLE_COLUMNS["request_items"]
+    data = {column: [] for column in columns}
+    for request_id, food_item_id, quantity in rows:
+        if food_item_id not in names:
+            continue
+        data["request_id"].append(request_id)
+        data["food_item"].append(dictionaries["food_item"].encode(names[food_item_id]))
+        data["quantity"].append(quantity or 0)
+    return {column: np.array(values, dtype=columns[column]) for column, values in data.items()}
+
+
+def _encode_inventory(rows, dictionaries: Dict[str, _Dictionary], names: Dict[int, str]):
+    import numpy as np
+
+    columns = TABLE_COLUMNS["inventory"]
+    data = {column: [] for column in columns}
+    for foodbank_id, food_item_id, quantity, reserved in rows:
+        if food_item_id not in names:
+            continue
+        data["foodbank_id"].append(foodbank_id)
+        data["food_item"].append(dictionaries["food_item"].encode(names[food_item_id]))
+        data["quantity"].append(quantity or 0)
+        data["reserved"].append(reserved or 0)
+    return {column: np.array(values, dtype=columns[column]) for column, values in data.items()}
+
+
+def _concat_sorted(parts, key: str):
+    import numpy as np
+
+    merged = {column: np.concatenate([part[column] for part in parts]) for column in parts[0]}
+    order = np.argsort(merged[key], kind="stable")
+    return {column: values[order] for column, values in merged.items()}
+
+
+def _write_columns(directory: str, table: str, arrays, mode: str = "wb"):
+    for column, values in arrays.items():
+        with open(_column_path(directory, table, column), mode) as f:
+            values.tofile(f)
+
+
+def _truncate_columns(directory: str, table: str, rows: int):
+    # Drop rows a failed run appended after the row counts in meta.json
+    import numpy as np
+
+    for column, dtype in TABLE_COLUMNS[table].items():
+        os.truncate(_column_path(directory, table, column), rows * np.dtype(dtype).itemsize)
+
+
+def build_full_snapshot(db: Session, directory: str = ANALYTICS_SNAPSHOT_DIR) -> dict:
+    """
+    Rewrite every column file from the hot and archive tables.
+    Built in a sibling directory and swapped in, so readers never see a partial snapshot.
+    Shards are read in parallel; request ids never collide across shards.
+    """
+    def read_shard(shard_db: Session):
+        return (
+            [_request_rows(shard_db, model).all() for model in (models.ArchivedRequest, models.Request)],
+            [_item_rows(shard_db, model).all() for model in (models.ArchivedRequestItem, models.RequestItem)],
+            _inventory_rows(shard_db),
+            shard_db.query(models.RequestStatusEvent.id).order_by(
+                models.RequestStatusEvent.id.desc()
+            ).limit(1).scalar() or 0,
+        )
+
+    shard_rows = list(shards.fan_out(read_shard, db=db).values())
+    request_rows = [rows for requests, _, _, _ in shard_rows for rows in requests]
+    item_rows = [rows for _, items, _, _ in shard_rows for rows in items]
+    inventory_rows = [row for _, _, rows, _ in shard_rows for row in rows]
+    names = _food_item_names(inventory_rows, *item_rows)
+
+    dictionaries = {
+        "district": _Dictionary([]),
+        "status": _Dictionary(STATUSES),
+        "food_item": _Dictionary([]),
+    }
+    requests = _concat_sorted([_encode_requests(rows, dictionaries) for rows in request_rows], "id")
+    items = _concat_sorted([_encode_items(rows, dictionaries, names) for rows in item_rows], "request_id")
+    inventory = _encode_inventory(inventory_rows, dictionaries, names)
+    last_event_id = max(last_event for _, _, _, last_event in shard_rows)
+
+    now = datetime.utcnow().isoformat()
+    meta = {
+        "generated_at": now,
+        "full_built_at": now,
+        "rows": {
+            "requests": int(len(requests["id"])),
+            "request_items": int(len(items["request_id"])),
+            "inventory": int(len(inventory["foodbank_id"])),
+        },
+        "dictionaries": {name: dictionary.values for name, dictionary in dictionaries.items()},
+        "request_watermark": int(requests["id"][-1]) if len(requests["id"]) else 0,
+        "event_watermark": last_event_id,
+    }
+
+    tmp_dir = directory + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    _write_columns(tmp_dir, "requests", requests)
+    _write_columns(tmp_dir, "request_items", items)
+    _write_columns(tmp_dir, "inventory", inventory)
+    _write_meta(tmp_dir, meta)
+
+    old_dir = directory + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(directory):
+        os.rename(directory, old_dir)
+    os.rename(tmp_dir, directory)
+    # Open memory maps keep the old inodes alive until readers drop them
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return meta
+
+
+def append_snapshot(db: Session, meta: dict, directory: str = ANALYTICS_SNAPSHOT_DIR) -> dict:
+    """
+    Bring an existing snapshot up to date without rewriting it: append
+    requests and items created since the last run, patch status/assignment
+    in place for requests with new status events, and rewrite the small
+    inventory table.
+    """
+    import numpy as np
+
+    dictionaries = {name: _Dictionary(values) for name, values in meta["dictionaries"].items()}
+    watermark = meta["request_watermark"]
+    rows = meta["rows"]
+
+    item_rows = _item_rows(db, models.RequestItem, min_request_id=watermark).all()
+    inventory_rows = _inventory_rows(db)
+    names = _food_item_names(item_rows, inventory_rows)
+    new_requests = _encode_requests(_request_rows(db, models.Request, min_id=watermark), dictionaries)
+    new_items = _encode_items(item_rows, dictionaries, names)
+    # Items are only ever added together with their request, so the id watermark covers them too.
+    # meta.json is written last, so rows past its counts are left over from a run that failed
+    _truncate_columns(directory, "requests", rows["requests"])
+    _truncate_columns(directory, "request_items", rows["request_items"])
+    _write_columns(directory, "requests", new_requests, mode="ab")
+    _write_columns(directory, "request_items", new_items, mode="ab")
+
+    events = db.query(models.RequestStatusEvent.id, models.RequestStatusEvent.request_id).filter(
+        models.RequestStatusEvent.id > meta["event_watermark"],
+        models.RequestStatusEvent.request_id <= watermark
+    ).all()
+    last_event_id = max([event.id for event in events], default=meta["event_watermark"])
+    changed_ids = sorted({event.request_id for event in events})
+    if changed_ids and rows["requests"]:
+        ids = np.memmap(_column_path(directory, "requests", "id"), dtype="<i8", mode="r", shape=(rows["requests"],))
+        patches = {
+            column: np.memmap(
+                _column_path(directory, "requests", column),
+                dtype=TABLE_COLUMNS["requests"][column], mode="r+", shape=(rows["requests"],)
+            )
+            for column in ("status", "fulfilled_at", "assigned_to_id")
+        }
+        current = _request_rows(db, models.Request).filter(models.Request.id.in_(changed_ids)).all()
+        for request_id, _, status, _, fulfilled_at, assigned_to_id in current:
+            position = int(np.searchsorted(ids, request_id))
+            if position < len(ids) and ids[position] == request_id:
+                patches["status"][position] = dictionaries["status"].encode(status)
+                patches["fulfilled_at"][position] = _epoch(fulfilled_at)
+                patches["assigned_to_id"][position] = assigned_to_id or NONE
+        for patch in patches.values():
+            patch.flush()
+        del ids, patches
+
+    inventory = _encode_inventory(inventory_rows, dictionaries, names)
+    _write_columns(directory, "inventory", inventory)
+
+    meta = dict(meta)
+    meta["generated_at"] = datetime.utcnow().isoformat()
+    meta["rows"] = {
+        "requests": rows["requests"] + int(len(new_requests["id"])),
+        "request_items": rows["request_items"] + int(len(new_items["request_id"])),
+        "inventory": int(len(inventory["foodbank_id"])),
+    }
+    meta["dictionaries"] = {name: dictionary.values for name, dictionary in dictionaries.items()}
+    if len(new_requests["id"]):
+        meta["request_watermark"] = int(new_requests["id"][-1])
+    meta["event_watermark"] = last_event_id
+    _write_meta(directory, meta)
+    return meta
+
+
+@job("analytics_snapshot", every=ANALYTICS_SNAPSHOT_INTERVAL_SECONDS)
+def refresh_snapshot(ctx: JobContext):
+    with _write_lock:
+        meta = _read_meta()
+        # Ids from different shards interleave, so an id watermark cannot append them
+        full_due = meta is None or ctx.payload.get("full") or shards.configured() or (
+            datetime.utcnow() - datetime.fromisoformat(meta["full_built_at"])
+            > timedelta(hours=ANALYTICS_FULL_REBUILD_HOURS)
+        )
+        if full_due:
+            meta = build_full_snapshot(ctx.db)
+        else:
+            meta = append_snapshot(ctx.db, meta)
+    return {"mode": "full" if full_due else "incremental", "rows": meta["rows"]}
+
+
+class Snapshot:
+    """
+    Read-only, memory-mapped view of the latest snapshot.
+    """
+
+    def __init__(self, meta: dict, directory: str = ANALYTICS_SNAPSHOT_DIR):
+        import numpy as np
+
+        self.meta = meta
+        self.dictionaries = meta["dictionaries"]
+        self.tables = {}
+        for table, columns in TABLE_COLUMNS.items():
+            count = meta["rows"][table]
+            self.tables[table] = {
+                column: np.memmap(_column_path(directory, table, column), dtype=dtype, mode="r", shape=(count,))
+                if count else np.empty(0, dtype=dtype)
+                for column, dtype in columns.items()
+            }
+
+    @property
+    def generated_at(self) -> datetime:
+        return datetime.fromisoformat(self.meta["generated_at"])
+
+    def freshness(self) -> dict:
+        age = (datetime.utcnow() - self.generated_at).total_seconds()
+        return {
+            "generated_at": self.generated_at,
+            "age_seconds": int(age),
+            "stale": age > ANALYTICS_STALE_SECONDS,
+        }
+
+
+_snapshot_cache = {"generated_at": None, "snapshot": None}
+
+
+def load_snapshot() -> Optional[Snapshot]:
+    meta = _read_meta()
+    if meta is None:
+        return None
+    if _snapshot_cache["generated_at"] != meta["generated_at"]:
+        _snapshot_cache["snapshot"] = Snapshot(meta)
+        _snapshot_cache["generated_at"] = meta["generated_at"]
+    return _snapshot_cache["snapshot"]
+
+
+def dashboard(snapshot: Snapshot) -> dict:
+    import numpy as np
+
+    requests = snapshot.tables["requests"]
+    statuses = snapshot.dictionaries["status"]
+    districts = snapshot.dictionaries["district"]
+    n_status = len(statuses)
+    # One pass: count every (district, status) pair at once
+    counts = np.bincount(
+        requests["district"].astype(np.int64) * n_status + requests["status"],
+        minlength=len(districts) * n_status
+    ).reshape(len(districts), n_status) if len(districts) else np.zeros((0, n_status), dtype=np.int64)
+    totals = counts.sum(axis=0) if len(districts) else np.zeros(n_status, dtype=np.int64)
+
+    def count(row, status):
+        return int(row[statuses.index(status)])
+
+    return {
+        "total_requests": int(len(requests["id"])),
+        "pending_requests": count(totals, "Pending"),
+        "assigned_requests": count(totals, "Assigned"),
+        "fulfilled_requests": count(totals, "Fulfilled"),
+        "district_stats": [
+            {
+                "district": district,
+                "total_requests": int(counts[code].sum()),
+                "pending_requests": count(counts[code], "Pending"),
+                "assigned_requests": count(counts[code], "Assigned"),
+                "fulfilled_requests": count(counts[code], "Fulfilled"),
+            }
+            for code, district in enumerate(districts)
+        ],
+    }
+
+
+def trends(snapshot: Snapshot, days: int) -> List[dict]:
+    import numpy as np
+
+    requests = snapshot.tables["requests"]
+    districts = snapshot.dictionaries["district"]
+    today = _epoch(datetime.utcnow()) // 86400
+    day = requests["created_at"] // 86400
+    mask = (day > today - days) & (day <= today)
+    if not mask.any():
+        return []
+    offsets = (day[mask] - (today - days + 1)).astype(np.int64)
+    counts = np.bincount(
+        offsets * len(districts) + requests["district"][mask],
+        minlength=days * len(districts)
+    ).reshape(days, len(districts))
+
+    points = []
+    for offset, code in zip(*np.nonzero(counts)):
+        date = datetime.fromtimestamp(int(today - days + 1 + offset) * 86400, tz=timezone.utc).date()
+        points.append({
+            "date": date.isoformat(),
+            "district": districts[code],
+            "requests": int(counts[offset, code]),
+        })
+    return points
+
+
+def shortfall(snapshot: Snapshot) -> List[dict]:
+    import numpy as np
+
+    requests = snapshot.tables["requests"]
+    items = snapshot.tables["request_items"]
+    inventory = snapshot.tables["inventory"]
+    statuses = snapshot.dictionaries["status"]
+    food_items = snapshot.dictionaries["food_item"]
+    n_items = len(food_items)
+
+    # Join items to their request's status via the sorted id column
+    positions = np.searchsorted(requests["id"], items["request_id"])
+    positions = np.clip(positions, 0, max(len(requests["id"]) - 1, 0))
+    found = (requests["id"][positions] == items["request_id"]) if len(requests["id"]) else np.zeros(0, dtype=bool)
+    open_codes = [statuses.index("Pending"), statuses.index("Assigned")]
+    is_open = found & np.isin(requests["status"][positions], open_codes) if len(found) else found
+
+    requested = np.bincount(items["food_item"][is_open], weights=items["quantity"][is_open], minlength=n_items)
+    on_hand = np.bincount(inventory["food_item"], weights=inventory["quantity"], minlength=n_items)
+    reserved = np.bincount(inventory["food_item"], weights=inventory["reserved"], minlength=n_items)
+
+    return [
+        {
+            "food_item": food_items[code],
+            "requested": int(requested[code]),
+            "on_hand": int(on_hand[code]),
+            "reserved": int(reserved[code]),
+            "shortfall": int(max(requested[code] - on_hand[code], 0)),
+        }
+        for code in np.argsort(-(requested - on_hand), kind="stable")
+    ]
@@ -0,0 +1,73 @@
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import models
+import shards
+from jobs import JobContext, job
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVE_INTERVAL_SECONDS = 24 * 60 * 60
+CLOSED_STATUSES = ("Fulfilled", "Cancelled")
+
+ARCHIVED_REQUEST_COLUMNS = (
+    "id", "tracking_number", "user_id", "location", "district", "latitude",
+    "longitude", "status", "assigned_to_id", "created_at", "fulfilled_at",
+)
+ARCHIVED_ITEM_COLUMNS = ("id", "request_id", "food_item_id", "quantity")
+
+requests_table = models.Request.__table__
+request_items_table = models.RequestItem.__table__
+archive_table = models.ArchivedRequest.__table__
+archive_items_table = models.ArchivedRequestItem.__table__
+
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Move one batch of requests closed before `cutoff` (and their items) into
+    the archive tables in a single short transaction. Returns the number of
+    requests moved.
+    """
+    request_ids = [row.id for row in db.query(models.Request.id).filter(
+        models.Request.status.in_(CLOSED_STATUSES),
+        func.coalesce(models.Request.fulfilled_at, models.Request.created_at) < cutoff
+    ).order_by(models.Request.id).limit(batch_size)]
+    if not request_ids:
+        return 0
+
+    db.execute(archive_table.insert().from_select(
+        ARCHIVED_REQUEST_COLUMNS,
+        select(*[requests_table.c[column] for column in ARCHIVED_REQUEST_COLUMNS]).where(
+            requests_table.c.id.in_(request_ids)
+        )
+    ))
+    db.execute(archive_items_table.insert().from_select(
+        ARCHIVED_ITEM_COLUMNS,
+        select(*[request_items_table.c[column] for column in ARCHIVED_ITEM_COLUMNS]).where(
+            request_items_table.c.request_id.in_(request_ids)
+        )
+    ))
+    db.execute(request_items_table.delete().where(request_items_table.c.request_id.in_(request_ids)))
+    db.execute(requests_table.delete().where(requests_table.c.id.in_(request_ids)))
+    db.commit()
+    return len(request_ids)
+
+
+@job("archive_closed_requests", every=ARCHIVE_INTERVAL_SECONDS)
+def archive_closed_requests(ctx: JobContext):
+    cutoff = datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+    # Each shard archives its own requests, in parallel
+    def archive_shard(db: Session) -> int:
+        archived = 0
+        while True:
+            moved = archive_batch(db, cutoff)
+            if not moved:
+                break
+            archived += moved
+        return archived
+
+    return {"archived": sum(shards.fan_out(archive_shard, db=ctx.db).values())}
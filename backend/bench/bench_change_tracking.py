@@ -0,0 +1,85 @@
+"""
+Cost of the sync change-tracking triggers on request writes: status and
+assignment updates, one per transaction, with every trigger installed, with
+only the change_seq trigger, and with none. On SQLite each tracked write also
+rewrites the row and the single change_counter row; scope changes add a
+tombstone row. Threads write disjoint rows to show serialization.
+
+    python bench/bench_change_tracking.py --updates 2000 --threads 1 4
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import common
+from sqlalchemy import text
+
+from database import engine, is_postgres
+from sync import ensure_change_tracking
+
+# Trigger names per backend: (change_seq, scope tombstone)
+TRIGGERS = {
+    "sqlite": ("requests_seq_au", "requests_scope_au"),
+    "postgresql": ("requests_change_seq", "requests_scope_tombstone"),
+}
+
+
+def _drop(names):
+    with engine.begin() as conn:
+        for name in names:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name} ON requests" if is_postgres(conn)
+                              else f"DROP TRIGGER IF EXISTS {name}"))
+
+
+def _update(request_id: int, number: int, foodbank_id: int):
+    # Alternates in and out of the district's Pending view, so every write is a scope change
+    assigned = number % 2 == 0
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE requests SET status = :status, assigned_to_id = :foodbank_id WHERE id = :id"), {
+            "status": "Assigned" if assigned else "Pending",
+            "foodbank_id": foodbank_id if assigned else None,
+            "id": request_id,
+        })
+
+
+def _run(request_ids, foodbank_id: int, updates: int, threads: int) -> float:
+    def worker(offset: int):
+        for number in range(offset, updates, threads):
+            _update(request_ids[number % len(request_ids)], number // len(request_ids), foodbank_id)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    return updates / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--requests", type=int, default=10_000, help="requests seeded before the runs")
+    args = parser.parse_args()
+
+    ids = common.seed(requests=args.requests)
+    seq_trigger, scope_trigger = TRIGGERS[engine.dialect.name]
+    configurations = (("all triggers", []), ("change_seq only", [scope_trigger]), ("none", [seq_trigger, scope_trigger]))
+
+    print(f"{engine.dialect.name}, {args.updates} single-row updates per run")
+    print(f"{'triggers':<16} " + " ".join(f"{f'{threads} thread(s) upd/s':>20}" for threads in args.threads))
+    rates = {}
+    try:
+        for name, dropped in configurations:
+            ensure_change_tracking(engine)
+            _drop(dropped)
+            _run(ids["request_ids"], ids["foodbank_ids"][0], max(1, args.updates // 10), 1)  # warm up
+            rates[name] = [_run(ids["request_ids"], ids["foodbank_ids"][0], args.updates, threads)
+                           for threads in args.threads]
+            print(f"{name:<16} " + " ".join(f"{rate:>20.0f}" for rate in rates[name]))
+    finally:
+        ensure_change_tracking(engine)
+    overhead = (rates["none"][0] / rates["all triggers"][0] - 1) * 100
+    print(f"tracking overhead at 1 thread: {overhead:.0f}% more time per update")
+
+
+if __name__ == "__main__":
+    main()
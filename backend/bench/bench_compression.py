@@ -0,0 +1,69 @@
+"""
+CPU cost against bytes saved for each response encoding, per endpoint. Bodies
+are fetched uncompressed from the app, then compressed at the per-response
+level the middleware uses and at the maximum level used for precompressed
+payloads. Encodings whose module is not installed are skipped.
+
+    python bench/bench_compression.py --requests 2000 --runs 5
+"""
+import argparse
+import statistics
+import time
+
+import common
+from fastapi.testclient import TestClient
+
+import compression
+from main import app
+
+# (name, path, user, levels actually served); the reference payloads are
+# compressed once per change at the maximum level
+ENDPOINTS = (
+    ("requests", "/api/requests", "org", compression.DYNAMIC_LEVELS),
+    ("requests fast", "/api/requests?fast=true", "org", compression.DYNAMIC_LEVELS),
+    ("dashboard", "/api/stats/dashboard", "org", compression.DYNAMIC_LEVELS),
+    ("workspace", "/api/foodbanks/me/workspace", "foodbank", compression.DYNAMIC_LEVELS),
+    ("foodbanks", "/api/foodbanks", "org", compression.STATIC_LEVELS),
+    ("food items", "/api/food-items", "org", compression.STATIC_LEVELS),
+)
+
+
+def _cpu_per_call(body: bytes, encoding: str, level: int, runs: int):
+    samples = []
+    for _ in range(runs):
+        started = time.process_time()
+        compressed = compression.compress(body, encoding, level)
+        samples.append(time.process_time() - started)
+    return statistics.median(samples), len(compressed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    common.seed(requests=args.requests, assigned_fraction=0.5)
+    client = TestClient(app)
+
+    print(f"encodings: {', '.join(compression.ENCODINGS)}; "
+          f"bodies under {compression.COMPRESSION_MIN_BYTES} bytes are sent as is")
+    print(f"{'endpoint':<14} {'bytes':>9} {'encoding':>9} {'level':>6} {'compressed':>11} "
+          f"{'saved':>7} {'CPU ms':>8} {'µs / KB saved':>14}")
+    print("* = the level this endpoint serves")
+    for name, path, username, served in ENDPOINTS:
+        response = client.get(path, headers=dict(common.auth_headers(username), **{"Accept-Encoding": "identity"}))
+        assert response.status_code == 200, response.text
+        body = response.content
+        for encoding in compression.ENCODINGS:
+            for levels in (compression.DYNAMIC_LEVELS, compression.STATIC_LEVELS):
+                cpu, size = _cpu_per_call(body, encoding, levels[encoding], args.runs)
+                saved = len(body) - size
+                per_kb = cpu * 1e6 / (saved / 1024) if saved > 0 else float("inf")
+                marker = "*" if levels is served else " "
+                print(f"{name:<14} {len(body):>9} {encoding:>9} {levels[encoding]:>5}{marker} {size:>11} "
+                      f"{saved / len(body) * 100:>6.1f}% {cpu * 1000:>8.2f} {per_kb:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Overhead of one rate limit check, for the in-memory and the shared SQLite
+backends, plus client address resolution behind a trusted proxy. Exits
+non-zero when a memory check exceeds the 20 µs budget.
+
+    python bench/bench_ratelimit.py --checks 200000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.requests import Request  # noqa: E402
+
+import ratelimit  # noqa: E402
+
+BUDGET_US = 20.0
+
+
+def _per_call_us(function, keys):
+    started = time.perf_counter()
+    for key in keys:
+        function(key)
+    return (time.perf_counter() - started) / len(keys) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checks", type=int, default=200_000)
+    args = parser.parse_args()
+
+    hot = [f"198.51.100.{n % 16}" for n in range(args.checks)]
+    spread = [f"10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}" for n in range(args.checks)]
+    results = []
+
+    memory = ratelimit.MemoryTokenBucketLimiter(rate=1000.0, capacity=1000.0)
+    results.append(("memory, 16 hot keys", _per_call_us(memory.check, hot), True))
+    memory = ratelimit.MemoryTokenBucketLimiter(rate=1.0, capacity=10.0, max_keys=args.checks // 4)
+    results.append(("memory, evicting keys", _per_call_us(memory.check, spread), True))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        shared = ratelimit.SQLiteTokenBucketLimiter("bench", rate=1000.0, capacity=1000.0,
+                                                    path=os.path.join(workdir, "rate_limits.db"))
+        sqlite_checks = hot[:max(1, args.checks // 20)]
+        results.append(("sqlite, 16 hot keys", _per_call_us(shared.check, sqlite_checks), False))
+
+    proxies = ratelimit.parse_networks("10.0.0.0/8")
+    request = Request({"type": "http", "method": "GET", "path": "/", "client": ("10.0.0.1", 1234),
+                       "headers": [(b"x-forwarded-for", b"198.51.100.7, 10.0.0.2")]})
+    results.append(("client_ip via proxy",
+                    _per_call_us(lambda _: ratelimit.client_ip(request, proxies), hot), False))
+    memory = ratelimit.MemoryTokenBucketLimiter(rate=1000.0, capacity=1000.0)
+    results.append(("memory via proxy",
+                    _per_call_us(lambda _: memory.check(ratelimit.client_ip(request, proxies)), hot), True))
+
+    print(f"{'check':<24} {'µs / call':>10}")
+    over_budget = False
+    for name, per_call, budgeted in results:
+        flag = "  over budget" if budgeted and per_call > BUDGET_US else ""
+        over_budget |= bool(flag)
+        print(f"{name:<24} {per_call:>10.2f}{flag}")
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
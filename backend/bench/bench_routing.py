@@ -0,0 +1,82 @@
+"""
+Latency of GET /foodbanks/{id}/route without the plan cache, for a foodbank
+with `--stops` assigned requests, and how much 2-opt/Or-opt shortened the
+nearest neighbour routes. Exits non-zero when the median exceeds 1 s.
+
+    python bench/bench_routing.py --stops 500 --vehicles 1 --runs 5
+"""
+import argparse
+import statistics
+import time
+
+import common
+from fastapi.testclient import TestClient
+
+import models
+import routing
+from database import SessionLocal
+from main import app
+
+BUDGET_SECONDS = 1.0
+
+
+def _nearest_neighbour_km(foodbank_id: int, vehicles: int, capacity) -> float:
+    import numpy as np
+
+    db = SessionLocal()
+    try:
+        foodbank = db.query(models.FoodBank).filter(models.FoodBank.id == foodbank_id).one()
+        stops = db.query(models.Request.latitude, models.Request.longitude).filter(
+            models.Request.assigned_to_id == foodbank_id, models.Request.status == "Assigned"
+        ).order_by(models.Request.id).all()
+    finally:
+        db.close()
+    dist = routing.distance_matrix([foodbank.latitude] + [stop[0] for stop in stops],
+                                   [foodbank.longitude] + [stop[1] for stop in stops])
+    # Unit demand: only comparable to the plan when no capacity is set
+    routes, _ = routing._nearest_neighbour(dist, np.ones(len(stops) + 1), vehicles, capacity)
+    return sum(routing._route_length(dist, route) for route in routes if route)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stops", type=int, default=500)
+    parser.add_argument("--vehicles", type=int, default=1)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    # Every request is assigned to its district's foodbank; the first one is "foodbank"'s
+    ids = common.seed(requests=args.stops * len(common.DISTRICTS), assigned_fraction=1.0)
+    foodbank_id = ids["foodbank_ids"][0]
+    client = TestClient(app)
+    headers = common.auth_headers("foodbank")
+    path = f"/api/foodbanks/{foodbank_id}/route?vehicles={args.vehicles}"
+
+    samples = []
+    for _ in range(args.runs):
+        routing._cache.clear()
+        started = time.perf_counter()
+        response = client.get(path, headers=headers)
+        samples.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.text
+    plan = response.json()
+    routed = sum(len(vehicle["stops"]) for vehicle in plan["vehicles"])
+
+    started = time.perf_counter()
+    client.get(path, headers=headers)
+    cached = time.perf_counter() - started
+
+    baseline_km = _nearest_neighbour_km(foodbank_id, args.vehicles, None)
+    median = statistics.median(samples)
+    print(f"{routed} stops, {args.vehicles} vehicle(s)")
+    print(f"cold plan      median {median * 1000:8.1f} ms   max {max(samples) * 1000:8.1f} ms")
+    print(f"cached plan           {cached * 1000:8.1f} ms")
+    print(f"distance       {plan['total_distance_km']:.1f} km vs nearest neighbour {baseline_km:.1f} km "
+          f"({(1 - plan['total_distance_km'] / baseline_km) * 100:.1f}% shorter)")
+    if median > BUDGET_SECONDS:
+        print(f"over the {BUDGET_SECONDS:.0f} s budget")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+CPU time to serve GET /api/requests per 10k rows, default (ORM objects and
+response_model validation) vs ?fast=true (column tuples encoded directly).
+
+    python bench/bench_serialization.py --requests 10000 --runs 5
+"""
+import argparse
+import statistics
+import time
+
+import common
+from fastapi.testclient import TestClient
+
+from main import app
+
+
+def _cpu_per_call(client, path, headers, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.process_time()
+        response = client.get(path, headers=headers)
+        samples.append(time.process_time() - started)
+        assert response.status_code == 200, response.text
+    return statistics.median(samples), len(response.content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10_000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    common.seed(requests=args.requests)
+    client = TestClient(app)
+    headers = dict(common.auth_headers("org"), **{"Accept-Encoding": "identity"})
+    # Warm up imports, query compilation and the connection pool
+    client.get("/api/requests?fast=true", headers=headers)
+
+    per_10k = 10_000 / args.requests
+    print(f"{'path':<10} {'CPU ms / 10k rows':>18} {'bytes':>12}")
+    results = {}
+    for name, path in (("default", "/api/requests"), ("fast", "/api/requests?fast=true")):
+        cpu, size = _cpu_per_call(client, path, headers, args.runs)
+        results[name] = cpu
+        print(f"{name:<10} {cpu * 1000 * per_10k:>18.1f} {size:>12}")
+    print(f"speedup    {results['default'] / results['fast']:>18.1f}x")
+
+
+if __name__ == "__main__":
+    main()
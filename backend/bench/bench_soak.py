@@ -0,0 +1,114 @@
+"""
+Memory soak under synthetic mixed traffic: submissions (signed in, public and
+idempotent retries), tracking, stock intakes, request lists, the dashboard,
+workspace, triage, routing, search and sync, with the job runner started.
+After each pass it takes a full collection and samples RSS, live ORM objects
+and open sessions. Exits non-zero when RSS grows by more than
+--max-rss-growth-mb over the level reached after warmup, or when live ORM
+objects or sessions never drop back to their warmup level. A job the runner
+happens to be running can hold a session at sample time, so the counts are
+not required to reach zero; leaked ones keep them up in every pass.
+
+    python bench/bench_soak.py --duration 300 --max-rss-growth-mb 32
+"""
+import argparse
+import itertools
+import time
+
+import common
+from fastapi.testclient import TestClient
+
+import diagnostics
+import ratelimit
+from main import app
+
+
+def _traffic(client, ids, counter):
+    """One pass of mixed traffic; returns the number of 5xx responses."""
+    org, foodbank, recipient = (common.auth_headers(name) for name in ("org", "foodbank", "recipient"))
+    foodbank_id, food_item_id = ids["foodbank_ids"][0], ids["food_item_ids"][0]
+    responses = []
+    for _ in range(10):
+        number = next(counter)
+        created = client.post("/api/requests", headers=recipient, json={
+            "location": f"Jalan {number}", "district": common.DISTRICTS[number % len(common.DISTRICTS)],
+            "latitude": 3.0, "longitude": 101.5, "items": [{"food_item_id": food_item_id, "quantity": 1}],
+        })
+        responses.append(created)
+        public = {"ic_number": f"{900000 + number:06d}-14-{number % 10000:04d}", "address": f"Jalan {number}",
+                  "district": common.DISTRICTS[0], "items": [{"food_item_id": food_item_id, "quantity": 1}]}
+        # Every call comes from the one test client address; refill its bucket
+        # so the retry reaches the idempotency check, not a 429
+        ratelimit.reset(ratelimit.public_submit_by_ip)
+        for _ in range(2):  # the second is an idempotent retry
+            responses.append(client.post("/api/public/requests", json=public,
+                                         headers={"Idempotency-Key": f"soak-{number}"}))
+        if created.status_code == 200:
+            responses.append(client.get(f"/api/public/track/{created.json()['tracking_number']}"))
+        responses.append(client.post(f"/api/foodbanks/{foodbank_id}/inventory", headers=foodbank,
+                                     json={"food_item_id": food_item_id, "quantity": 1}))
+    for path, headers in (
+        ("/api/requests?fast=true", foodbank),
+        ("/api/requests?district=Petaling", org),
+        ("/api/stats/dashboard", org),
+        ("/api/foodbanks/me/workspace", foodbank),
+        ("/api/requests/triage?k=50", org),
+        (f"/api/foodbanks/{foodbank_id}/route", foodbank),
+        ("/api/search?q=Jalan%201", org),
+        ("/api/sync?since=0&limit=500", foodbank),
+        ("/api/foodbanks", org),
+    ):
+        responses.append(client.get(path, headers=headers))
+    return sum(1 for response in responses if response.status_code >= 500)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=120, help="seconds to run after warmup")
+    parser.add_argument("--warmup-passes", type=int, default=5)
+    parser.add_argument("--max-rss-growth-mb", type=float, default=32)
+    parser.add_argument("--requests", type=int, default=5000, help="requests seeded before the run")
+    args = parser.parse_args()
+
+    ids = common.seed(requests=args.requests, assigned_fraction=0.3)
+    counter = itertools.count()
+    samples = []
+    with TestClient(app) as client:
+        deadline = None
+        while deadline is None or time.monotonic() < deadline:
+            errors = _traffic(client, ids, counter)
+            counts = diagnostics.object_counts(collect=True)
+            sample = {"rss": diagnostics.rss_bytes(), "orm": counts["orm_objects"],
+                      "sessions": counts["sessions"], "errors": errors}
+            samples.append(sample)
+            warmup = len(samples) <= args.warmup_passes
+            print(f"pass {len(samples):>4}{' (warmup)' if warmup else '         '}  "
+                  f"rss {sample['rss'] / 2**20:8.1f} MiB  orm objects {sample['orm']:>6}  "
+                  f"sessions {sample['sessions']:>3}  5xx {errors}", flush=True)
+            if deadline is None and not warmup:
+                deadline = time.monotonic() + args.duration
+
+    baseline = samples[args.warmup_passes - 1] if args.warmup_passes else samples[0]
+    measured = samples[args.warmup_passes:]
+    growth = max(sample["rss"] for sample in measured) - baseline["rss"]
+    failures = []
+    if growth > args.max_rss_growth_mb * 2**20:
+        failures.append(f"RSS grew {growth / 2**20:.1f} MiB after warmup (limit {args.max_rss_growth_mb} MiB)")
+    settled = samples[:args.warmup_passes] or samples[:1]
+    for key, label in (("orm", "ORM objects"), ("sessions", "sessions")):
+        floor = min(sample[key] for sample in settled)
+        lowest = min(sample[key] for sample in measured)
+        if lowest > floor:
+            failures.append(f"live {label} never dropped back to {floor} after warmup (lowest {lowest}), "
+                            f"so some outlived their requests")
+    if any(sample["errors"] for sample in samples):
+        failures.append(f"{sum(sample['errors'] for sample in samples)} responses were 5xx")
+
+    print(f"\n{len(measured)} passes after warmup, RSS growth {growth / 2**20:.1f} MiB")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Worker cold start: time from `import main` to the first served request, for a
+fresh database (schema created) and an up-to-date one (single version query).
+
+    python bench/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter so nothing is already imported
+CHILD = """
+import json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    response = client.get("/api/public/food-items")
+    served = time.perf_counter()
+assert response.status_code == 200, response.text
+print(json.dumps({"import_s": imported - started, "first_request_s": served - started}))
+"""
+
+
+def _run_once(database_url: str, workdir: str) -> dict:
+    env = dict(os.environ, DATABASE_URL=database_url,
+               ANALYTICS_SNAPSHOT_DIR=os.path.join(workdir, "analytics_snapshot"),
+               COVERAGE_DIR=os.path.join(workdir, "coverage"),
+               EXPORT_DIR=os.path.join(workdir, "exports"))
+    env.pop("TRAFFIC_CAPTURE_PATH", None)
+    output = subprocess.run([sys.executable, "-c", CHILD], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="b40-bench-startup-")
+    try:
+        results = {"fresh": [], "up_to_date": []}
+        for run in range(args.runs):
+            database_url = f"sqlite:///{workdir}/startup-{run}.db"
+            results["fresh"].append(_run_once(database_url, workdir))
+            results["up_to_date"].append(_run_once(database_url, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'database':<12} {'import (ms)':>12} {'first request (ms)':>19}")
+    for name, samples in results.items():
+        imported = statistics.median(sample["import_s"] for sample in samples) * 1000
+        served = statistics.median(sample["first_request_s"] for sample in samples) * 1000
+        print(f"{name:<12} {imported:>12.1f} {served:>19.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Shared setup for the benchmarks: a throwaway database, the app and seeded data.
+Import this before anything from the backend so DATABASE_URL is set first.
+"""
+import atexit
+import os
+import random
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix="b40-bench-")
+atexit.register(shutil.rmtree, WORKDIR, ignore_errors=True)
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{WORKDIR}/bench.db")
+os.environ.setdefault("ANALYTICS_SNAPSHOT_DIR", os.path.join(WORKDIR, "analytics_snapshot"))
+os.environ.setdefault("COVERAGE_DIR", os.path.join(WORKDIR, "coverage"))
+os.environ.setdefault("EXPORT_DIR", os.path.join(WORKDIR, "exports"))
+os.environ["RATE_LIMIT_BACKEND"] = "memory"
+os.environ.pop("TRAFFIC_CAPTURE_PATH", None)
+sys.path.insert(0, BACKEND_DIR)
+
+import auth  # noqa: E402
+import models  # noqa: E402
+from database import SessionLocal, engine  # noqa: E402
+from schema_version import ensure_schema  # noqa: E402
+
+DISTRICTS = ("Petaling", "Klang", "Gombak", "Hulu Langat", "Sepang")
+SEED_BATCH_SIZE = 2000
+
+ensure_schema(engine)
+
+
+def auth_headers(username: str) -> dict:
+    return {"Authorization": f"Bearer {auth.create_access_token({'sub': username})}"}
+
+
+def seed(requests: int = 10_000, items_per_request: int = 2, assigned_fraction: float = 0.0,
+         seed_value: int = 40) -> dict:
+    """
+    Users "org", "foodbank" and "recipient", one foodbank per district
+    (the first owned by "foodbank"), a few food items and `requests`
+    requests spread over the districts. Returns the ids created.
+    """
+    rng = random.Random(seed_value)
+    db = SessionLocal()
+    try:
+        users = [models.User(username=username, email=f"{username}@example.com", hashed_password="",
+                             role=role, is_active=True)
+                 for username, role in (("org", "org"), ("foodbank", "foodbank"), ("recipient", "user"))]
+        db.add_all(users)
+        db.flush()
+        foodbanks = [
+            models.FoodBank(name=f"{district} Food Bank", location="Jalan 1", district=district,
+                            contact_info="03-0000000", admin_id=users[1].id,
+                            latitude=3.0 + index * 0.05, longitude=101.5 + index * 0.05)
+            for index, district in enumerate(DISTRICTS)
+        ]
+        food_items = [models.FoodItem(name=name, icon=f"{name}.png", category=category)
+                      for name, category in (("Rice", "Basic"), ("Oil", "Basic"), ("Eggs", "Protein"),
+                                             ("Infant formula", "Baby"))]
+        db.add_all(foodbanks + food_items)
+        db.commit()
+
+        started = datetime.utcnow() - timedelta(days=30)
+        for batch_start in range(0, requests, SEED_BATCH_SIZE):
+            rows = []
+            for number in range(batch_start, min(requests, batch_start + SEED_BATCH_SIZE)):
+                district_index = number % len(DISTRICTS)
+                assigned = rng.random() < assigned_fraction
+                rows.append({
+                    "tracking_number": f"B40-{number:08d}",
+                    "user_id": users[2].id,
+                    "location": f"Jalan {number}",
+                    "district": DISTRICTS[district_index],
+                    "latitude": foodbanks[district_index].latitude + rng.uniform(-0.05, 0.05),
+                    "longitude": foodbanks[district_index].longitude + rng.uniform(-0.05, 0.05),
+                    "status": "Assigned" if assigned else "Pending",
+                    "assigned_to_id": foodbanks[district_index].id if assigned else None,
+                    "created_at": started + timedelta(seconds=number * 60),
+                })
+            db.execute(models.Request.__table__.insert(), rows)
+        request_ids = [row[0] for row in db.query(models.Request.id).order_by(models.Request.id)]
+        item_rows = [
+            {"request_id": request_id, "food_item_id": food_items[(request_id + offset) % len(food_items)].id,
+             "quantity": rng.randint(1, 5)}
+            for request_id in request_ids for offset in range(items_per_request)
+        ]
+        for batch_start in range(0, len(item_rows), SEED_BATCH_SIZE):
+            db.execute(models.RequestItem.__table__.insert(), item_rows[batch_start:batch_start + SEED_BATCH_SIZE])
+        db.commit()
+        return {
+            "foodbank_ids": [foodbank.id for foodbank in foodbanks],
+            "food_item_ids": [food_item.id for food_item in food_items],
+            "request_ids": request_ids,
+        }
+    finally:
+        db.close()
@@ -0,0 +1,217 @@
+import hashlib
+import hmac
+import json
+import os
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+from typing import Optional
+from urllib.parse import parse_qsl
+
+from starlette.datastructures import Headers
+
+from serialization import dumps
+
+# Opt-in: set TRAFFIC_CAPTURE_PATH to record traffic as JSON lines. Use
+# "{pid}" in the path when running several workers, e.g. capture-{pid}.jsonl.
+TRAFFIC_CAPTURE_PATH = os.getenv("TRAFFIC_CAPTURE_PATH")
+TRAFFIC_CAPTURE_SAMPLE_RATE = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", "1.0"))
+# Bodies larger than this are recorded by size only
+TRAFFIC_CAPTURE_MAX_BODY_BYTES = int(os.getenv("TRAFFIC_CAPTURE_MAX_BODY_BYTES", str(64 * 1024)))
+
+MASK = "***"
+SENSITIVE_KEYS = {
+    "password", "hashed_password", "access_token", "refresh_token", "token",
+    "claim_token", "secret", "authorization", "email", "ic", "ic_number", "nric",
+    "name", "first_name", "last_name", "full_name", "phone", "phone_number", "address",
+}
+# Identifiers the app keys per-person state on (guest users, rate limits).
+# They are replaced by a pseudonym rather than MASK, so replayed submitters
+# stay distinct instead of all sharing one guest user and one bucket
+PSEUDONYM_KEYS = {"email", "ic", "ic_number", "nric", "phone", "phone_number"}
+# Extra keys to mask, comma separated, e.g. "location,latitude,longitude"
+TRAFFIC_CAPTURE_MASK_KEYS = os.getenv("TRAFFIC_CAPTURE_MASK_KEYS", "")
+SENSITIVE_KEYS |= {key.strip().lower() for key in TRAFFIC_CAPTURE_MASK_KEYS.split(",") if key.strip()}
+# Malaysian IC numbers (YYMMDD-PB-###G) wherever they appear in free text
+IC_NUMBER_PATTERN = re.compile(r"\b\d{6}-?\d{2}-?\d{4}\b")
+# Headers replay needs to reproduce conditional and idempotent writes
+RECORDED_HEADERS = ("content-type", "if-match", "idempotency-key", "x-claimer-id")
+
+
+def pseudonym(salt: bytes, value: str) -> str:
+    """
+    Stable stand-in for `value` within one capture; without the salt it
+    cannot be matched back to the value.
+    """
+    return hmac.new(salt, value.encode(), hashlib.sha256).hexdigest()[:12]
+
+
+def _masked(key: str, value, salt: Optional[bytes]):
+    if salt is None or key not in PSEUDONYM_KEYS or value in (None, ""):
+        return MASK
+    if key == "email":
+        return f"{pseudonym(salt, str(value))}@example.com"
+    return pseudonym(salt, str(value))
+
+
+def sanitize(value, salt: Optional[bytes] = None):
+    """
+    Mask secrets and personal identifiers in decoded JSON/form data. With a
+    salt, identifiers in PSEUDONYM_KEYS become pseudonyms instead of MASK.
+    """
+    if isinstance(value, dict):
+        return {
+            key: _masked(str(key).lower(), item, salt) if str(key).lower() in SENSITIVE_KEYS
+            else sanitize(item, salt)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [sanitize(item, salt) for item in value]
+    if isinstance(value, str):
+        return IC_NUMBER_PATTERN.sub("******-**-****", value)
+    return value
+
+
+def _decode_body(content_type: str, body: bytes, salt: bytes) -> Optional[dict]:
+    try:
+        if content_type.startswith("application/json"):
+            return {"json": sanitize(json.loads(body), salt)}
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return {"form": sanitize(dict(parse_qsl(body.decode("utf-8"), keep_blank_values=True)), salt)}
+    except ValueError:
+        pass
+    return None
+
+
+def _actor(headers: Headers) -> Optional[str]:
+    """
+    Username from the bearer token, so replay can sign in as the same user.
+    The token itself is never recorded.
+    """
+    authorization = headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        from jose import jwt
+        return jwt.get_unverified_claims(authorization[7:]).get("sub")
+    except Exception:
+        return None
+
+
+class CaptureWriter:
+    """
+    Appends records from a background thread so capturing never blocks the
+    event loop on file I/O.
+    """
+
+    def __init__(self, path: str):
+        self.path = path.format(pid=os.getpid())
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def write(self, record: dict):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+                    self._thread.start()
+        self._queue.put(record)
+
+    def _run(self):
+        with open(self.path, "ab") as capture_file:
+            while True:
+                lines = [dumps(self._queue.get())]
+                # Drain whatever queued up meanwhile and write it in one go
+                while True:
+                    try:
+                        lines.append(dumps(self._queue.get_nowait()))
+                    except queue.Empty:
+                        break
+                capture_file.write(b"\n".join(lines) + b"\n")
+                capture_file.flush()
+
+
+class CaptureMiddleware:
+    """
+    Record sanitized request metadata and bodies (method, route template,
+    query, body, actor, timing, status) for replay.py. Client addresses and
+    identifiers such as IC numbers are replaced by pseudonyms keyed on a
+    per-process salt, so rate limits and guest users replay per client and
+    per submitter. Capture files still contain usernames and request contents; keep them
+    with the same care as a database snapshot.
+    """
+
+    def __init__(self, app, path: str, sample_rate: float = TRAFFIC_CAPTURE_SAMPLE_RATE):
+        self.app = app
+        self.writer = CaptureWriter(path)
+        self.sample_rate = sample_rate
+        self._salt = secrets.token_bytes(16)
+
+    def _client(self, scope) -> Optional[str]:
+        client = scope.get("client")
+        if not client:
+            return None
+        return pseudonym(self._salt, client[0])
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.time()
+        started_monotonic = time.monotonic()
+        chunks = []
+        body_size = 0
+        response = {"status": None, "bytes": 0, "stream": False}
+
+        async def receive_wrapper():
+            nonlocal body_size
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                body_size += len(body)
+                if body_size <= TRAFFIC_CAPTURE_MAX_BODY_BYTES:
+                    chunks.append(body)
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+                if message.get("more_body", False):
+                    response["stream"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            headers = Headers(scope=scope)
+            route = scope.get("route")
+            record = {
+                "ts": round(started, 6),
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path", None) or scope["path"],
+                "query": sanitize(dict(parse_qsl(scope.get("query_string", b"").decode("latin-1"),
+                                                 keep_blank_values=True)), self._salt),
+                "headers": {name: headers[name] for name in RECORDED_HEADERS if name in headers},
+                "actor": _actor(headers),
+                "client": self._client(scope),
+                "body_bytes": body_size,
+                # A 500 raised past the app never sent a response start
+                "status": response["status"] or 500,
+                "response_bytes": response["bytes"],
+                "duration_ms": round((time.monotonic() - started_monotonic) * 1000, 3),
+            }
+            if response["stream"]:
+                record["stream"] = True
+            if body_size and body_size <= TRAFFIC_CAPTURE_MAX_BODY_BYTES:
+                decoded = _decode_body(headers.get("content-type", ""), b"".join(chunks), self._salt)
+                if decoded is not None:
+                    record.update(decoded)
+            self.writer.write(record)
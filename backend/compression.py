@@ -0,0 +1,180 @@
+import gzip
+import os
+import threading
+from typing import Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional, gzip is always available
+    zstandard = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+# Bodies larger than this are compressed off the event loop
+COMPRESSION_THREAD_BYTES = 256 * 1024
+COMPRESSIBLE_TYPES = ("application/json", "application/geo+json", "text/")
+
+# Per-response levels favour CPU; cached payloads are compressed once, so use the maximum
+DYNAMIC_LEVELS = {"br": 4, "zstd": 3, "gzip": 6}
+STATIC_LEVELS = {"br": 11, "zstd": 19, "gzip": 9}
+
+
+def available_encodings():
+    encodings = []
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    encodings.append("gzip")
+    return encodings
+
+
+# In order of preference
+ENCODINGS = available_encodings()
+
+
+def compress(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the preferred encoding the client accepts (q=0 means refused).
+    """
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+
+    for encoding in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+
+def _is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _add_vary(headers: MutableHeaders):
+    vary = headers.get("vary")
+    if not vary:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = f"{vary}, Accept-Encoding"
+
+
+class PrecompressedBody:
+    """
+    A JSON body that is encoded once per encoding and then reused for every
+    response. The maximum levels suit payloads that change rarely; pass
+    DYNAMIC_LEVELS for ones invalidated by ordinary writes.
+    """
+
+    def __init__(self, body: bytes, levels: Dict[str, int] = STATIC_LEVELS):
+        self.body = body
+        self.levels = levels
+        self._encoded: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: str) -> bytes:
+        data = self._encoded.get(encoding)
+        if data is None:
+            with self._lock:
+                data = self._encoded.get(encoding)
+                if data is None:
+                    data = compress(self.body, encoding, self.levels[encoding])
+                    self._encoded[encoding] = data
+        return data
+
+
+def precompressed_response(accept_encoding: Optional[str], payload: PrecompressedBody) -> Response:
+    encoding = negotiate(accept_encoding or "") if len(payload.body) >= COMPRESSION_MIN_BYTES else None
+    response = Response(
+        content=payload.encoded(encoding) if encoding else payload.body,
+        media_type="application/json"
+    )
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    _add_vary(response.headers)
+    return response
+
+
+class CompressionMiddleware:
+    """
+    Compress complete JSON/text responses of at least `minimum_size` bytes with
+    the best encoding the client accepts. Streaming responses and responses
+    that already carry a Content-Encoding (precompressed payloads) pass through.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            if start_message is not None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                body = message.get("body", b"")
+                if (
+                    message.get("more_body", False)
+                    or "content-encoding" in headers
+                    or not _is_compressible(headers.get("content-type", ""))
+                    or len(body) < self.minimum_size
+                ):
+                    passthrough = True
+                else:
+                    if len(body) > COMPRESSION_THREAD_BYTES:
+                        body = await run_in_threadpool(compress, body, encoding, DYNAMIC_LEVELS[encoding])
+                    else:
+                        body = compress(body, encoding, DYNAMIC_LEVELS[encoding])
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(body))
+                    _add_vary(headers)
+                    message = {**message, "body": body}
+                await send(start_message)
+                start_message = None
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
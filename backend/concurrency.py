@@ -0,0 +1,93 @@
+import random
+import time
+from typing import Callable, Optional, TypeVar
+
+from fastapi import HTTPException, Response
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+T = TypeVar("T")
+
+MAX_CONFLICT_RETRIES = 5
+CONFLICT_RETRY_BASE_SECONDS = 0.01
+# PostgreSQL serialization failure and deadlock; SQLite reports a writer that
+# outlasted its busy timeout as "database is locked"
+TRANSIENT_PGCODES = {"40001", "40P01"}
+
+
+def etag_for(obj) -> str:
+    return f'"{obj.version}"'
+
+
+def set_etag(response: Response, obj):
+    response.headers["ETag"] = etag_for(obj)
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """
+    Parse an If-Match header into the version it names.
+    Returns None when the header is absent or "*".
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid If-Match header")
+
+
+def check_if_match(obj, if_match: Optional[str]):
+    expected = parse_if_match(if_match)
+    if expected is not None and expected != obj.version:
+        raise HTTPException(
+            status_code=409,
+            detail="Resource was modified by another user",
+            headers={"ETag": etag_for(obj)}
+        )
+
+
+def commit_or_conflict(db: Session):
+    """
+    Commit a versioned write. A concurrent writer that bumped the version
+    first makes the conditional UPDATE match no rows, which surfaces as 409.
+    """
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Resource was modified by another user")
+
+
+def is_transient_conflict(exc: DBAPIError) -> bool:
+    if getattr(exc.orig, "pgcode", None) in TRANSIENT_PGCODES:
+        return True
+    return "database is locked" in str(exc.orig)
+
+
+def retry_on_conflict(db: Session, operation: Callable[[], T], attempts: int = MAX_CONFLICT_RETRIES) -> T:
+    """
+    Run `operation` and commit, re-running it after a version conflict, a
+    deadlock or a lock timeout, with a short randomized backoff.
+    Only use this for commutative changes (e.g. quantity deltas) that are
+    safe to re-apply on top of whatever the other writer committed;
+    `operation` must re-read the rows it changes.
+    """
+    for attempt in range(attempts):
+        try:
+            result = operation()
+            db.commit()
+            return result
+        except StaleDataError:
+            db.rollback()
+        except DBAPIError as exc:
+            db.rollback()
+            if not is_transient_conflict(exc):
+                raise
+        time.sleep(random.uniform(0, CONFLICT_RETRY_BASE_SECONDS * 2 ** attempt))
+    
+    raise HTTPException(status_code=409, detail="Too many concurrent updates, please retry")
@@ -0,0 +1,180 @@
+import gc
+import os
+import threading
+import tracemalloc
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+import models
+
+# State is per worker process; every response carries the pid it came from
+MAX_SNAPSHOTS = 8
+DEFAULT_TRACE_FRAMES = 10
+# Allocations made by the tracing machinery itself are noise in every diff
+IGNORED_FILES = (
+    tracemalloc.__file__,
+    "<frozen importlib._bootstrap>",
+    "<frozen importlib._bootstrap_external>",
+    "<unknown>",
+)
+
+_snapshots = OrderedDict()
+_next_id = 1
+_lock = threading.Lock()
+
+
+def rss_bytes() -> int:
+    """
+    Current resident set size of this process (peak RSS where /proc is unavailable).
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        # ru_maxrss is in KiB on Linux and bytes on macOS
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if os.uname().sysname == "Darwin" else usage * 1024
+
+
+def _snapshot_info(snapshot_id: int, entry: dict) -> dict:
+    return {
+        "id": snapshot_id,
+        "taken_at": entry["taken_at"],
+        "traced_bytes": entry["traced_bytes"],
+        "rss_bytes": entry["rss_bytes"],
+    }
+
+
+def status() -> dict:
+    tracing = tracemalloc.is_tracing()
+    current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+    with _lock:
+        snapshots = [_snapshot_info(snapshot_id, entry) for snapshot_id, entry in _snapshots.items()]
+    return {
+        "pid": os.getpid(),
+        "rss_bytes": rss_bytes(),
+        "tracing": tracing,
+        "trace_frames": tracemalloc.get_traceback_limit() if tracing else 0,
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "gc_counts": list(gc.get_count()),
+        "snapshots": snapshots,
+    }
+
+
+def start(frames: int = DEFAULT_TRACE_FRAMES):
+    # Tracing slows allocation noticeably; stop it once the investigation is done
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop():
+    tracemalloc.stop()
+    with _lock:
+        _snapshots.clear()
+
+
+def take_snapshot() -> Optional[dict]:
+    """
+    Snapshot the traced allocations. Returns None when tracing is off. Only
+    the newest MAX_SNAPSHOTS are kept, since each one holds every trace.
+    """
+    global _next_id
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, filename) for filename in IGNORED_FILES]
+    )
+    entry = {
+        "snapshot": snapshot,
+        "taken_at": datetime.utcnow(),
+        "traced_bytes": tracemalloc.get_traced_memory()[0],
+        "rss_bytes": rss_bytes(),
+    }
+    with _lock:
+        snapshot_id = _next_id
+        _next_id += 1
+        _snapshots[snapshot_id] = entry
+        while len(_snapshots) > MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+    return _snapshot_info(snapshot_id, entry)
+
+
+def _get(snapshot_id: int) -> Optional[dict]:
+    with _lock:
+        return _snapshots.get(snapshot_id)
+
+
+def _site(trace_frames) -> list:
+    return [f"{frame.filename}:{frame.lineno}" for frame in trace_frames]
+
+
+def top_sites(snapshot_id: int, limit: int, group_by: str = "lineno") -> Optional[list]:
+    entry = _get(snapshot_id)
+    if entry is None:
+        return None
+    return [
+        {"site": _site(stat.traceback), "size_bytes": stat.size, "count": stat.count,
+         "size_diff_bytes": 0, "count_diff": 0}
+        for stat in entry["snapshot"].statistics(group_by)[:limit]
+    ]
+
+
+def diff(snapshot_id: int, against_id: Optional[int], limit: int, group_by: str = "lineno") -> Optional[dict]:
+    """
+    Allocation sites that grew the most between `against_id` (by default the
+    snapshot taken just before) and `snapshot_id`.
+    """
+    with _lock:
+        if against_id is None:
+            earlier = [other for other in _snapshots if other < snapshot_id]
+            against_id = earlier[-1] if earlier else None
+        entry, baseline = _snapshots.get(snapshot_id), _snapshots.get(against_id)
+    if entry is None or baseline is None:
+        return None
+
+    stats = entry["snapshot"].compare_to(baseline["snapshot"], group_by)
+    return {
+        "snapshot_id": snapshot_id,
+        "against_id": against_id,
+        "traced_bytes_diff": entry["traced_bytes"] - baseline["traced_bytes"],
+        "rss_bytes_diff": entry["rss_bytes"] - baseline["rss_bytes"],
+        "sites": [
+            {"site": _site(stat.traceback), "size_bytes": stat.size, "count": stat.count,
+             "size_diff_bytes": stat.size_diff, "count_diff": stat.count_diff}
+            for stat in stats[:limit]
+        ],
+    }
+
+
+def object_counts(collect: bool = True, limit: int = 50) -> dict:
+    """
+    Live ORM instances per model and open sessions with their identity map
+    sizes, found by walking the gc-tracked objects. ORM objects held after
+    their request finished point at a leaked session or cached result list.
+    """
+    if collect:
+        gc.collect()
+    models_count = Counter()
+    sessions = 0
+    identity_map_objects = 0
+    objects = gc.get_objects()
+    for obj in objects:
+        if isinstance(obj, models.Base):
+            models_count[type(obj).__name__] += 1
+        elif isinstance(obj, Session):
+            sessions += 1
+            identity_map_objects += len(obj.identity_map)
+    return {
+        "pid": os.getpid(),
+        "gc_objects": len(objects),
+        "orm_objects": sum(models_count.values()),
+        "models": dict(models_count.most_common(limit)),
+        "sessions": sessions,
+        "identity_map_objects": identity_map_objects,
+        "gc_garbage": len(gc.garbage),
+    }
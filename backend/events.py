@@ -0,0 +1,83 @@
+import asyncio
+import itertools
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+_subscribers = set()
+_lock = threading.Lock()
+_sequence = itertools.count(1)
+
+
+def publish(db: Session, topic: str, data: Dict[str, Any]):
+    """
+    Queue an event on the in-process change stream. It is delivered only
+    once `db` commits and dropped if the transaction rolls back.
+    """
+    db.info.setdefault("pending_events", []).append((topic, data))
+
+
+@event.listens_for(Session, "after_commit")
+def _deliver_after_commit(session):
+    for topic, data in session.info.pop("pending_events", []):
+        _deliver({
+            "id": next(_sequence),
+            "topic": topic,
+            "data": data,
+            "created_at": datetime.utcnow().isoformat(),
+        })
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("pending_events", None)
+
+
+class _Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, foodbank_id: Optional[int]):
+        self.loop = loop
+        self.foodbank_id = foodbank_id
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def offer(self, message: dict):
+        # Runs on the subscriber's loop; a slow consumer loses its oldest events
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+
+def _deliver(message: dict):
+    foodbank_id = message["data"].get("foodbank_id")
+    with _lock:
+        subscribers = list(_subscribers)
+    for subscriber in subscribers:
+        if subscriber.foodbank_id is not None and subscriber.foodbank_id != foodbank_id:
+            continue
+        # Commits happen on worker threads, subscribers live on the event loop
+        try:
+            subscriber.loop.call_soon_threadsafe(subscriber.offer, message)
+        except RuntimeError:
+            # Loop already closed; the subscription is being torn down
+            pass
+
+
+@contextmanager
+def subscribe(foodbank_id: Optional[int] = None):
+    """
+    Register an asyncio.Queue that receives events committed in this process,
+    optionally only those for one foodbank.
+    """
+    subscriber = _Subscriber(asyncio.get_running_loop(), foodbank_id)
+    with _lock:
+        _subscribers.add(subscriber)
+    try:
+        yield subscriber.queue
+    finally:
+        with _lock:
+            _subscribers.discard(subscriber)
@@ -0,0 +1,80 @@
+import csv
+import os
+import shutil
+import threading
+
+from sqlalchemy.orm import Session
+
+import models
+import shards
+from jobs import JobContext, job
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "./exports")
+EXPORT_BATCH_SIZE = 1000
+
+REQUEST_EXPORT_COLUMNS = (
+    "id", "tracking_number", "status", "district", "location",
+    "latitude", "longitude", "assigned_to_id", "created_at", "fulfilled_at",
+)
+
+
+def export_path(job_id: int) -> str:
+    return os.path.join(EXPORT_DIR, f"requests-{job_id}.csv")
+
+
+def _export_query(db: Session, payload: dict, model):
+    query = db.query(*[getattr(model, column) for column in REQUEST_EXPORT_COLUMNS])
+    if payload.get("status"):
+        query = query.filter(model.status == payload["status"])
+    if payload.get("district"):
+        query = query.filter(model.district == payload["district"])
+    return query.order_by(model.id)
+
+
+@job("export_requests")
+def export_requests(ctx: JobContext):
+    """
+    Write requests matching the optional status/district filters to a CSV
+    file, including closed requests that have been moved to the archive.
+    Shards are exported in parallel, each to its own part file, and the
+    parts are then concatenated.
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = export_path(ctx.job_id)
+    totals = shards.fan_out(lambda db: sum(
+        _export_query(db, ctx.payload, model).count() for model in (models.ArchivedRequest, models.Request)
+    ), db=ctx.db)
+    total = sum(totals.values())
+    progress = {"rows": 0}
+    lock = threading.Lock()
+
+    def export_part(db: Session) -> int:
+        rows = 0
+        with open(f"{path}.{shards.current(db)}", "w", newline="") as f:
+            writer = csv.writer(f)
+            for model in (models.ArchivedRequest, models.Request):
+                # Server-side cursor on PostgreSQL, so the export never holds every row in memory
+                query = _export_query(db, ctx.payload, model)
+                for row in query.execution_options(stream_results=True).yield_per(EXPORT_BATCH_SIZE):
+                    writer.writerow(row)
+                    rows += 1
+                    if rows % EXPORT_BATCH_SIZE == 0 and total:
+                        with lock:
+                            progress["rows"] += EXPORT_BATCH_SIZE
+                            done = progress["rows"]
+                        ctx.set_progress(done / total)
+        return rows
+
+    try:
+        rows = shards.fan_out(export_part, totals, db=ctx.db)
+        with open(path, "w", newline="") as f:
+            csv.writer(f).writerow(REQUEST_EXPORT_COLUMNS)
+            for shard in rows:
+                with open(f"{path}.{shard}", newline="") as part:
+                    shutil.copyfileobj(part, f)
+    finally:
+        for shard in totals:
+            if os.path.exists(f"{path}.{shard}"):
+                os.remove(f"{path}.{shard}")
+
+    return {"file": os.path.basename(path), "rows": sum(rows.values())}
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+import models
+import shards
+from jobs import JobContext, job
+
+IDEMPOTENCY_TTL = timedelta(hours=24)
+IDEMPOTENCY_CACHE_SIZE = 10000
+MAX_KEY_LENGTH = 255
+_LOCK_STRIPES = 64
+
+
+class _ResponseCache:
+    """
+    Bounded LRU of key -> (expires_at, fingerprint, response) in front of the
+    idempotency_keys table, so hot retries never reach the database.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[Optional[str], Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, fingerprint, response = entry
+            if expires_at <= datetime.utcnow():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return fingerprint, response
+
+    def put(self, key: str, fingerprint: Optional[str], response: Dict[str, Any], expires_at: datetime):
+        with self._lock:
+            self._entries[key] = (expires_at, fingerprint, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+_cache = _ResponseCache(IDEMPOTENCY_CACHE_SIZE)
+_key_locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+
+
+@contextmanager
+def key_lock(key: str):
+    """
+    Serialize concurrent retries of the same key within this process. Other
+    processes are serialized by the primary key on idempotency_keys.
+    """
+    lock = _key_locks[hash(key) % _LOCK_STRIPES]
+    with lock:
+        yield
+
+
+def fingerprint(method: str, path: str, body: Any) -> str:
+    """
+    Hash of the request a key was first used for. The body is canonicalized,
+    so a retry that reorders keys or whitespace still matches.
+    """
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{method}\n{path}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+def _check_fingerprint(stored: Optional[str], request_fingerprint: str):
+    if stored is not None and stored != request_fingerprint:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used for a different request"
+        )
+
+
+def lookup(db: Session, key: str, request_fingerprint: str) -> Optional[Dict[str, Any]]:
+    """
+    The response stored under `key`, or None. Raises 422 when the key was
+    used for a request with a different fingerprint.
+    """
+    cached = _cache.get(key)
+    if cached is not None:
+        _check_fingerprint(cached[0], request_fingerprint)
+        return cached[1]
+
+    stored = db.query(models.IdempotencyKey).filter(
+        models.IdempotencyKey.key == key,
+        models.IdempotencyKey.expires_at > datetime.utcnow()
+    ).first()
+    if stored is None:
+        return None
+
+    expires_at = stored.expires_at
+    if expires_at.tzinfo is not None:
+        expires_at = expires_at.astimezone(timezone.utc).replace(tzinfo=None)
+    _cache.put(key, stored.fingerprint, stored.response, expires_at)
+    _check_fingerprint(stored.fingerprint, request_fingerprint)
+    return stored.response
+
+
+def store(db: Session, key: str, request_fingerprint: str, response: Dict[str, Any]):
+    """
+    Save `response` under `key` in the caller's transaction; it becomes
+    visible to other processes when that transaction commits.
+    """
+    expires_at = datetime.utcnow() + IDEMPOTENCY_TTL
+    # Clear an expired row for the same key so the insert does not collide with it
+    db.query(models.IdempotencyKey).filter(
+        models.IdempotencyKey.key == key,
+        models.IdempotencyKey.expires_at <= datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.add(models.IdempotencyKey(key=key, fingerprint=request_fingerprint, response=response, expires_at=expires_at))
+
+
+@job("purge_idempotency_keys", every=60 * 60)
+def purge_expired_keys(ctx: JobContext):
+    now = datetime.utcnow()
+
+    def purge(db: Session) -> int:
+        removed = db.query(models.IdempotencyKey).filter(
+            models.IdempotencyKey.expires_at <= now
+        ).delete(synchronize_session=False)
+        db.commit()
+        return removed
+
+    return {"removed": sum(shards.fan_out(purge, db=ctx.db).values())}
@@ -0,0 +1,301 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import JSON, exists, literal, or_, select
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal, dialect_insert
+
+logger = logging.getLogger(__name__)
+
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+JOB_POLL_INTERVAL_SECONDS = 5
+JOB_RETRY_BASE_SECONDS = 30
+# A running job whose lease was not renewed for this long belongs to a dead
+# worker and is queued again; runners renew their leases every poll
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+jobs_table = models.Job.__table__
+
+
+class JobSpec:
+    def __init__(self, kind: str, handler: Callable, max_attempts: int, every: Optional[int]):
+        self.kind = kind
+        self.handler = handler
+        self.max_attempts = max_attempts
+        self.every = every
+
+
+JOB_HANDLERS: Dict[str, JobSpec] = {}
+
+
+def job(kind: str, max_attempts: int = 3, every: Optional[int] = None):
+    """
+    Register a job handler. The handler is called in a worker thread with a
+    JobContext and returns a JSON-serializable result dict (or None).
+    With `every` (seconds) the job is also enqueued periodically.
+    """
+    def decorator(handler: Callable):
+        JOB_HANDLERS[kind] = JobSpec(kind, handler, max_attempts, every)
+        return handler
+    return decorator
+
+
+class JobContext:
+    def __init__(self, db: Session, job: models.Job):
+        self.db = db
+        self.job_id = job.id
+        self.payload = job.payload or {}
+        self.attempt = job.attempts
+
+    def set_progress(self, progress: float):
+        # Reported from a separate session so it never commits the handler's work
+        db = SessionLocal()
+        try:
+            db.query(models.Job).filter(models.Job.id == self.job_id).update(
+                {models.Job.progress: max(0.0, min(progress, 1.0))}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+
+def enqueue(
+    db: Session,
+    kind: str,
+    payload: Optional[Dict[str, Any]] = None,
+    user_id: Optional[int] = None
+) -> models.Job:
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    db_job = models.Job(
+        kind=kind,
+        status="queued",
+        payload=payload or {},
+        max_attempts=JOB_HANDLERS[kind].max_attempts,
+        created_by_id=user_id
+    )
+    db.add(db_job)
+    db.commit()
+    db.refresh(db_job)
+    runner.wake()
+    return db_job
+
+
+def _claim_next_job() -> Optional[int]:
+    db = SessionLocal()
+    try:
+        while True:
+            job_id = db.query(models.Job.id).filter(
+                models.Job.status == "queued",
+                models.Job.run_after <= datetime.utcnow()
+            ).order_by(models.Job.run_after, models.Job.id).limit(1).scalar()
+            if job_id is None:
+                return None
+
+            # Conditional update so two runners never start the same job
+            claimed = db.query(models.Job).filter(
+                models.Job.id == job_id,
+                models.Job.status == "queued"
+            ).update({
+                models.Job.status: "running",
+                models.Job.attempts: models.Job.attempts + 1,
+                models.Job.locked_until: datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)
+            }, synchronize_session=False)
+            db.commit()
+            if claimed:
+                return job_id
+    finally:
+        db.close()
+
+
+def _run_job(job_id: int):
+    db = SessionLocal()
+    try:
+        db_job = db.query(models.Job).filter(models.Job.id == job_id).first()
+        if db_job is None:
+            return
+        spec = JOB_HANDLERS.get(db_job.kind)
+        try:
+            if spec is None:
+                raise ValueError(f"Unknown job kind: {db_job.kind}")
+            result = spec.handler(JobContext(db, db_job))
+        except Exception as e:
+            db.rollback()
+            logger.exception("Job %s (%s) failed on attempt %s", job_id, db_job.kind, db_job.attempts)
+            db_job.error = str(e)
+            db_job.locked_until = None
+            if spec is not None and db_job.attempts < db_job.max_attempts:
+                # Exponential backoff: 30s, 60s, 120s, ...
+                db_job.status = "queued"
+                db_job.run_after = datetime.utcnow() + timedelta(
+                    seconds=JOB_RETRY_BASE_SECONDS * 2 ** (db_job.attempts - 1)
+                )
+            else:
+                db_job.status = "failed"
+                db_job.finished_at = datetime.utcnow()
+            db.commit()
+            return
+
+        db_job.status = "succeeded"
+        db_job.progress = 1.0
+        db_job.result = result
+        db_job.error = None
+        db_job.finished_at = datetime.utcnow()
+        db_job.locked_until = None
+        db.commit()
+    finally:
+        db.close()
+
+
+def _renew_leases(job_ids):
+    if not job_ids:
+        return
+    db = SessionLocal()
+    try:
+        db.query(models.Job).filter(
+            models.Job.id.in_(job_ids),
+            models.Job.status == "running"
+        ).update({
+            models.Job.locked_until: datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _requeue_expired_jobs() -> int:
+    # Jobs whose runner died (crash or restart) stop renewing their lease;
+    # jobs that sibling workers are still running keep theirs
+    db = SessionLocal()
+    try:
+        count = db.query(models.Job).filter(
+            models.Job.status == "running",
+            or_(models.Job.locked_until.is_(None), models.Job.locked_until < datetime.utcnow())
+        ).update({
+            models.Job.status: "queued",
+            models.Job.locked_until: None
+        }, synchronize_session=False)
+        db.commit()
+        return count
+    finally:
+        db.close()
+
+
+def _enqueue_due_periodic_jobs() -> int:
+    """
+    Enqueue each periodic job once per `every` seconds unless one is already
+    queued or running. A single INSERT ... SELECT ... WHERE NOT EXISTS per
+    kind, with the unique dedupe_key for the current slot, so workers polling
+    at the same time cannot enqueue it twice.
+    """
+    db = SessionLocal()
+    enqueued = 0
+    try:
+        now = datetime.utcnow()
+        for spec in JOB_HANDLERS.values():
+            if not spec.every:
+                continue
+            pending = select(jobs_table.c.id).where(
+                jobs_table.c.kind == spec.kind,
+                jobs_table.c.status.in_(("queued", "running"))
+            )
+            row = select(
+                literal(spec.kind), literal("queued"), literal({}, JSON), literal(0.0), literal(0),
+                literal(spec.max_attempts), literal(now), literal(now),
+                literal(f"{spec.kind}:{int(time.time() // spec.every)}")
+            ).where(~exists(pending))
+            insert = dialect_insert(db, jobs_table).from_select([
+                "kind", "status", "payload", "progress", "attempts",
+                "max_attempts", "run_after", "created_at", "dedupe_key"
+            ], row).on_conflict_do_nothing(index_elements=[jobs_table.c.dedupe_key])
+            enqueued += db.execute(insert).rowcount
+        db.commit()
+    finally:
+        db.close()
+    if enqueued:
+        runner.wake()
+    return enqueued
+
+
+class JobRunner:
+    """
+    Runs queued jobs from the jobs table on a bounded thread pool inside the
+    API process. State lives in the database, so queued jobs survive restarts.
+    """
+
+    def __init__(self, concurrency: int = JOB_CONCURRENCY, poll_interval: float = JOB_POLL_INTERVAL_SECONDS):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._executor = None
+        self._loop = None
+        self._wake_event = None
+        self._task = None
+        self._running = set()
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="job")
+        self._wake_event = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._executor:
+            # Running jobs keep their status; their leases expire and another runner resumes them
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def wake(self):
+        if self._loop is not None and self._wake_event is not None:
+            self._loop.call_soon_threadsafe(self._wake_event.set)
+
+    async def _run(self):
+        slots = asyncio.Semaphore(self.concurrency)
+        while True:
+            self._wake_event.clear()
+            try:
+                await self._loop.run_in_executor(None, _renew_leases, list(self._running))
+                requeued = await self._loop.run_in_executor(None, _requeue_expired_jobs)
+                if requeued:
+                    logger.info("Resuming %d interrupted jobs", requeued)
+                await self._loop.run_in_executor(None, _enqueue_due_periodic_jobs)
+                while True:
+                    await slots.acquire()
+                    job_id = await self._loop.run_in_executor(None, _claim_next_job)
+                    if job_id is None:
+                        slots.release()
+                        break
+                    asyncio.create_task(self._execute(job_id, slots))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job runner loop failed")
+
+            try:
+                await asyncio.wait_for(self._wake_event.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, job_id: int, slots: asyncio.Semaphore):
+        self._running.add(job_id)
+        try:
+            await self._loop.run_in_executor(self._executor, _run_job, job_id)
+        except Exception:
+            logger.exception("Job %s crashed", job_id)
+        finally:
+            self._running.discard(job_id)
+            slots.release()
+            self.wake()
+
+
+runner = JobRunner()
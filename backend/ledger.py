@@ -0,0 +1,281 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import alerts
+import models
+import shards
+import workspace
+from database import dialect_insert
+from jobs import JobContext, job
+
+# Entries older than this are folded into one "compaction" entry per item
+LEDGER_RETENTION = timedelta(days=90)
+LEDGER_COMPACTION_INTERVAL_SECONDS = 6 * 60 * 60
+
+inventory_table = models.InventoryItem.__table__
+# Entries that take stock a foodbank must actually have available; manual
+# adjustments may still correct a count below what is reserved, but no entry
+# may take the count itself below zero
+STOCK_CHECKED_KINDS = {"reservation", "consumption"}
+
+
+def append(
+    db: Session,
+    entries: List[models.InventoryLedgerEntry],
+    expected_versions: Optional[Dict[Tuple[int, int], int]] = None
+) -> bool:
+    """
+    Append ledger entries and fold them into the inventory snapshot in the
+    caller's transaction. Snapshot rows are changed with relative
+    `quantity = quantity + delta` updates, so concurrent appends never
+    overwrite each other. When `expected_versions` names a (foodbank_id,
+    food_item_id) pair, that row is only updated at that version; False is
+    returned (and nothing should be committed) if it has moved on.
+    Reserving or consuming more than the foodbank has available (or stock
+    of an item it never stocked), or taking any count below zero, raises 409.
+    """
+    if not entries:
+        return True
+    expected_versions = expected_versions or {}
+
+    totals = {}
+    checked = set()
+    for entry in entries:
+        key = (entry.foodbank_id, entry.food_item_id)
+        quantity_delta, reserved_delta = totals.get(key, (0, 0))
+        totals[key] = (
+            quantity_delta + (entry.quantity_delta or 0),
+            reserved_delta + (entry.reserved_delta or 0)
+        )
+        if entry.kind in STOCK_CHECKED_KINDS:
+            checked.add(key)
+
+    # Rows are always updated in key order, so concurrent multi-item appends
+    # wait for each other instead of deadlocking
+    for foodbank_id, food_item_id in sorted(totals):
+        quantity_delta, reserved_delta = totals[(foodbank_id, food_item_id)]
+        expected_version = expected_versions.get((foodbank_id, food_item_id))
+        # Checked in the UPDATE itself, so concurrent reservations cannot overdraw
+        stock_conditions = []
+        if quantity_delta < 0:
+            stock_conditions.append(inventory_table.c.quantity + quantity_delta >= 0)
+        if (foodbank_id, food_item_id) in checked:
+            if quantity_delta - reserved_delta < 0:
+                stock_conditions.append(
+                    inventory_table.c.quantity - inventory_table.c.reserved + (quantity_delta - reserved_delta) >= 0
+                )
+        if expected_version is not None or stock_conditions:
+            version_conditions = [] if expected_version is None else [inventory_table.c.version == expected_version]
+            result = db.execute(
+                inventory_table.update().where(
+                    inventory_table.c.foodbank_id == foodbank_id,
+                    inventory_table.c.food_item_id == food_item_id,
+                    *version_conditions,
+                    *stock_conditions
+                ).values(
+                    quantity=inventory_table.c.quantity + quantity_delta,
+                    reserved=inventory_table.c.reserved + reserved_delta,
+                    version=inventory_table.c.version + 1,
+                    last_updated=func.now()
+                )
+            )
+            if result.rowcount == 0:
+                version_moved = expected_version is not None and db.query(models.InventoryItem.id).filter(
+                    models.InventoryItem.foodbank_id == foodbank_id,
+                    models.InventoryItem.food_item_id == food_item_id,
+                    models.InventoryItem.version != expected_version
+                ).first() is not None
+                if version_moved or not stock_conditions:
+                    return False
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Not enough stock of food item {food_item_id} at foodbank {foodbank_id}"
+                )
+            continue
+
+        upsert = dialect_insert(db, inventory_table).values(
+            foodbank_id=foodbank_id,
+            food_item_id=food_item_id,
+            quantity=quantity_delta,
+            reserved=reserved_delta,
+            version=1
+        )
+        db.execute(upsert.on_conflict_do_update(
+            index_elements=[inventory_table.c.foodbank_id, inventory_table.c.food_item_id],
+            set_={
+                "quantity": inventory_table.c.quantity + upsert.excluded.quantity,
+                "reserved": inventory_table.c.reserved + upsert.excluded.reserved,
+                "version": inventory_table.c.version + 1,
+                "last_updated": func.now()
+            }
+        ))
+
+    db.add_all(entries)
+    workspace.invalidate(db, {foodbank_id for foodbank_id, _ in totals})
+    # Thresholds are checked only for the rows this append changed
+    alerts.evaluate(db, totals.keys())
+    return True
+
+
+def intake(db: Session, foodbank_id: int, food_item_id: int, quantity: int, user_id: Optional[int] = None):
+    append(db, [models.InventoryLedgerEntry(
+        foodbank_id=foodbank_id,
+        food_item_id=food_item_id,
+        kind="intake",
+        quantity_delta=quantity,
+        reserved_delta=0,
+        created_by_id=user_id
+    )])
+
+
+def adjust(
+    db: Session,
+    item: models.InventoryItem,
+    delta: int,
+    user_id: Optional[int] = None,
+    expected_version: Optional[int] = None
+) -> bool:
+    """
+    Record a manual stock correction of `delta` against an existing snapshot row.
+    """
+    key = (item.foodbank_id, item.food_item_id)
+    return append(db, [models.InventoryLedgerEntry(
+        foodbank_id=item.foodbank_id,
+        food_item_id=item.food_item_id,
+        kind="adjustment",
+        quantity_delta=delta,
+        reserved_delta=0,
+        created_by_id=user_id
+    )], expected_versions={key: expected_version} if expected_version is not None else None)
+
+
+def _request_entries(request: models.Request, foodbank_id: int, kind: str, user_id: Optional[int]):
+    quantity_sign, reserved_sign = {
+        "reservation": (0, 1),
+        "release": (0, -1),
+        "consumption": (-1, 0),
+    }[kind]
+    return [
+        models.InventoryLedgerEntry(
+            foodbank_id=foodbank_id,
+            food_item_id=item.food_item_id,
+            request_id=request.id,
+            kind=kind,
+            quantity_delta=quantity_sign * item.quantity,
+            reserved_delta=reserved_sign * item.quantity,
+            created_by_id=user_id
+        )
+        for item in request.request_items
+    ]
+
+
+def request_transition_entries(
+    request: models.Request,
+    old_status: Optional[str],
+    old_assigned_to_id: Optional[int],
+    user_id: Optional[int] = None
+) -> List[models.InventoryLedgerEntry]:
+    """
+    Ledger entries implied by moving `request` from (old_status,
+    old_assigned_to_id) to its current status/assignment: stock is reserved
+    while a request is Assigned to a foodbank, released when it leaves that
+    foodbank without being fulfilled, and consumed on fulfillment.
+    """
+    new_status, new_assigned_to_id = request.status, request.assigned_to_id
+    was_reserved = old_status == "Assigned" and bool(old_assigned_to_id)
+    is_reserved = new_status == "Assigned" and bool(new_assigned_to_id)
+    moved = old_assigned_to_id != new_assigned_to_id
+
+    entries = []
+    if was_reserved and (not is_reserved or moved):
+        entries += _request_entries(request, old_assigned_to_id, "release", user_id)
+    if is_reserved and (not was_reserved or moved):
+        entries += _request_entries(request, new_assigned_to_id, "reservation", user_id)
+    if new_status == "Fulfilled" and old_status != "Fulfilled" and new_assigned_to_id:
+        entries += _request_entries(request, new_assigned_to_id, "consumption", user_id)
+    return entries
+
+
+def apply_request_transition(
+    db: Session,
+    request: models.Request,
+    old_status: Optional[str],
+    old_assigned_to_id: Optional[int],
+    user_id: Optional[int] = None
+):
+    append(db, request_transition_entries(request, old_status, old_assigned_to_id, user_id))
+    # Pending lists are shared by every foodbank in the district
+    workspace.invalidate(db, (old_assigned_to_id, request.assigned_to_id), request.district)
+
+
+def history(
+    db: Session,
+    foodbank_id: int,
+    food_item_id: Optional[int] = None,
+    limit: int = 100,
+    offset: int = 0
+) -> List[models.InventoryLedgerEntry]:
+    query = db.query(models.InventoryLedgerEntry).filter(
+        models.InventoryLedgerEntry.foodbank_id == foodbank_id
+    )
+    if food_item_id is not None:
+        query = query.filter(models.InventoryLedgerEntry.food_item_id == food_item_id)
+
+    return query.order_by(
+        models.InventoryLedgerEntry.created_at.desc(),
+        models.InventoryLedgerEntry.id.desc()
+    ).offset(offset).limit(limit).all()
+
+
+def compact(db: Session, older_than: datetime) -> int:
+    """
+    Fold every ledger entry created before `older_than` into a single
+    "compaction" entry per (foodbank, food item). Sums are preserved, so the
+    snapshot is untouched. Returns the number of entries removed.
+    """
+    Entry = models.InventoryLedgerEntry
+    groups = db.query(
+        Entry.foodbank_id,
+        Entry.food_item_id,
+        func.sum(Entry.quantity_delta),
+        func.sum(Entry.reserved_delta),
+        func.max(Entry.created_at),
+        func.max(Entry.id),
+        func.count(Entry.id)
+    ).filter(
+        Entry.created_at < older_than
+    ).group_by(Entry.foodbank_id, Entry.food_item_id).all()
+
+    removed = 0
+    for foodbank_id, food_item_id, quantity_delta, reserved_delta, last_created_at, last_id, count in groups:
+        if count < 2:
+            continue
+        db.query(Entry).filter(
+            Entry.foodbank_id == foodbank_id,
+            Entry.food_item_id == food_item_id,
+            Entry.id <= last_id,
+            Entry.created_at < older_than
+        ).delete(synchronize_session=False)
+        db.add(Entry(
+            foodbank_id=foodbank_id,
+            food_item_id=food_item_id,
+            kind="compaction",
+            quantity_delta=quantity_delta or 0,
+            reserved_delta=reserved_delta or 0,
+            created_at=last_created_at
+        ))
+        removed += count
+
+    db.commit()
+    return removed
+
+
+@job("compact_inventory_ledger", every=LEDGER_COMPACTION_INTERVAL_SECONDS)
+def compact_expired_entries(ctx: JobContext):
+    cutoff = datetime.utcnow() - LEDGER_RETENTION
+    removed = shards.fan_out(lambda db: compact(db, cutoff), db=ctx.db)
+    return {"removed": sum(removed.values())}
@@ -1,18 +1,44 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 
-import models
+import archive  # noqa: F401 (registers the archival job)
+import capture
+import compression
+import jobs
+import reference
+import shards
 from database import engine, get_db
-from routers import auth, requests, foodbank, organization, public, users
+from routers import (
+    auth, requests, foodbank, organization, public, users,
+    jobs as jobs_router, search as search_router, analytics as analytics_router,
+    alerts as alerts_router, events as events_router, sync as sync_router,
+    diagnostics as diagnostics_router
+)
+from schema_version import ensure_schema
 
-# Create tables
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Only creates tables when the stored schema version is out of date
+    await run_in_threadpool(ensure_schema, engine)
+    for shard_engine in shards.engines()[1:]:
+        await run_in_threadpool(ensure_schema, shard_engine)
+    await run_in_threadpool(shards.prepare)
+    # Warm the reference data caches before serving the first request
+    await run_in_threadpool(reference.load)
+    # Resumes jobs queued or interrupted before the last restart
+    await jobs.runner.start()
+    yield
+    await jobs.runner.stop()
 
 app = FastAPI(
     title="B40 Food Aid Management Platform",
     description="API for managing food aid requests and inventory",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware to allow frontend to connect
@@ -24,6 +50,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON responses (request lists, dashboard stats) for clients on metered data
+app.add_middleware(compression.CompressionMiddleware)
+
+# Opt-in traffic capture for replay.py; outermost so timings include compression
+if capture.TRAFFIC_CAPTURE_PATH:
+    app.add_middleware(capture.CaptureMiddleware, path=capture.TRAFFIC_CAPTURE_PATH)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(requests.router, prefix="/api")
@@ -31,6 +64,13 @@ app.include_router(foodbank.router, prefix="/api")
 app.include_router(organization.router, prefix="/api")
 app.include_router(public.router, prefix="/api")  # Added public router
 app.include_router(users.router, prefix="/api")  # Added users router
+app.include_router(jobs_router.router, prefix="/api")
+app.include_router(search_router.router, prefix="/api")
+app.include_router(analytics_router.router, prefix="/api")
+app.include_router(alerts_router.router, prefix="/api")
+app.include_router(events_router.router, prefix="/api")
+app.include_router(sync_router.router, prefix="/api")
+app.include_router(diagnostics_router.router, prefix="/api")
 
 @app.get("/")
 def root():
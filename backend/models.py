@@ -1,11 +1,16 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, JSON, Table, Float
+from sqlalchemy import BigInteger, Boolean, Column, FetchedValue, ForeignKey, Integer, String, DateTime, JSON, Table, Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from datetime import datetime
 import json
 import uuid
 
 from database import Base
 
+# Bump whenever tables, columns, indexes or the sync triggers change; a change
+# to existing tables also needs an upgrade step in schema_version.UPGRADES
+SCHEMA_VERSION = 11
+
 class User(Base):
     __tablename__ = "users"
 
@@ -18,7 +23,7 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
-    requests = relationship("Request", back_populates="user")
+    requests = relationship("Request", back_populates="user", foreign_keys="Request.user_id")
     foodbank = relationship("FoodBank", back_populates="admin", uselist=False)
     
 class FoodBank(Base):
@@ -57,13 +62,101 @@ class InventoryItem(Base):
     id = Column(Integer, primary_key=True, index=True)
     foodbank_id = Column(Integer, ForeignKey("foodbanks.id"))
     food_item_id = Column(Integer, ForeignKey("food_items.id"))
+    # Materialized snapshot of inventory_ledger: on-hand stock and the part of it
+    # reserved for assigned requests. Only ledger.append() should change these.
     quantity = Column(Integer)
+    reserved = Column(Integer, nullable=False, default=0, server_default="0")
     last_updated = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Set by database triggers on every insert/update (see sync.py)
+    change_seq = Column(BigInteger, index=True, server_default=FetchedValue(), server_onupdate=FetchedValue())
+    
+    # Every ORM UPDATE becomes UPDATE ... WHERE version = ? and bumps the version
+    __mapper_args__ = {"version_id_col": version}
+    __table_args__ = (
+        UniqueConstraint("foodbank_id", "food_item_id", name="uq_inventory_foodbank_food_item"),
+    )
     
     # Relationships
     foodbank = relationship("FoodBank", back_populates="inventory_items")
     food_item = relationship("FoodItem", back_populates="inventory_entries")
 
+class StockThreshold(Base):
+    __tablename__ = "stock_thresholds"
+    
+    # Alert when available stock (quantity - reserved) drops to low_level; re-arm
+    # only once it is back at restore_level, so small oscillations stay quiet
+    id = Column(Integer, primary_key=True, index=True)
+    foodbank_id = Column(Integer, ForeignKey("foodbanks.id"))
+    food_item_id = Column(Integer, ForeignKey("food_items.id"))
+    low_level = Column(Integer, nullable=False)
+    restore_level = Column(Integer, nullable=False)
+    cooldown_seconds = Column(Integer, nullable=False, default=3600)
+    state = Column(String, nullable=False, default="ok")  # "ok", "low"
+    last_alert_at = Column(DateTime(timezone=True), nullable=True)
+    
+    __table_args__ = (
+        UniqueConstraint("foodbank_id", "food_item_id", name="uq_stock_threshold_foodbank_food_item"),
+    )
+
+class StockAlert(Base):
+    __tablename__ = "stock_alerts"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    foodbank_id = Column(Integer, ForeignKey("foodbanks.id"))
+    food_item_id = Column(Integer, ForeignKey("food_items.id"))
+    available = Column(Integer)
+    low_level = Column(Integer)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    acknowledged_at = Column(DateTime(timezone=True), nullable=True)
+    acknowledged_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    
+    __table_args__ = (
+        Index("ix_stock_alerts_foodbank", "foodbank_id", "created_at"),
+    )
+
+class ArchivedRequest(Base):
+    __tablename__ = "requests_archive"
+    
+    # Closed requests moved out of the hot "requests" table by archive.py
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    tracking_number = Column(String, unique=True, index=True)
+    user_id = Column(Integer)
+    location = Column(String)
+    district = Column(String)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    status = Column(String)
+    assigned_to_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True))
+    fulfilled_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+class ArchivedRequestItem(Base):
+    __tablename__ = "request_items_archive"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    request_id = Column(Integer, index=True)
+    food_item_id = Column(Integer)
+    quantity = Column(Integer)
+
+class InventoryLedgerEntry(Base):
+    __tablename__ = "inventory_ledger"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    foodbank_id = Column(Integer, ForeignKey("foodbanks.id"))
+    food_item_id = Column(Integer, ForeignKey("food_items.id"))
+    request_id = Column(Integer, nullable=True, index=True)  # No FK, history outlives the request row
+    kind = Column(String)  # "intake", "adjustment", "reservation", "release", "consumption", "compaction"
+    quantity_delta = Column(Integer, default=0)
+    reserved_delta = Column(Integer, default=0)
+    created_by_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_inventory_ledger_item", "foodbank_id", "food_item_id", "created_at"),
+    )
+
 class Request(Base):
     __tablename__ = "requests"
     
@@ -79,8 +172,29 @@ class Request(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     fulfilled_at = Column(DateTime(timezone=True), nullable=True)
     
+    # Claim queue: a foodbank volunteer leases a pending request until lease_expires_at.
+    # Volunteers share their foodbank's account, so the lease is keyed by the
+    # client-supplied claimer id as well as the account
+    claimed_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    claimer = Column(String, nullable=True)
+    claim_token = Column(String, nullable=True, index=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Set by database triggers on every insert/update (see sync.py)
+    change_seq = Column(BigInteger, index=True, server_default=FetchedValue(), server_onupdate=FetchedValue())
+    
+    __mapper_args__ = {"version_id_col": version}
+    # AUTOINCREMENT so SQLite never reuses the id of an archived request
+    __table_args__ = (
+        # Claims walk the district's pending requests in created_at order and skip
+        # live leases as they go; a range on lease_expires_at in the key would
+        # stop the walk from following created_at and force a sort
+        Index("ix_requests_claim_queue", "district", "status", "created_at"),
+        {"sqlite_autoincrement": True},
+    )
+    
     # Relationships
-    user = relationship("User", back_populates="requests")
+    user = relationship("User", back_populates="requests", foreign_keys=[user_id])
     request_items = relationship("RequestItem", back_populates="request")
     assigned_to = relationship("FoodBank", back_populates="assigned_requests")
     
@@ -98,11 +212,39 @@ class RequestItem(Base):
     request_id = Column(Integer, ForeignKey("requests.id"))
     food_item_id = Column(Integer, ForeignKey("food_items.id"))
     quantity = Column(Integer, default=1)
+    # Set by database triggers on every insert/update (see sync.py)
+    change_seq = Column(BigInteger, index=True, server_default=FetchedValue(), server_onupdate=FetchedValue())
+    
+    __table_args__ = {"sqlite_autoincrement": True}
     
     # Relationships
     request = relationship("Request", back_populates="request_items")
     food_item = relationship("FoodItem", back_populates="request_items")
 
+class RequestStatusEvent(Base):
+    __tablename__ = "request_status_events"
+    
+    # Append-only; written from values already loaded by the writer, never read back on the hot path
+    id = Column(Integer, primary_key=True)
+    request_id = Column(Integer, index=True)  # No FK, history outlives the request row
+    from_status = Column(String, nullable=True)
+    to_status = Column(String)
+    district = Column(String)
+    foodbank_id = Column(Integer, nullable=True)
+    changed_by_id = Column(Integer, nullable=True)
+    seconds_since_created = Column(Integer)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+class LatencyHistogramBucket(Base):
+    __tablename__ = "latency_histogram"
+    
+    # Pre-bucketed time-to-assign/time-to-fulfill counts per district and foodbank
+    metric = Column(String, primary_key=True)  # "assign", "fulfill"
+    district = Column(String, primary_key=True)
+    foodbank_id = Column(Integer, primary_key=True)  # 0 when not assigned to a foodbank
+    bucket = Column(Integer, primary_key=True)
+    count = Column(Integer, default=0)
+
 class District(Base):
     __tablename__ = "districts"
     
@@ -112,4 +254,68 @@ class District(Base):
     geojson = Column(String)  # Store GeoJSON as string
     
     def get_geojson(self):
-        return json.loads(self.geojson)
\ No newline at end of file
+        return json.loads(self.geojson)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, index=True)
+    status = Column(String, default="queued")  # "queued", "running", "succeeded", "failed"
+    payload = Column(JSON, default=dict)
+    result = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    progress = Column(Float, default=0.0)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    run_after = Column(DateTime(timezone=True), default=datetime.utcnow)
+    created_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    # Lease held by the worker running the job, renewed while it runs
+    locked_until = Column(DateTime(timezone=True), nullable=True)
+    # "kind:slot" for periodic jobs, so workers enqueue each slot only once
+    dedupe_key = Column(String, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_jobs_queue", "status", "run_after"),
+        Index("uq_jobs_dedupe_key", "dedupe_key", unique=True),
+    )
+
+class ChangeCounter(Base):
+    __tablename__ = "change_counter"
+    
+    # Single row: the last change_seq handed out (SQLite only, PostgreSQL uses a
+    # sequence) and the highest change_seq whose tombstones have been pruned
+    id = Column(Integer, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+    pruned_through = Column(BigInteger, nullable=False, default=0)
+
+class SyncTombstone(Base):
+    __tablename__ = "sync_tombstones"
+    
+    # Written by delete triggers so sync clients learn about removed rows
+    id = Column(Integer, primary_key=True, index=True)
+    change_seq = Column(BigInteger, nullable=False, index=True)
+    table_name = Column(String, nullable=False)
+    row_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=True)
+    foodbank_id = Column(Integer, nullable=True)
+    district = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    
+    key = Column(String, primary_key=True)
+    # sha256 of method, path and body; a key reused for a different request is rejected
+    fingerprint = Column(String, nullable=True)
+    response = Column(JSON)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    expires_at = Column(DateTime(timezone=True), index=True)
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+    
+    version = Column(Integer, primary_key=True)
+    applied_at = Column(DateTime(timezone=True), default=datetime.utcnow)
@@ -0,0 +1,209 @@
+import functools
+import ipaddress
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request, status
+
+# "memory" keeps buckets per worker process; "sqlite" shares them between the
+# workers on one host through a small local database file
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "./rate_limits.db")
+RATE_LIMIT_MAX_KEYS = 100_000
+# Proxies (addresses or CIDRs, comma separated) in front of the workers whose
+# X-Forwarded-For header is trusted. Unset: the peer address is the client
+RATE_LIMIT_TRUSTED_PROXIES = os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "")
+
+
+def parse_networks(value: str):
+    return tuple(ipaddress.ip_network(part.strip(), strict=False) for part in value.split(",") if part.strip())
+
+
+TRUSTED_PROXY_NETWORKS = parse_networks(RATE_LIMIT_TRUSTED_PROXIES)
+
+
+class MemoryTokenBucketLimiter:
+    """
+    Token buckets keyed by client, refilled at `rate` tokens per second up to
+    `capacity`. Holds at most `max_keys` buckets; the least recently used
+    bucket is evicted first (an evicted client simply starts with a full bucket).
+    """
+
+    def __init__(self, rate: float, capacity: float, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, key: str) -> float:
+        """
+        Take one token for `key`. Returns 0 when allowed, otherwise the number
+        of seconds until a token will be available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [self.capacity, now]
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / self.rate
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteTokenBucketLimiter:
+    """
+    Same algorithm as MemoryTokenBucketLimiter, with buckets stored in a local
+    SQLite file so every worker on the host shares them. Buckets that would
+    have refilled completely are equivalent to missing ones and are pruned.
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, name: str, rate: float, capacity: float, path: str = RATE_LIMIT_SQLITE_PATH):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.path = path
+        self._local = threading.local()
+        self._checks = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def check(self, key: str) -> float:
+        key = f"{self.name}:{key}"
+        now = time.time()
+        conn = self._connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = self.capacity if row is None else min(
+                self.capacity, row[0] + (now - row[1]) * self.rate
+            )
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now)
+            )
+
+            self._checks += 1
+            if self._checks % self.PRUNE_EVERY == 0:
+                conn.execute(
+                    "DELETE FROM buckets WHERE updated < ?",
+                    (now - self.capacity / self.rate,)
+                )
+            conn.execute("COMMIT")
+        except sqlite3.OperationalError:
+            # Fail open: a busy limiter database must not take the endpoint down
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            return 0.0
+
+        return 0.0 if allowed else (1 - tokens) / self.rate
+
+    def reset(self):
+        self._connection().execute("DELETE FROM buckets WHERE key LIKE ?", (f"{self.name}:%",))
+
+
+def create_limiter(name: str, per_minute: float, burst: float):
+    rate = per_minute / 60.0
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteTokenBucketLimiter(name, rate, burst)
+    return MemoryTokenBucketLimiter(rate, burst)
+
+
+def enforce(limiter, key: str):
+    retry_after = limiter.check(key)
+    if retry_after > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, please try again later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+
+# Parsing addresses dominates the cost of a check, and the same few proxies are seen over and over
+@functools.lru_cache(maxsize=4096)
+def _is_trusted(address: str, networks) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_ip(request: Request, trusted_proxies=TRUSTED_PROXY_NETWORKS) -> str:
+    """
+    The peer address or, when the peer is a trusted proxy, the right-most
+    X-Forwarded-For hop that is not itself a trusted proxy. Hops left of
+    that one were written by the client and are ignored.
+    """
+    peer = request.client.host if request.client else "unknown"
+    if not trusted_proxies or not _is_trusted(peer, trusted_proxies):
+        return peer
+    hops = [hop.strip() for header in request.headers.getlist("x-forwarded-for")
+            for hop in header.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted(hop, trusted_proxies):
+            return hop
+    return hops[0] if hops else peer
+
+
+class RateLimitByIP:
+    """
+    Route dependency that rejects a client IP with 429 once its bucket is empty.
+    """
+
+    def __init__(self, limiter, trusted_proxies=TRUSTED_PROXY_NETWORKS):
+        self.limiter = limiter
+        self.trusted_proxies = trusted_proxies
+
+    def __call__(self, request: Request):
+        enforce(self.limiter, client_ip(request, self.trusted_proxies))
+
+
+# Anonymous endpoints
+public_submit_by_ip = create_limiter("submit_ip", per_minute=10, burst=10)
+public_submit_by_ic = create_limiter("submit_ic", per_minute=5 / 60, burst=5)
+public_track_by_ip = create_limiter("track_ip", per_minute=60, burst=30)
+PUBLIC_LIMITERS = (public_submit_by_ip, public_submit_by_ic, public_track_by_ip)
+
+
+def reset(*limiters):
+    """
+    Refill every bucket of `limiters` (by default all of the above), e.g.
+    between tests or benchmark passes that all come from one address.
+    """
+    for limiter in limiters or PUBLIC_LIMITERS:
+        limiter.reset()
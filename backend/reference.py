@@ -0,0 +1,108 @@
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import models
+import schemas
+from compression import PrecompressedBody
+from database import SessionLocal
+from serialization import dumps
+
+# Other workers only see an invalidation once their copy expires
+REFERENCE_TTL_SECONDS = 300
+
+
+class _ReferenceData:
+    def __init__(self, food_items, districts, foodbanks):
+        self.food_items = food_items
+        self.districts = districts
+        self.foodbanks = foodbanks
+        self.loaded_at = time.monotonic()
+        self.payloads = {}
+
+
+_data: Optional[_ReferenceData] = None
+_lock = threading.Lock()
+
+
+def load() -> _ReferenceData:
+    """
+    Load food items, districts and foodbank locations into memory.
+    Called from the app lifespan hook so the first request is served warm.
+    """
+    global _data
+    db = SessionLocal()
+    try:
+        data = _ReferenceData(
+            food_items=[schemas.FoodItem.from_orm(item) for item in db.query(models.FoodItem).all()],
+            districts=[schemas.District.from_orm(district) for district in db.query(models.District).all()],
+            foodbanks=[schemas.FoodBank.from_orm(foodbank) for foodbank in db.query(models.FoodBank).all()]
+        )
+    finally:
+        db.close()
+
+    with _lock:
+        _data = data
+    return data
+
+
+def _current() -> _ReferenceData:
+    data = _data
+    if data is None or time.monotonic() - data.loaded_at > REFERENCE_TTL_SECONDS:
+        data = load()
+    return data
+
+
+def invalidate():
+    global _data
+    with _lock:
+        _data = None
+
+
+def food_items() -> List[schemas.FoodItem]:
+    return _current().food_items
+
+
+def food_items_by_id(ids: Iterable[int] = ()) -> Dict[int, schemas.FoodItem]:
+    """
+    Food items by id, reloaded once if any of `ids` is missing (e.g. added
+    by another worker since the last load). Lets per-state queries name
+    their food items without joining a table that lives on the primary.
+    """
+    by_id = {item.id: item for item in food_items()}
+    if any(food_item_id not in by_id for food_item_id in ids):
+        by_id = {item.id: item for item in load().food_items}
+    return by_id
+
+
+def districts() -> List[schemas.District]:
+    return _current().districts
+
+
+def foodbanks(district: Optional[str] = None) -> List[schemas.FoodBank]:
+    all_foodbanks = _current().foodbanks
+    if district:
+        return [foodbank for foodbank in all_foodbanks if foodbank.district == district]
+    return all_foodbanks
+
+
+def _payload(name: str) -> PrecompressedBody:
+    # Encoded (and compressed) once per load, shared by every response until invalidated
+    data = _current()
+    payload = data.payloads.get(name)
+    if payload is None:
+        payload = PrecompressedBody(dumps([item.dict() for item in getattr(data, name)]))
+        data.payloads[name] = payload
+    return payload
+
+
+def food_items_payload() -> PrecompressedBody:
+    return _payload("food_items")
+
+
+def districts_payload() -> PrecompressedBody:
+    return _payload("districts")
+
+
+def foodbanks_payload() -> PrecompressedBody:
+    return _payload("foodbanks")
@@ -0,0 +1,397 @@
+"""
+Replay traffic recorded by capture.py against a fresh copy of the app.
+
+    # Replay at 10x against a copy of a database snapshot
+    python replay.py run capture-*.jsonl --db snapshot.db --speed 10 --out candidate.jsonl
+
+    # Latency distribution of one run (or of the capture itself)
+    python replay.py report candidate.jsonl
+
+    # Latency and status differences between two code versions
+    python replay.py compare baseline.jsonl candidate.jsonl
+
+    # Mixed traffic for an hour; fails if RSS grows more than 64 MiB after warmup
+    python replay.py soak capture-*.jsonl --db snapshot.db --duration 3600 --max-rss-growth-mb 64
+
+Take the snapshot when capturing starts so ids in captured paths exist. The
+app is driven in process through ASGI, so no server or HTTP client is
+needed; run it from each checkout to compare versions. Authenticated
+requests are signed as the captured user. IC numbers, emails and phone
+numbers arrive as per-capture pseudonyms, so public submissions still map to
+one guest user and rate-limit bucket per submitter. Passwords and other
+masked fields stay masked, so logins replay as failures in every run alike.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List
+from urllib.parse import urlencode
+
+from serialization import dumps
+
+
+def load_records(paths: List[str]) -> List[dict]:
+    """
+    Records from capture or result files. Captures are merged in arrival
+    order and numbered, so runs and captures line up by index.
+    """
+    records = []
+    for path in paths:
+        with open(path, "rb") as records_file:
+            records.extend(json.loads(line) for line in records_file if line.strip())
+    if records and "index" not in records[0]:
+        records.sort(key=lambda record: record["ts"])
+        for index, record in enumerate(records):
+            record["index"] = index
+    return records
+
+
+def _request(entry: dict, token: str):
+    headers = [(name.encode(), value.encode("latin-1")) for name, value in entry.get("headers", {}).items()]
+    body = b""
+    if "json" in entry:
+        body = dumps(entry["json"])
+    elif "form" in entry:
+        body = urlencode(entry["form"]).encode()
+    if body:
+        headers.append((b"content-length", str(len(body)).encode()))
+    if token:
+        headers.append((b"authorization", f"Bearer {token}".encode()))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": entry["method"],
+        "scheme": "http",
+        "path": entry["path"],
+        "raw_path": entry["path"].encode(),
+        "query_string": urlencode(entry.get("query", {})).encode(),
+        "root_path": "",
+        "headers": headers,
+        # The capture's client pseudonym keeps per-client rate limits realistic
+        "client": (entry.get("client") or "replay", 0),
+        "server": ("replay", 80),
+    }
+    return scope, body
+
+
+async def _send(app, entry: dict, token: str, scheduled: float) -> dict:
+    scope, body = _request(entry, token)
+    done = asyncio.Event()
+    response = {"status": None, "bytes": 0}
+    pending_body = [body]
+
+    async def receive():
+        if pending_body:
+            return {"type": "http.request", "body": pending_body.pop(), "more_body": False}
+        # Report a disconnect only once the response is complete
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["bytes"] += len(message.get("body", b""))
+            if not message.get("more_body", False):
+                done.set()
+
+    started = time.perf_counter()
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        # Unhandled errors surface as 500s, as they would behind uvicorn
+        response["status"] = response["status"] or 500
+    finished = time.perf_counter()
+    done.set()
+
+    return {
+        "index": entry["index"],
+        "method": entry["method"],
+        "route": entry["route"],
+        "status": response["status"] or 500,
+        "response_bytes": response["bytes"],
+        "duration_ms": round((finished - started) * 1000, 3),
+        "lag_ms": round(max(0.0, started - scheduled) * 1000, 3),
+    }
+
+
+def _tokens(entries: List[dict]) -> Dict[str, str]:
+    import auth
+    return {
+        actor: auth.create_access_token({"sub": actor})
+        for actor in {entry.get("actor") for entry in entries} - {None}
+    }
+
+
+async def _replay_pass(app, entries: List[dict], tokens: Dict[str, str],
+                       speed: float, max_in_flight: int) -> List[dict]:
+    limit = asyncio.Semaphore(max_in_flight)
+
+    async def run(entry, scheduled):
+        try:
+            return await _send(app, entry, tokens.get(entry.get("actor")), scheduled)
+        finally:
+            limit.release()
+
+    tasks = []
+    first_ts = entries[0]["ts"]
+    start = time.perf_counter()
+    for entry in entries:
+        scheduled = start + ((entry["ts"] - first_ts) / speed if speed > 0 else 0.0)
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await limit.acquire()
+        tasks.append(asyncio.create_task(run(entry, scheduled)))
+    return await asyncio.gather(*tasks)
+
+
+async def _replay(entries: List[dict], speed: float, max_in_flight: int) -> List[dict]:
+    # Imported after DATABASE_URL points at the copy
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        return await _replay_pass(app, entries, _tokens(entries), speed, max_in_flight)
+
+
+async def _soak(entries: List[dict], args) -> List[dict]:
+    """
+    Replay the capture in a loop for args.duration seconds, sampling RSS and
+    live ORM objects after each pass with a full collection.
+    """
+    import diagnostics
+    from main import app
+
+    samples = []
+    async with app.router.lifespan_context(app):
+        tokens = _tokens(entries)
+        deadline = time.monotonic() + args.duration
+        passes = 0
+        while passes <= args.warmup_passes or time.monotonic() < deadline:
+            results = await _replay_pass(app, entries, tokens, args.speed, args.max_in_flight)
+            passes += 1
+            counts = diagnostics.object_counts(collect=True)
+            sample = {
+                "pass": passes,
+                "warmup": passes <= args.warmup_passes,
+                "rss_bytes": diagnostics.rss_bytes(),
+                "orm_objects": counts["orm_objects"],
+                "sessions": counts["sessions"],
+                "p95_ms": percentile(sorted(result["duration_ms"] for result in results), 95),
+                "errors": sum(1 for result in results if result["status"] >= 500),
+            }
+            samples.append(sample)
+            print(f"pass {passes:>4}  rss {sample['rss_bytes'] / 2**20:8.1f} MiB  "
+                  f"orm objects {sample['orm_objects']:>7}  sessions {sample['sessions']:>3}  "
+                  f"p95 {sample['p95_ms']:8.1f} ms  5xx {sample['errors']}", flush=True)
+    return samples
+
+
+def _prepare_environment(args, workdir: str):
+    if args.db:
+        copy = os.path.join(workdir, "replay.db")
+        shutil.copyfile(args.db, copy)
+        os.environ["DATABASE_URL"] = f"sqlite:///{copy}"
+    elif args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    # Keep files written by the app and its jobs out of the real ones
+    os.environ["RATE_LIMIT_SQLITE_PATH"] = os.path.join(workdir, "rate_limits.db")
+    os.environ["ANALYTICS_SNAPSHOT_DIR"] = os.path.join(workdir, "analytics_snapshot")
+    os.environ["COVERAGE_DIR"] = os.path.join(workdir, "coverage")
+    os.environ["EXPORT_DIR"] = os.path.join(workdir, "exports")
+    os.environ.pop("TRAFFIC_CAPTURE_PATH", None)
+
+
+def _replayable(paths: List[str]) -> List[dict]:
+    entries = [entry for entry in load_records(paths) if not entry.get("stream")]
+    if not entries:
+        print("No replayable requests in the capture", file=sys.stderr)
+    return entries
+
+
+def run(args) -> int:
+    entries = _replayable(args.capture)
+    if not entries:
+        return 1
+
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    try:
+        _prepare_environment(args, workdir)
+        started = time.perf_counter()
+        results = asyncio.run(_replay(entries, args.speed, args.max_in_flight))
+        elapsed = time.perf_counter() - started
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, "wb") as out_file:
+            for result in results:
+                out_file.write(dumps(result) + b"\n")
+
+    print(f"Replayed {len(results)} requests in {elapsed:.1f}s "
+          f"(max lag {max(result['lag_ms'] for result in results):.0f} ms)")
+    print_report(results)
+    return 0
+
+
+def soak(args) -> int:
+    """
+    Long-running mixed traffic in one process. Fails (exit 1) when RSS grows
+    by more than --max-rss-growth-mb over the level reached after warmup, so
+    caches and pools can fill first without counting as a leak.
+    """
+    entries = _replayable(args.capture)
+    if not entries:
+        return 1
+
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    try:
+        _prepare_environment(args, workdir)
+        samples = asyncio.run(_soak(entries, args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    measured = [sample for sample in samples if not sample["warmup"]]
+    baseline = samples[args.warmup_passes - 1] if args.warmup_passes else samples[0]
+    growth = max(sample["rss_bytes"] for sample in measured) - baseline["rss_bytes"]
+    orm_growth = measured[-1]["orm_objects"] - baseline["orm_objects"]
+    limit = args.max_rss_growth_mb * 2**20
+    print(f"\nRSS growth after warmup: {growth / 2**20:.1f} MiB (limit {args.max_rss_growth_mb} MiB), "
+          f"live ORM objects {orm_growth:+d} over {len(measured)} passes")
+    if growth > limit:
+        print("FAIL: memory grew beyond the limit", file=sys.stderr)
+        return 1
+    return 0
+
+
+def percentile(values: List[float], q: float) -> float:
+    # Nearest-rank on sorted values
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def _by_route(records: List[dict]) -> Dict[str, List[dict]]:
+    groups = defaultdict(list)
+    for record in records:
+        groups[f"{record['method']} {record['route']}"].append(record)
+    return groups
+
+
+def print_report(records: List[dict]):
+    groups = _by_route(records)
+    groups["ALL"] = records
+    print(f"{'route':<48} {'count':>6} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'4xx':>5} {'5xx':>5}")
+    # Routes costing the most total time first
+    for name, group in sorted(groups.items(), key=lambda item: -sum(r["duration_ms"] for r in item[1])):
+        durations = sorted(record["duration_ms"] for record in group)
+        statuses = Counter(record["status"] // 100 for record in group)
+        print(f"{name[:48]:<48} {len(group):>6} {percentile(durations, 50):>8.1f} "
+              f"{percentile(durations, 90):>8.1f} {percentile(durations, 99):>8.1f} "
+              f"{durations[-1]:>8.1f} {statuses[4]:>5} {statuses[5]:>5}")
+
+
+def report(args) -> int:
+    records = load_records(args.results)
+    if not records:
+        print("No records", file=sys.stderr)
+        return 1
+    print_report(records)
+    return 0
+
+
+def compare(args) -> int:
+    """
+    Latency per route and status changes between a baseline and a candidate
+    (results of `run`, or the capture itself as baseline). Exits with 1 when
+    the candidate fails requests with 5xx that the baseline served.
+    """
+    baseline = {record["index"]: record for record in load_records([args.baseline])}
+    candidate = {record["index"]: record for record in load_records([args.candidate])}
+    shared = sorted(baseline.keys() & candidate.keys())
+
+    print(f"{'route':<48} {'count':>6} {'p50 a':>8} {'p50 b':>8} {'p95 a':>8} {'p95 b':>8} {'p95 Δ':>8}")
+    groups = _by_route([baseline[index] for index in shared])
+    for name, group in sorted(groups.items()):
+        indexes = [record["index"] for record in group]
+        a = sorted(baseline[index]["duration_ms"] for index in indexes)
+        b = sorted(candidate[index]["duration_ms"] for index in indexes)
+        p95_a, p95_b = percentile(a, 95), percentile(b, 95)
+        change = f"{(p95_b - p95_a) / p95_a * 100:+.0f}%" if p95_a else "-"
+        print(f"{name[:48]:<48} {len(group):>6} {percentile(a, 50):>8.1f} {percentile(b, 50):>8.1f} "
+              f"{p95_a:>8.1f} {p95_b:>8.1f} {change:>8}")
+
+    changes = Counter()
+    regressions = 0
+    for index in shared:
+        status_a, status_b = baseline[index]["status"], candidate[index]["status"]
+        if status_a != status_b:
+            record = baseline[index]
+            changes[(f"{record['method']} {record['route']}", status_a, status_b)] += 1
+            if status_b >= 500 > status_a:
+                regressions += 1
+
+    if changes:
+        print("\nStatus changes (baseline -> candidate):")
+        for (name, status_a, status_b), count in changes.most_common():
+            print(f"  {name}: {status_a} -> {status_b} x{count}")
+    else:
+        print("\nNo status changes")
+    missing = len(baseline.keys() ^ candidate.keys())
+    if missing:
+        print(f"{missing} requests appear in only one of the files")
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay captured traffic and compare runs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="replay a capture against a fresh app")
+    run_parser.add_argument("capture", nargs="+", help="capture files (merged by timestamp)")
+    target = run_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--db", help="SQLite snapshot; replayed against a temporary copy")
+    target.add_argument("--database-url", help="database to replay against; must be a fresh restore")
+    run_parser.add_argument("--speed", type=float, default=1.0,
+                            help="time acceleration; 0 sends requests back to back")
+    run_parser.add_argument("--max-in-flight", type=int, default=64)
+    run_parser.add_argument("--out", help="write per-request results as JSON lines")
+    run_parser.set_defaults(handler=run)
+
+    soak_parser = commands.add_parser("soak", help="replay in a loop and assert bounded memory growth")
+    soak_parser.add_argument("capture", nargs="+")
+    soak_target = soak_parser.add_mutually_exclusive_group(required=True)
+    soak_target.add_argument("--db", help="SQLite snapshot; replayed against a temporary copy")
+    soak_target.add_argument("--database-url", help="database to replay against; must be a fresh restore")
+    soak_parser.add_argument("--duration", type=float, default=3600, help="seconds to keep replaying")
+    soak_parser.add_argument("--speed", type=float, default=0.0,
+                             help="time acceleration; 0 (default) sends requests back to back")
+    soak_parser.add_argument("--max-in-flight", type=int, default=64)
+    soak_parser.add_argument("--warmup-passes", type=int, default=1,
+                             help="passes before the baseline RSS is taken")
+    soak_parser.add_argument("--max-rss-growth-mb", type=float, default=64)
+    soak_parser.set_defaults(handler=soak)
+
+    report_parser = commands.add_parser("report", help="latency distribution of a run or capture")
+    report_parser.add_argument("results", nargs="+")
+    report_parser.set_defaults(handler=report)
+
+    compare_parser = commands.add_parser("compare", help="latency and status diff of two runs")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import math
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+import shards
+from database import dialect_insert
+
+# Log-scale buckets, each ~19% wider than the previous one (2 ** 0.25)
+BUCKET_BASE = 2 ** 0.25
+LATENCY_METRICS = {"Assigned": "assign", "Fulfilled": "fulfill"}
+PERCENTILES = (0.5, 0.9, 0.99)
+
+histogram_table = models.LatencyHistogramBucket.__table__
+
+
+def bucket_for(seconds: float) -> int:
+    return int(math.floor(math.log(max(seconds, 1.0), BUCKET_BASE)))
+
+
+def bucket_value(bucket: int) -> float:
+    # Geometric midpoint of [BASE ** bucket, BASE ** (bucket + 1))
+    return BUCKET_BASE ** (bucket + 0.5)
+
+
+def _elapsed_seconds(since: Optional[datetime], now: datetime) -> int:
+    if since is None:
+        return 0
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return max(int((now - since).total_seconds()), 0)
+
+
+def record_status_change(
+    db: Session,
+    request: models.Request,
+    old_status: Optional[str],
+    user_id: Optional[int] = None
+):
+    """
+    Append a status transition for `request` and count its latency into the
+    histogram, in the caller's transaction. Uses only values the caller has
+    already loaded, so it adds inserts but no reads.
+    """
+    if request.status == old_status:
+        return
+
+    now = datetime.utcnow()
+    elapsed = _elapsed_seconds(request.created_at, now)
+    db.add(models.RequestStatusEvent(
+        request_id=request.id,
+        from_status=old_status,
+        to_status=request.status,
+        district=request.district,
+        foodbank_id=request.assigned_to_id or None,
+        changed_by_id=user_id,
+        seconds_since_created=elapsed,
+        created_at=now
+    ))
+
+    metric = LATENCY_METRICS.get(request.status)
+    if metric is None:
+        return
+
+    upsert = dialect_insert(db, histogram_table).values(
+        metric=metric,
+        district=request.district or "",
+        foodbank_id=request.assigned_to_id or 0,
+        bucket=bucket_for(elapsed),
+        count=1
+    )
+    db.execute(upsert.on_conflict_do_update(
+        index_elements=[
+            histogram_table.c.metric,
+            histogram_table.c.district,
+            histogram_table.c.foodbank_id,
+            histogram_table.c.bucket
+        ],
+        set_={"count": histogram_table.c.count + 1}
+    ))
+
+
+def _percentiles(buckets: Dict[int, int]) -> Tuple[int, List[float]]:
+    total = sum(buckets.values())
+    values = []
+    ordered = sorted(buckets.items())
+    for percentile in PERCENTILES:
+        target = percentile * total
+        cumulative = 0
+        for bucket, count in ordered:
+            cumulative += count
+            if cumulative >= target:
+                values.append(round(bucket_value(bucket), 1))
+                break
+    return total, values
+
+
+def latency_stats(db: Session, metric: str, group_by: str) -> List[schemas.LatencyStats]:
+    """
+    p50/p90/p99 latencies per district, foodbank or (district, foodbank),
+    computed from the histogram buckets rather than raw events.
+    """
+    Bucket = models.LatencyHistogramBucket
+    # Buckets are kept per shard; counts for the same group simply add up
+    pages = shards.fan_out(lambda shard_db: shard_db.query(
+        Bucket.district, Bucket.foodbank_id, Bucket.bucket, Bucket.count
+    ).filter(Bucket.metric == metric).all(), db=db)
+    rows = [row for page in pages.values() for row in page]
+
+    groups = {}
+    for district, foodbank_id, bucket, count in rows:
+        key = (
+            district if group_by in ("district", "both") else None,
+            (foodbank_id or None) if group_by in ("foodbank", "both") else None
+        )
+        group = groups.setdefault(key, {})
+        group[bucket] = group.get(bucket, 0) + count
+
+    stats = []
+    for (district, foodbank_id), buckets in sorted(groups.items(), key=lambda item: (str(item[0][0]), item[0][1] or 0)):
+        count, (p50, p90, p99) = _percentiles(buckets)
+        stats.append(schemas.LatencyStats(
+            metric=metric,
+            district=district,
+            foodbank_id=foodbank_id,
+            count=count,
+            p50_seconds=p50,
+            p90_seconds=p90,
+            p99_seconds=p99
+        ))
+    return stats
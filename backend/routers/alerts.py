@@ -0,0 +1,142 @@
+from datetime import datetime
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.orm import Session
+
+import alerts
+import models
+import schemas
+import shards
+from database import get_db
+from auth import get_current_active_user
+
+router = APIRouter(tags=["alerts"])
+
+def _get_managed_foodbank(db: Session, foodbank_id: int, current_user: models.User) -> models.FoodBank:
+    db_foodbank = db.query(models.FoodBank).filter(models.FoodBank.id == foodbank_id).first()
+    if not db_foodbank:
+        raise HTTPException(status_code=404, detail="Foodbank not found")
+    
+    if current_user.role == "foodbank" and db_foodbank.admin_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to manage this foodbank's alerts")
+    elif current_user.role == "user":
+        raise HTTPException(status_code=403, detail="Regular users cannot manage stock alerts")
+    
+    # Thresholds and alerts live on the foodbank's shard, next to its inventory
+    shards.use(db, shards.shard_for_foodbank(db_foodbank))
+    return db_foodbank
+
+@router.get("/foodbanks/{foodbank_id}/thresholds", response_model=List[schemas.StockThreshold])
+def get_stock_thresholds(
+    foodbank_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    _get_managed_foodbank(db, foodbank_id, current_user)
+    return db.query(models.StockThreshold).filter(
+        models.StockThreshold.foodbank_id == foodbank_id
+    ).order_by(models.StockThreshold.food_item_id).all()
+
+@router.put("/foodbanks/{foodbank_id}/thresholds/{food_item_id}", response_model=schemas.StockThreshold)
+def set_stock_threshold(
+    foodbank_id: int,
+    food_item_id: int,
+    threshold: schemas.StockThresholdUpdate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    Create or replace the low-stock rule for one food item. Stock at or below
+    low_level raises an alert; it re-arms once stock is back at restore_level
+    (default 20% above low_level), and alerts for the same item are at least
+    cooldown_seconds apart.
+    """
+    _get_managed_foodbank(db, foodbank_id, current_user)
+    
+    db_food_item = db.query(models.FoodItem).filter(models.FoodItem.id == food_item_id).first()
+    if not db_food_item:
+        raise HTTPException(status_code=404, detail="Food item not found")
+    
+    restore_level = threshold.restore_level
+    if restore_level is None:
+        restore_level = alerts.default_restore_level(threshold.low_level)
+    if restore_level <= threshold.low_level:
+        raise HTTPException(status_code=400, detail="restore_level must be greater than low_level")
+    
+    db_threshold = db.query(models.StockThreshold).filter(
+        models.StockThreshold.foodbank_id == foodbank_id,
+        models.StockThreshold.food_item_id == food_item_id
+    ).first()
+    if not db_threshold:
+        db_threshold = models.StockThreshold(
+            foodbank_id=foodbank_id,
+            food_item_id=food_item_id,
+            state="ok"
+        )
+        db.add(db_threshold)
+    
+    db_threshold.low_level = threshold.low_level
+    db_threshold.restore_level = restore_level
+    db_threshold.cooldown_seconds = threshold.cooldown_seconds
+    db.flush()
+    
+    # Stock that is already low alerts straight away
+    alerts.evaluate(db, [(foodbank_id, food_item_id)])
+    db.commit()
+    db.refresh(db_threshold)
+    return db_threshold
+
+@router.delete("/foodbanks/{foodbank_id}/thresholds/{food_item_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_stock_threshold(
+    foodbank_id: int,
+    food_item_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    _get_managed_foodbank(db, foodbank_id, current_user)
+    deleted = db.query(models.StockThreshold).filter(
+        models.StockThreshold.foodbank_id == foodbank_id,
+        models.StockThreshold.food_item_id == food_item_id
+    ).delete(synchronize_session=False)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Threshold not found")
+    
+    db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.get("/foodbanks/{foodbank_id}/alerts", response_model=List[schemas.StockAlert])
+def get_stock_alerts(
+    foodbank_id: int,
+    unacknowledged_only: bool = False,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    _get_managed_foodbank(db, foodbank_id, current_user)
+    query = db.query(models.StockAlert).filter(models.StockAlert.foodbank_id == foodbank_id)
+    if unacknowledged_only:
+        query = query.filter(models.StockAlert.acknowledged_at.is_(None))
+    
+    return query.order_by(models.StockAlert.created_at.desc(), models.StockAlert.id.desc()).limit(limit).all()
+
+@router.post("/foodbanks/{foodbank_id}/alerts/{alert_id}/acknowledge", response_model=schemas.StockAlert)
+def acknowledge_stock_alert(
+    foodbank_id: int,
+    alert_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    _get_managed_foodbank(db, foodbank_id, current_user)
+    db_alert = db.query(models.StockAlert).filter(
+        models.StockAlert.id == alert_id,
+        models.StockAlert.foodbank_id == foodbank_id
+    ).first()
+    if not db_alert:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    
+    if db_alert.acknowledged_at is None:
+        db_alert.acknowledged_at = datetime.utcnow()
+        db_alert.acknowledged_by_id = current_user.id
+        db.commit()
+        db.refresh(db_alert)
+    return db_alert
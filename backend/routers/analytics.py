@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+import analytics
+import jobs
+import models
+import schemas
+from database import get_db
+from auth import get_current_org_user
+
+router = APIRouter(tags=["analytics"])
+
+# Read from the memory-mapped snapshot, never from the transactional tables.
+# Figures lag the database by up to one refresh; each response says how stale it is.
+
+def _require_snapshot(db: Session) -> analytics.Snapshot:
+    snapshot = analytics.load_snapshot()
+    if snapshot is None:
+        pending = db.query(models.Job.id).filter(
+            models.Job.kind == "analytics_snapshot",
+            models.Job.status.in_(("queued", "running"))
+        ).first()
+        if not pending:
+            jobs.enqueue(db, "analytics_snapshot", payload={"full": True})
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Analytics snapshot is being built, try again shortly",
+            headers={"Retry-After": "30"}
+        )
+    return snapshot
+
+@router.get("/analytics/dashboard", response_model=schemas.AnalyticsDashboard)
+def get_analytics_dashboard(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_org_user)
+):
+    snapshot = _require_snapshot(db)
+    return {"snapshot": snapshot.freshness(), **analytics.dashboard(snapshot)}
+
+@router.get("/analytics/trends", response_model=schemas.AnalyticsTrends)
+def get_analytics_trends(
+    days: int = Query(30, ge=1, le=366),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_org_user)
+):
+    """
+    Requests created per day and district over the last `days` days.
+    """
+    snapshot = _require_snapshot(db)
+    return {"snapshot": snapshot.freshness(), "points": analytics.trends(snapshot, days)}
+
+@router.get("/analytics/shortfall", response_model=schemas.AnalyticsShortfall)
+def get_analytics_shortfall(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_org_user)
+):
+    """
+    Quantity requested by open (pending or assigned) requests against stock
+    on hand, per food item, largest gap first.
+    """
+    snapshot = _require_snapshot(db)
+    return {"snapshot": snapshot.freshness(), "items": analytics.shortfall(snapshot)}
@@ -0,0 +1,79 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+import diagnostics
+import models
+import schemas
+from auth import get_current_org_user
+
+router = APIRouter(tags=["diagnostics"])
+
+# Memory diagnostics for the worker that serves the call (see "pid" in each response).
+# Tracing costs CPU and memory while enabled, so start it only for an investigation.
+
+GROUP_BY_PATTERN = "^(lineno|filename|traceback)$"
+
+@router.get("/diagnostics/memory", response_model=schemas.MemoryStatus)
+def get_memory_status(current_user: models.User = Depends(get_current_org_user)):
+    return diagnostics.status()
+
+@router.post("/diagnostics/memory/start", response_model=schemas.MemoryStatus)
+def start_tracing(
+    frames: int = Query(diagnostics.DEFAULT_TRACE_FRAMES, ge=1, le=100),
+    current_user: models.User = Depends(get_current_org_user)
+):
+    diagnostics.start(frames)
+    return diagnostics.status()
+
+@router.post("/diagnostics/memory/stop", response_model=schemas.MemoryStatus)
+def stop_tracing(current_user: models.User = Depends(get_current_org_user)):
+    diagnostics.stop()
+    return diagnostics.status()
+
+@router.post("/diagnostics/memory/snapshots", response_model=schemas.MemorySnapshotInfo)
+def take_memory_snapshot(current_user: models.User = Depends(get_current_org_user)):
+    snapshot = diagnostics.take_snapshot()
+    if snapshot is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Tracing is not running on this worker; start it first"
+        )
+    return snapshot
+
+@router.get("/diagnostics/memory/snapshots/{snapshot_id}/top", response_model=List[schemas.AllocationSite])
+def get_top_allocation_sites(
+    snapshot_id: int,
+    limit: int = Query(25, ge=1, le=500),
+    group_by: str = Query("lineno", regex=GROUP_BY_PATTERN),
+    current_user: models.User = Depends(get_current_org_user)
+):
+    sites = diagnostics.top_sites(snapshot_id, limit, group_by)
+    if sites is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found on this worker")
+    return sites
+
+@router.get("/diagnostics/memory/snapshots/{snapshot_id}/diff", response_model=schemas.MemorySnapshotDiff)
+def diff_memory_snapshots(
+    snapshot_id: int,
+    against: Optional[int] = None,
+    limit: int = Query(25, ge=1, le=500),
+    group_by: str = Query("lineno", regex=GROUP_BY_PATTERN),
+    current_user: models.User = Depends(get_current_org_user)
+):
+    """
+    Allocation sites that grew the most since snapshot `against` (by default
+    the previous snapshot).
+    """
+    result = diagnostics.diff(snapshot_id, against, limit, group_by)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Snapshots not found on this worker")
+    return result
+
+@router.get("/diagnostics/objects", response_model=schemas.ObjectCounts)
+def get_object_counts(
+    collect: bool = True,
+    limit: int = Query(50, ge=1, le=500),
+    current_user: models.User = Depends(get_current_org_user)
+):
+    return diagnostics.object_counts(collect, limit)
@@ -0,0 +1,61 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+import events
+import models
+from auth import oauth2_scheme, user_from_token
+from database import SessionLocal
+from serialization import dumps
+
+router = APIRouter(tags=["events"])
+
+EVENT_STREAM_HEARTBEAT_SECONDS = 15
+
+@router.get("/events/stream")
+async def stream_events(
+    request: Request,
+    topic: Optional[str] = None,
+    token: str = Depends(oauth2_scheme)
+):
+    """
+    Server-sent events for changes committed by this worker (e.g. stock.low,
+    stock.restored). Events are not shared between workers: with several
+    workers a client only hears about writes served by the worker it is
+    connected to. Org admins see every foodbank, foodbank admins their own.
+    `topic` filters by prefix, e.g. ?topic=stock.
+    """
+    # Streams stay open for hours, so the caller is resolved in a short
+    # session instead of a get_db dependency that would hold a pooled
+    # connection until the client goes away
+    foodbank_id = None
+    with SessionLocal() as db:
+        current_user = user_from_token(db, token)
+        if not current_user.is_active:
+            raise HTTPException(status_code=400, detail="Inactive user")
+        if current_user.role == "foodbank":
+            foodbank = db.query(models.FoodBank).filter(models.FoodBank.admin_id == current_user.id).first()
+            if not foodbank:
+                raise HTTPException(status_code=404, detail="Foodbank not found")
+            foodbank_id = foodbank.id
+        elif current_user.role != "org":
+            raise HTTPException(status_code=403, detail="Not authorized to subscribe to events")
+    
+    async def event_source():
+        with events.subscribe(foodbank_id) as queue:
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=EVENT_STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if topic and not message["topic"].startswith(topic):
+                    continue
+                yield f"id: {message['id']}\nevent: {message['topic']}\ndata: {dumps(message).decode()}\n\n"
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
@@ -1,14 +1,69 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 
+import compression
+import jobs
+import ledger
 import models
+import reference
+import routing
 import schemas
+import shards
+import workspace
 from database import get_db
 from auth import get_current_active_user, get_current_foodbank_user, get_current_org_user
+from concurrency import check_if_match, retry_on_conflict, set_etag
+from serialization import FastJSONResponse, food_item_dict
 
 router = APIRouter(tags=["foodbank"])
 
+FOODBANK_COLUMNS = (
+    models.FoodBank.name,
+    models.FoodBank.location,
+    models.FoodBank.district,
+    models.FoodBank.contact_info,
+    models.FoodBank.latitude,
+    models.FoodBank.longitude,
+    models.FoodBank.id,
+    models.FoodBank.admin_id,
+    models.FoodBank.created_at,
+)
+FOODBANK_FIELDS = tuple(column.key for column in FOODBANK_COLUMNS)
+
+def _fast_inventory_payload(db: Session, foodbank_id: int):
+    """
+    Build the List[schemas.InventoryItem] payload from column-projected tuples.
+    Food items come from the reference cache, as they live on the primary.
+    """
+    rows = db.query(
+        models.InventoryItem.food_item_id,
+        models.InventoryItem.quantity,
+        models.InventoryItem.id,
+        models.InventoryItem.foodbank_id,
+        models.InventoryItem.reserved,
+        models.InventoryItem.last_updated,
+        models.InventoryItem.version
+    ).filter(
+        models.InventoryItem.foodbank_id == foodbank_id
+    ).all()
+    food_items = reference.food_items_by_id({row[0] for row in rows})
+    
+    return [
+        {
+            "food_item_id": food_item_id,
+            "quantity": quantity,
+            "id": item_id,
+            "foodbank_id": item_foodbank_id,
+            "reserved": reserved,
+            "last_updated": last_updated,
+            "version": version,
+            "food_item": food_item_dict(food_item.id, food_item.name, food_item.icon, food_item.category)
+        }
+        for food_item_id, quantity, item_id, item_foodbank_id, reserved, last_updated, version in rows
+        for food_item in [food_items.get(food_item_id)] if food_item is not None
+    ]
+
 # Foodbank CRUD operations
 @router.post("/foodbanks", response_model=schemas.FoodBank)
 def create_foodbank(
@@ -38,30 +93,62 @@ def create_foodbank(
     db.add(db_foodbank)
     db.commit()
     db.refresh(db_foodbank)
+    reference.invalidate()
+    # Coverage grids only need the new site folded in, not a full rebuild
+    jobs.enqueue(db, "coverage", payload={"foodbank_id": db_foodbank.id}, user_id=current_user.id)
     return db_foodbank
 
 @router.get("/foodbanks", response_model=List[schemas.FoodBank])
 def get_foodbanks(
     district: str = None,
-    db: Session = Depends(get_db),
+    accept_encoding: Optional[str] = Header(None),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    query = db.query(models.FoodBank)
-    
     if district:
-        query = query.filter(models.FoodBank.district == district)
+        return reference.foodbanks(district)
+    return compression.precompressed_response(accept_encoding, reference.foodbanks_payload())
+
+# Declared before /foodbanks/{foodbank_id} so "me" is never parsed as an id
+@router.get("/foodbanks/me/workspace", response_model=schemas.FoodbankWorkspace)
+def get_my_workspace(
+    accept_encoding: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_foodbank_user)
+):
+    """
+    Everything the foodbank pages need in one call: the foodbank, its
+    inventory with food items, pending/assigned request summaries and
+    counters. Cached per foodbank and dropped on inventory or request writes.
+    """
+    db_foodbank = db.query(models.FoodBank).filter(models.FoodBank.admin_id == current_user.id).first()
+    if not db_foodbank:
+        raise HTTPException(status_code=404, detail="Foodbank not found")
+    shards.use(db, shards.shard_for_foodbank(db_foodbank))
     
-    return query.all()
+    return compression.precompressed_response(accept_encoding, workspace.get(db, db_foodbank))
 
 @router.get("/foodbanks/{foodbank_id}", response_model=schemas.FoodBankWithInventory)
 def get_foodbank(
     foodbank_id: int,
+    fast: bool = False,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
+    # Opt-in fast path: same schema, serialized straight from column tuples
+    if fast:
+        row = db.query(*FOODBANK_COLUMNS).filter(models.FoodBank.id == foodbank_id).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="Foodbank not found")
+        
+        payload = dict(zip(FOODBANK_FIELDS, row))
+        shards.use(db, shards.shard_for_district(payload["district"]))
+        payload["inventory_items"] = _fast_inventory_payload(db, foodbank_id)
+        return FastJSONResponse(payload)
+    
     db_foodbank = db.query(models.FoodBank).filter(models.FoodBank.id == foodbank_id).first()
     if not db_foodbank:
         raise HTTPException(status_code=404, detail="Foodbank not found")
+    shards.use(db, shards.shard_for_foodbank(db_foodbank))
     
     return db_foodbank
 
@@ -80,6 +167,7 @@ def get_foodbank_inventory(
     # If foodbank user, check if they are the admin
     if current_user.role == "foodbank" and db_foodbank.admin_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to access this foodbank's inventory")
+    shards.use(db, shards.shard_for_foodbank(db_foodbank))
     
     inventory = db.query(models.InventoryItem).filter(models.InventoryItem.foodbank_id == foodbank_id).all()
     return inventory
@@ -106,36 +194,26 @@ def add_inventory_item(
     db_food_item = db.query(models.FoodItem).filter(models.FoodItem.id == inventory_item.food_item_id).first()
     if not db_food_item:
         raise HTTPException(status_code=404, detail="Food item not found")
+    shards.use(db, shards.shard_for_foodbank(db_foodbank))
+    
+    # Stock arrives as an intake entry; the ledger creates or increments the snapshot row.
+    # Intakes commute, so a deadlock or lock timeout is simply retried
+    retry_on_conflict(db, lambda: ledger.intake(
+        db, foodbank_id, inventory_item.food_item_id, inventory_item.quantity, current_user.id
+    ))
     
-    # Check if item already exists in inventory
-    existing_item = db.query(models.InventoryItem).filter(
+    return db.query(models.InventoryItem).filter(
         models.InventoryItem.foodbank_id == foodbank_id,
         models.InventoryItem.food_item_id == inventory_item.food_item_id
     ).first()
-    
-    if existing_item:
-        # Update quantity instead of creating new entry
-        existing_item.quantity += inventory_item.quantity
-        db.commit()
-        db.refresh(existing_item)
-        return existing_item
-    
-    # Create new inventory item
-    db_inventory_item = models.InventoryItem(
-        foodbank_id=foodbank_id,
-        food_item_id=inventory_item.food_item_id,
-        quantity=inventory_item.quantity
-    )
-    db.add(db_inventory_item)
-    db.commit()
-    db.refresh(db_inventory_item)
-    return db_inventory_item
 
 @router.put("/foodbanks/{foodbank_id}/inventory/{item_id}", response_model=schemas.InventoryItem)
 def update_inventory_item(
     foodbank_id: int,
     item_id: int,
     inventory_update: schemas.InventoryItemUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
@@ -150,6 +228,10 @@ def update_inventory_item(
     elif current_user.role == "user":
         raise HTTPException(status_code=403, detail="Regular users cannot modify inventory")
     
+    if (inventory_update.quantity is None) == (inventory_update.delta is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of quantity or delta")
+    shards.use(db, shards.shard_for_foodbank(db_foodbank))
+    
     # Check if inventory item exists
     db_inventory_item = db.query(models.InventoryItem).filter(
         models.InventoryItem.id == item_id,
@@ -159,8 +241,75 @@ def update_inventory_item(
     if not db_inventory_item:
         raise HTTPException(status_code=404, detail="Inventory item not found")
     
-    # Update inventory item
-    db_inventory_item.quantity = inventory_update.quantity
-    db.commit()
+    if inventory_update.delta is not None:
+        # Deltas commute, so they are appended without a version check and retried on lock conflicts
+        retry_on_conflict(db, lambda: ledger.adjust(db, db_inventory_item, inventory_update.delta, current_user.id))
+    else:
+        # Absolute overwrites must not clobber an edit the client never saw
+        check_if_match(db_inventory_item, if_match)
+        applied = ledger.adjust(
+            db, db_inventory_item,
+            inventory_update.quantity - db_inventory_item.quantity,
+            current_user.id,
+            expected_version=db_inventory_item.version
+        )
+        if not applied:
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Resource was modified by another user")
+        db.commit()
+    
     db.refresh(db_inventory_item)
-    return db_inventory_item
\ No newline at end of file
+    set_etag(response, db_inventory_item)
+    return db_inventory_item
+
+@router.get("/foodbanks/{foodbank_id}/inventory/history", response_model=List[schemas.InventoryLedgerEntry])
+def get_inventory_history(
+    foodbank_id: int,
+    food_item_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    Stock movements for a foodbank, newest first, read straight from the ledger.
+    """
+    db_foodbank = db.query(models.FoodBank).filter(models.FoodBank.id == foodbank_id).first()
+    if not db_foodbank:
+        raise HTTPException(status_code=404, detail="Foodbank not found")
+    
+    if current_user.role == "foodbank" and db_foodbank.admin_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this foodbank's inventory")
+    elif current_user.role == "user":
+        raise HTTPException(status_code=403, detail="Regular users cannot view inventory history")
+    shards.use(db, shards.shard_for_foodbank(db_foodbank))
+    
+    return ledger.history(db, foodbank_id, food_item_id, limit=limit, offset=offset)
+
+@router.get("/foodbanks/{foodbank_id}/route", response_model=schemas.DeliveryPlan)
+def get_delivery_route(
+    foodbank_id: int,
+    vehicles: int = Query(1, ge=1, le=20),
+    capacity: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    Suggested delivery routes over the foodbank's Assigned requests for
+    `vehicles` vehicles, each carrying at most `capacity` item units.
+    Requests that do not fit are listed in unassigned_request_ids.
+    """
+    db_foodbank = db.query(models.FoodBank).filter(models.FoodBank.id == foodbank_id).first()
+    if not db_foodbank:
+        raise HTTPException(status_code=404, detail="Foodbank not found")
+    
+    if current_user.role == "foodbank" and db_foodbank.admin_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to plan routes for this foodbank")
+    elif current_user.role == "user":
+        raise HTTPException(status_code=403, detail="Regular users cannot plan routes")
+    
+    if db_foodbank.latitude is None or db_foodbank.longitude is None:
+        raise HTTPException(status_code=400, detail="Foodbank has no coordinates")
+    shards.use(db, shards.shard_for_foodbank(db_foodbank))
+    
+    return routing.plan_routes(db, db_foodbank, vehicles, capacity)
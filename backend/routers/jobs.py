@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+from database import get_db
+from auth import get_current_active_user
+
+router = APIRouter(tags=["jobs"])
+
+@router.get("/jobs/{job_id}", response_model=schemas.Job)
+def get_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    Status, progress and result of a background job.
+    Org admins can see every job, other users only the jobs they started.
+    """
+    db_job = db.query(models.Job).filter(models.Job.id == job_id).first()
+    if not db_job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if current_user.role != "org" and db_job.created_by_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to view this job")
+    
+    return db_job
@@ -1,10 +1,19 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
+import compression
+import exports
+import jobs
 import models
+import reference
+import request_history
 import schemas
+import service_coverage
+import shards
 from database import get_db
 from auth import get_current_org_user
 
@@ -15,83 +24,125 @@ def get_dashboard_stats(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_org_user)
 ):
-    # Get counts of requests by status
-    total_requests = db.query(func.count(models.Request.id)).scalar()
-    pending_requests = db.query(func.count(models.Request.id)).filter(models.Request.status == "Pending").scalar()
-    assigned_requests = db.query(func.count(models.Request.id)).filter(models.Request.status == "Assigned").scalar()
-    fulfilled_requests = db.query(func.count(models.Request.id)).filter(models.Request.status == "Fulfilled").scalar()
+    # One grouped count query and one inventory projection per shard, run in
+    # parallel; names come from the reference cache instead of joins
+    def shard_rows(shard_db: Session):
+        request_counts = shard_db.query(
+            models.Request.district, models.Request.status, func.count(models.Request.id)
+        ).group_by(models.Request.district, models.Request.status).all()
+        # Closed requests moved to the archive still count as fulfilled (or cancelled)
+        request_counts += shard_db.query(
+            models.ArchivedRequest.district, models.ArchivedRequest.status, func.count(models.ArchivedRequest.id)
+        ).group_by(models.ArchivedRequest.district, models.ArchivedRequest.status).all()
+        inventory_rows = shard_db.query(
+            models.InventoryItem.food_item_id, models.InventoryItem.foodbank_id, models.InventoryItem.quantity
+        ).all()
+        return request_counts, inventory_rows
     
-    # Get district stats
-    district_stats = []
-    districts = db.query(models.District).all()
+    request_counts, inventory_rows = [], []
+    for shard_counts, shard_inventory in shards.fan_out(shard_rows, db=db).values():
+        request_counts += shard_counts
+        inventory_rows += shard_inventory
     
-    for district in districts:
-        district_total = db.query(func.count(models.Request.id)).filter(models.Request.district == district.name).scalar()
-        district_pending = db.query(func.count(models.Request.id)).filter(
-            models.Request.district == district.name,
-            models.Request.status == "Pending"
-        ).scalar()
-        district_assigned = db.query(func.count(models.Request.id)).filter(
-            models.Request.district == district.name,
-            models.Request.status == "Assigned"
-        ).scalar()
-        district_fulfilled = db.query(func.count(models.Request.id)).filter(
-            models.Request.district == district.name,
-            models.Request.status == "Fulfilled"
-        ).scalar()
-        
+    totals = {}
+    by_district = {}
+    for district, request_status, count in request_counts:
+        totals[request_status] = totals.get(request_status, 0) + count
+        district_counts = by_district.setdefault(district, {})
+        district_counts[request_status] = district_counts.get(request_status, 0) + count
+    inventory = {}
+    for food_item_id, foodbank_id, quantity in inventory_rows:
+        inventory.setdefault(food_item_id, []).append((foodbank_id, quantity or 0))
+    
+    district_stats = []
+    for district in reference.districts():
+        district_counts = by_district.get(district.name, {})
         district_stats.append(schemas.DistrictStats(
             district=district.name,
-            total_requests=district_total,
-            pending_requests=district_pending,
-            assigned_requests=district_assigned,
-            fulfilled_requests=district_fulfilled
+            total_requests=sum(district_counts.values()),
+            pending_requests=district_counts.get("Pending", 0),
+            assigned_requests=district_counts.get("Assigned", 0),
+            fulfilled_requests=district_counts.get("Fulfilled", 0)
         ))
     
-    # Get inventory stats
+    foodbank_names = {foodbank.id: foodbank.name for foodbank in reference.foodbanks()}
     inventory_stats = []
-    food_items = db.query(models.FoodItem).all()
-    
-    for food_item in food_items:
-        total_quantity = db.query(func.sum(models.InventoryItem.quantity)).filter(
-            models.InventoryItem.food_item_id == food_item.id
-        ).scalar() or 0
-        
-        foodbank_quantities = {}
-        foodbank_inventory = db.query(
-            models.FoodBank.name, 
-            models.InventoryItem.quantity
-        ).join(
-            models.InventoryItem, 
-            models.FoodBank.id == models.InventoryItem.foodbank_id
-        ).filter(
-            models.InventoryItem.food_item_id == food_item.id
-        ).all()
-        
-        for foodbank_name, quantity in foodbank_inventory:
-            foodbank_quantities[foodbank_name] = quantity
-        
+    for food_item in reference.food_items():
+        rows = inventory.get(food_item.id, [])
         inventory_stats.append(schemas.InventoryStats(
             food_item=food_item.name,
-            total_quantity=total_quantity,
-            foodbanks=foodbank_quantities
+            total_quantity=sum(quantity for _, quantity in rows),
+            foodbanks={
+                foodbank_names[foodbank_id]: quantity
+                for foodbank_id, quantity in rows if foodbank_id in foodbank_names
+            }
         ))
     
     return schemas.DashboardStats(
-        total_requests=total_requests,
-        pending_requests=pending_requests,
-        assigned_requests=assigned_requests,
-        fulfilled_requests=fulfilled_requests,
+        total_requests=sum(totals.values()),
+        pending_requests=totals.get("Pending", 0),
+        assigned_requests=totals.get("Assigned", 0),
+        fulfilled_requests=totals.get("Fulfilled", 0),
         district_stats=district_stats,
         inventory_stats=inventory_stats
     )
 
+@router.get("/stats/latency", response_model=List[schemas.LatencyStats])
+def get_latency_stats(
+    metric: str = Query("fulfill", regex="^(assign|fulfill)$"),
+    group_by: str = Query("district", regex="^(district|foodbank|both)$"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_org_user)
+):
+    """
+    Time-to-assign or time-to-fulfill percentiles (seconds since the request
+    was created) per district and/or foodbank.
+    """
+    return request_history.latency_stats(db, metric, group_by)
+
+@router.get("/stats/coverage", response_model=schemas.CoverageReport)
+def get_coverage_stats(
+    district: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_org_user)
+):
+    """
+    Distance from each district's area to the nearest foodbank, weighted by
+    where requests come from, with the most underserved cells as hotspots.
+    Served from the cached coverage grids; recomputed daily and whenever a
+    foodbank is added.
+    """
+    summary = service_coverage.load_summary()
+    if summary is None:
+        pending = db.query(models.Job.id).filter(
+            models.Job.kind == "coverage",
+            models.Job.status.in_(("queued", "running"))
+        ).first()
+        if not pending:
+            jobs.enqueue(db, "coverage", user_id=current_user.id)
+        raise HTTPException(
+            status_code=503,
+            detail="Coverage analysis is being computed, try again shortly",
+            headers={"Retry-After": "60"}
+        )
+    
+    districts = summary["districts"]
+    if district:
+        districts = [entry for entry in districts if entry["district"] == district]
+    
+    return {
+        "computed_at": summary["computed_at"],
+        "served_radius_km": service_coverage.COVERAGE_SERVED_KM,
+        "districts": districts
+    }
+
 @router.get("/districts", response_model=List[schemas.District])
 def get_districts(
-    db: Session = Depends(get_db)
+    accept_encoding: Optional[str] = Header(None)
 ):
     # Removed authentication requirement
-    return db.query(models.District).all()
+    # GeoJSON is large, so the cached payload is served precompressed
+    return compression.precompressed_response(accept_encoding, reference.districts_payload())
 
 @router.post("/districts", response_model=schemas.District)
 def create_district(
@@ -113,6 +164,7 @@ def create_district(
     db.add(db_district)
     db.commit()
     db.refresh(db_district)
+    reference.invalidate()
     return db_district
 
 @router.get("/districts/{district_id}", response_model=schemas.District)
@@ -129,10 +181,10 @@ def get_district(
 
 @router.get("/food-items", response_model=List[schemas.FoodItem])
 def get_food_items(
-    db: Session = Depends(get_db)
+    accept_encoding: Optional[str] = Header(None)
 ):
     # This endpoint has always been public
-    return db.query(models.FoodItem).all()
+    return compression.precompressed_response(accept_encoding, reference.food_items_payload())
 
 @router.post("/food-items", response_model=schemas.FoodItem)
 def create_food_item(
@@ -154,4 +206,41 @@ def create_food_item(
     db.add(db_food_item)
     db.commit()
     db.refresh(db_food_item)
-    return db_food_item
\ No newline at end of file
+    reference.invalidate()
+    return db_food_item
+
+# Exports run as background jobs; poll /api/jobs/{id} and download when finished
+@router.post("/exports/requests", response_model=schemas.Job, status_code=status.HTTP_202_ACCEPTED)
+def start_requests_export(
+    status: Optional[str] = None,
+    district: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_org_user)
+):
+    return jobs.enqueue(
+        db, "export_requests",
+        payload={"status": status, "district": district},
+        user_id=current_user.id
+    )
+
+@router.get("/exports/{job_id}/download")
+def download_export(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_org_user)
+):
+    db_job = db.query(models.Job).filter(
+        models.Job.id == job_id,
+        models.Job.kind == "export_requests"
+    ).first()
+    if not db_job:
+        raise HTTPException(status_code=404, detail="Export not found")
+    
+    if db_job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Export is {db_job.status}")
+    
+    path = exports.export_path(db_job.id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Export file no longer exists")
+    
+    return FileResponse(path, media_type="text/csv", filename=os.path.basename(path))
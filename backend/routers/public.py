@@ -1,10 +1,17 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
+import compression
+import idempotency
 import models
+import ratelimit
+import reference
 import schemas
+import shards
+import workspace
 from database import get_db
 
 router = APIRouter(tags=["public"])
@@ -12,46 +19,85 @@ router = APIRouter(tags=["public"])
 @router.get("/public/foodbanks", response_model=List[schemas.FoodBank])
 def get_public_foodbanks(
     district: str = None,
-    db: Session = Depends(get_db)
+    accept_encoding: Optional[str] = Header(None)
 ):
     """
     Public endpoint to get a list of foodbanks without authentication.
-    Can be filtered by district.
+    Can be filtered by district. Served from the in-memory reference cache.
     """
-    query = db.query(models.FoodBank)
-    
     if district:
-        query = query.filter(models.FoodBank.district == district)
-    
-    return query.all()
+        return reference.foodbanks(district)
+    return compression.precompressed_response(accept_encoding, reference.foodbanks_payload())
 
 @router.get("/public/districts", response_model=List[schemas.District])
 def get_public_districts(
-    db: Session = Depends(get_db)
+    accept_encoding: Optional[str] = Header(None)
 ):
     """
     Public endpoint to get a list of districts without authentication.
+    Served precompressed from the in-memory reference cache.
     """
-    return db.query(models.District).all()
+    return compression.precompressed_response(accept_encoding, reference.districts_payload())
 
 @router.get("/public/food-items", response_model=List[schemas.FoodItem])
 def get_public_food_items(
-    db: Session = Depends(get_db)
+    accept_encoding: Optional[str] = Header(None)
 ):
     """
     Public endpoint to get a list of food items without authentication.
+    Served precompressed from the in-memory reference cache.
     """
-    return db.query(models.FoodItem).all()
+    return compression.precompressed_response(accept_encoding, reference.food_items_payload())
 
-@router.post("/public/requests", status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/public/requests",
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(ratelimit.RateLimitByIP(ratelimit.public_submit_by_ip))]
+)
 def create_public_request(
     request_data: dict,
+    http_request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
     """
     Endpoint for creating anonymous food aid requests without authentication.
     Takes the requester's personal details and item requests.
+    Clients should send an Idempotency-Key header so that retries return the
+    original tracking number instead of creating a duplicate request. Reusing
+    a key for a different body is rejected with 422.
     """
+    # The request and its idempotency key live on the shard of the district's state
+    shards.use(db, shards.shard_for_district(request_data.get("district")))
+    
+    if idempotency_key is None:
+        return _create_public_request(db, request_data)
+    
+    if not idempotency_key or len(idempotency_key) > idempotency.MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid Idempotency-Key header"
+        )
+    
+    fingerprint = idempotency.fingerprint(http_request.method, http_request.url.path, request_data)
+    stored = idempotency.lookup(db, idempotency_key, fingerprint)
+    if stored is None:
+        with idempotency.key_lock(idempotency_key):
+            # A concurrent retry may have finished while we waited for the lock
+            stored = idempotency.lookup(db, idempotency_key, fingerprint)
+            if stored is None:
+                return _create_public_request(db, request_data, idempotency_key, fingerprint)
+    
+    response.headers["Idempotent-Replayed"] = "true"
+    return stored
+
+def _create_public_request(
+    db: Session,
+    request_data: dict,
+    idempotency_key: Optional[str] = None,
+    fingerprint: Optional[str] = None
+):
     try:
         # First, create or get user (based on IC number)
         ic_number = request_data.get("ic_number")
@@ -60,6 +106,9 @@ def create_public_request(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="IC number is required"
             )
+        
+        # Idempotent replays return before this point, so only new submissions count
+        ratelimit.enforce(ratelimit.public_submit_by_ic, str(ic_number))
             
         # Check if user with this IC exists
         user = db.query(models.User).filter(models.User.username == f"guest_{ic_number}").first()
@@ -74,8 +123,7 @@ def create_public_request(
                 is_active=True
             )
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            db.flush()
         
         # Create the request
         new_request = models.Request(
@@ -87,8 +135,7 @@ def create_public_request(
             status="Pending"
         )
         db.add(new_request)
-        db.commit()
-        db.refresh(new_request)
+        db.flush()
         
         # Add request items
         for item in request_data.get("items", []):
@@ -99,15 +146,37 @@ def create_public_request(
             )
             db.add(request_item)
         
-        db.commit()
-        
-        return {
+        result = {
             "status": "success", 
             "message": "Request created successfully", 
             "request_id": new_request.id,
             "tracking_number": new_request.tracking_number
         }
         
+        # The key is committed in the same transaction as the request, so a
+        # retry can never observe one without the other
+        if idempotency_key:
+            idempotency.store(db, idempotency_key, fingerprint, result)
+        
+        workspace.invalidate(db, district=new_request.district)
+        db.commit()
+        return result
+    
+    except HTTPException:
+        db.rollback()
+        raise
+    
+    except IntegrityError as e:
+        db.rollback()
+        # Another process committed the same idempotency key first
+        stored = idempotency.lookup(db, idempotency_key, fingerprint) if idempotency_key else None
+        if stored is not None:
+            return stored
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error creating request: {str(e)}"
+        )
+        
     except Exception as e:
         db.rollback()
         raise HTTPException(
@@ -115,7 +184,10 @@ def create_public_request(
             detail=f"Error creating request: {str(e)}"
         )
 
-@router.get("/public/track/{tracking_number}")
+@router.get(
+    "/public/track/{tracking_number}",
+    dependencies=[Depends(ratelimit.RateLimitByIP(ratelimit.public_track_by_ip))]
+)
 def track_request(
     tracking_number: str,
     db: Session = Depends(get_db)
@@ -124,21 +196,42 @@ def track_request(
     Public endpoint to track a request by its tracking number.
     Returns basic status information without sensitive details.
     """
-    request = db.query(models.Request).filter(models.Request.tracking_number == tracking_number).first()
+    def find(shard_db: Session):
+        request = shard_db.query(models.Request).filter(models.Request.tracking_number == tracking_number).first()
+        item_model = models.RequestItem
+        
+        # Closed requests are eventually moved to the archive tables
+        if not request:
+            request = shard_db.query(models.ArchivedRequest).filter(
+                models.ArchivedRequest.tracking_number == tracking_number
+            ).first()
+            item_model = models.ArchivedRequestItem
+        
+        if not request:
+            return None
+        item_rows = shard_db.query(item_model.food_item_id, item_model.quantity).filter(
+            item_model.request_id == request.id
+        ).all()
+        return request, item_rows
     
-    if not request:
+    # Tracking numbers carry no region, so every shard is asked
+    found = [result for result in shards.fan_out(find, db=db).values() if result is not None]
+    if not found:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Request not found"
         )
+    request, item_rows = found[0]
     
     # Get food items for this request
     request_items = []
-    for item in request.request_items:
-        request_items.append({
-            "name": item.food_item.name,
-            "quantity": item.quantity
-        })
+    food_items = reference.food_items_by_id({food_item_id for food_item_id, _ in item_rows})
+    for food_item_id, quantity in item_rows:
+        if food_item_id in food_items:
+            request_items.append({
+                "name": food_items[food_item_id].name,
+                "quantity": quantity
+            })
     
     # Get foodbank info if assigned
     foodbank_info = None
@@ -1,21 +1,113 @@
+import heapq
+import uuid
+from datetime import datetime, timedelta
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import func, or_, tuple_, update
 
+import ledger
 import models
+import reference
+import request_history
 import schemas
-from database import get_db
+import shards
+import sync
+import triage
+import workspace
+from database import get_db, is_postgres
 from auth import get_current_active_user, get_current_foodbank_user, get_current_org_user
+from concurrency import check_if_match, commit_or_conflict, etag_for, set_etag
+from serialization import FastJSONResponse, food_item_dict
 
 router = APIRouter(tags=["requests"])
 
+REQUEST_COLUMNS = (
+    models.Request.location,
+    models.Request.district,
+    models.Request.latitude,
+    models.Request.longitude,
+    models.Request.id,
+    models.Request.tracking_number,
+    models.Request.user_id,
+    models.Request.status,
+    models.Request.created_at,
+    models.Request.fulfilled_at,
+    models.Request.assigned_to_id,
+    models.Request.claimed_by_id,
+    models.Request.claimer,
+    models.Request.lease_expires_at,
+    models.Request.version,
+)
+REQUEST_FIELDS = tuple(column.key for column in REQUEST_COLUMNS)
+
+REQUEST_INCLUDES = ("items",)
+
+def _parse_csv_param(value: Optional[str], allowed, name: str):
+    if value is None:
+        return None
+    
+    selected = [part.strip() for part in value.split(",") if part.strip()]
+    unknown = [part for part in selected if part not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown {name}: {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        )
+    return selected
+
+def _project_requests(db: Session, query, fields=REQUEST_FIELDS, include_items: bool = True):
+    """
+    Build request payloads from column-projected tuples instead of hydrating
+    ORM objects and validating pydantic models. Only the selected columns are
+    read, and request_items are skipped entirely unless include_items is set.
+    Their food items come from the reference cache, since food_items lives on
+    the primary database and request_items on the request's shard. The id
+    column is always returned.
+    """
+    fields = ["id"] + [field for field in fields if field != "id"]
+    columns = [getattr(models.Request, field) for field in fields]
+    
+    items_by_request = {}
+    if include_items:
+        item_rows = db.query(
+            models.RequestItem.food_item_id,
+            models.RequestItem.quantity,
+            models.RequestItem.id,
+            models.RequestItem.request_id
+        ).filter(
+            models.RequestItem.request_id.in_(query.with_entities(models.Request.id))
+        ).all()
+        food_items = reference.food_items_by_id({row[0] for row in item_rows})
+        for food_item_id, quantity, item_id, request_id in item_rows:
+            food_item = food_items.get(food_item_id)
+            if food_item is None:
+                continue
+            items_by_request.setdefault(request_id, []).append({
+                "food_item_id": food_item_id,
+                "quantity": quantity,
+                "id": item_id,
+                "request_id": request_id,
+                "food_item": food_item_dict(food_item.id, food_item.name, food_item.icon, food_item.category)
+            })
+    
+    payload = []
+    for row in query.with_entities(*columns).order_by(models.Request.created_at.desc()):
+        request_dict = dict(zip(fields, row))
+        if include_items:
+            request_dict["request_items"] = items_by_request.get(request_dict["id"], [])
+        payload.append(request_dict)
+    return payload
+
 @router.post("/requests", response_model=schemas.Request)
 def create_request(
     request: schemas.RequestCreate,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
+    # The request and its items live on the shard of the district's state
+    shards.use(db, shards.shard_for_district(request.district))
+    
     # Create new request
     db_request = models.Request(
         user_id=current_user.id,
@@ -26,8 +118,9 @@ def create_request(
         status="Pending"
     )
     db.add(db_request)
-    db.commit()
-    db.refresh(db_request)
+    # Flush for the id only: the request and its items commit together, so no
+    # reader (e.g. an incremental analytics snapshot) sees a request without items
+    db.flush()
     
     # Add request items
     for item in request.items:
@@ -38,6 +131,7 @@ def create_request(
         )
         db.add(db_request_item)
     
+    workspace.invalidate(db, district=db_request.district)
     db.commit()
     db.refresh(db_request)
     return db_request
@@ -46,40 +140,500 @@ def create_request(
 def get_requests(
     status: Optional[str] = None,
     district: Optional[str] = None,
+    fast: bool = False,
+    fields: Optional[str] = None,
+    include: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    # Regular users can only see their own requests
-    if current_user.role == "user":
-        query = db.query(models.Request).filter(models.Request.user_id == current_user.id)
-    # Foodbank users can see requests assigned to them or unassigned in their district
-    elif current_user.role == "foodbank":
+    selected_fields = _parse_csv_param(fields, REQUEST_FIELDS, "fields")
+    includes = _parse_csv_param(include, REQUEST_INCLUDES, "include")
+    sparse = selected_fields is not None or includes is not None
+    projected = sparse or fast
+    
+    # A foodbank's requests and a district live on one shard; other lists are
+    # read from every shard in parallel and merged newest first
+    foodbank = None
+    targets = shards.all_shards()
+    if current_user.role == "foodbank":
         foodbank = db.query(models.FoodBank).filter(models.FoodBank.admin_id == current_user.id).first()
         if not foodbank:
             raise HTTPException(status_code=404, detail="Foodbank not found")
+        targets = [shards.shard_for_foodbank(foodbank)]
+    elif district:
+        targets = [shards.shard_for_district(district)]
+    merged = len(targets) > 1
+    if not merged:
+        # Served from this session, so the ORM rows stay attached until serialized
+        shards.use(db, targets[0])
+    
+    project_fields = list(selected_fields or REQUEST_FIELDS)
+    if merged and "created_at" not in project_fields:
+        project_fields.append("created_at")
+    
+    def list_requests(shard_db: Session):
+        # Regular users can only see their own requests
+        if current_user.role == "user":
+            query = shard_db.query(models.Request).filter(models.Request.user_id == current_user.id)
+        # Foodbank users can see requests assigned to them or unassigned in their district
+        elif foodbank is not None:
+            query = shard_db.query(models.Request).filter(sync.foodbank_request_scope(foodbank))
+        # Org users can see all requests
+        else:
+            query = shard_db.query(models.Request)
         
-        query = db.query(models.Request).filter(
-            (models.Request.assigned_to_id == foodbank.id) | 
-            ((models.Request.status == "Pending") & (models.Request.district == foodbank.district))
-        )
-    # Org users can see all requests
+        # Apply filters if provided
+        if status:
+            query = query.filter(models.Request.status == status)
+        if district:
+            query = query.filter(models.Request.district == district)
+        
+        # Sparse fieldsets: project only the requested columns, items only on
+        # ?include=items. The opt-in fast path is the same schema, serialized
+        # straight from column tuples
+        if projected:
+            return _project_requests(
+                shard_db, query,
+                fields=project_fields,
+                include_items="items" in (includes or []) if sparse else True
+            )
+        
+        db_requests = query.order_by(models.Request.created_at.desc()).all()
+        # Shard sessions close before the response is serialized
+        return [schemas.Request.from_orm(db_request) for db_request in db_requests] if merged else db_requests
+    
+    pages = list(shards.fan_out(list_requests, targets, db=db).values())
+    if not merged:
+        return FastJSONResponse(pages[0]) if projected else pages[0]
+    if not projected:
+        return list(heapq.merge(*pages, key=lambda row: row.created_at, reverse=True))
+    
+    payload = list(heapq.merge(*pages, key=lambda row: row["created_at"], reverse=True))
+    if project_fields != list(selected_fields or REQUEST_FIELDS):
+        for row in payload:
+            del row["created_at"]
+    return FastJSONResponse(payload)
+
+@router.get("/requests/triage", response_model=schemas.TriageQueue)
+def get_triage_queue(
+    k: int = Query(20, ge=1, le=500),
+    district: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_org_user)
+):
+    """
+    The k most urgent pending requests: oldest first, moved up for Baby
+    category items and larger households (see triage.py).
+    """
+    return triage.top_requests(db, k, district)
+
+# Bulk operations: allowed current statuses and the resulting status per action
+BULK_ACTIONS = {
+    "assign": (("Pending", "Assigned"), "Assigned"),
+    "fulfill": (("Assigned",), "Fulfilled"),
+    "cancel": (("Pending", "Assigned"), "Cancelled"),
+}
+BULK_MAX_REQUESTS = 1000
+
+def _restore_request(db: Session, db_request: models.Request, status: str, assigned_to_id: Optional[int], version: int):
+    # Undo the set-based UPDATE for one row; the detached object still holds its
+    # loaded lease and fulfillment values, and no other transaction has seen the change
+    db.query(models.Request).filter(models.Request.id == db_request.id).update({
+        models.Request.status: status,
+        models.Request.assigned_to_id: assigned_to_id,
+        models.Request.claimed_by_id: db_request.claimed_by_id,
+        models.Request.claimer: db_request.claimer,
+        models.Request.claim_token: db_request.claim_token,
+        models.Request.lease_expires_at: db_request.lease_expires_at,
+        models.Request.fulfilled_at: db_request.fulfilled_at,
+        models.Request.version: version
+    }, synchronize_session=False)
+    db_request.status, db_request.assigned_to_id = status, assigned_to_id
+
+def _bulk_update_shard(
+    db: Session,
+    operation: schemas.BulkRequestOperation,
+    requested_ids: Optional[List[int]],
+    foodbank_id: Optional[int],
+    user_id: int
+):
+    # One shard's share of a bulk operation, in its own transaction. Returns the
+    # ids it covered, their outcomes, how many were updated and has_more
+    allowed_statuses, new_status = BULK_ACTIONS[operation.action]
+    has_more = False
+    query = db.query(models.Request).options(selectinload(models.Request.request_items))
+    if requested_ids is not None:
+        query = query.filter(models.Request.id.in_(requested_ids))
+    else:
+        if operation.filter.status:
+            query = query.filter(models.Request.status == operation.filter.status)
+        if operation.filter.district:
+            query = query.filter(models.Request.district == operation.filter.district)
+        if foodbank_id is not None:
+            query = query.filter(models.Request.assigned_to_id == foodbank_id)
+        query = query.order_by(models.Request.created_at, models.Request.id).limit(BULK_MAX_REQUESTS + 1)
+    if is_postgres(db):
+        query = query.with_for_update(of=models.Request)
+    
+    loaded = query.all()
+    if requested_ids is None:
+        has_more = len(loaded) > BULK_MAX_REQUESTS
+        loaded = loaded[:BULK_MAX_REQUESTS]
+        requested_ids = [db_request.id for db_request in loaded]
+    by_id = {db_request.id: db_request for db_request in loaded}
+    
+    outcomes = {}
+    eligible = []
+    for request_id in requested_ids:
+        db_request = by_id.get(request_id)
+        if db_request is None:
+            outcomes[request_id] = ("not_found", None)
+        elif foodbank_id is not None and db_request.assigned_to_id != foodbank_id:
+            outcomes[request_id] = ("forbidden", "Not assigned to your foodbank")
+        elif db_request.status not in allowed_statuses:
+            outcomes[request_id] = ("invalid_status", f"Request is {db_request.status}")
+        else:
+            eligible.append(db_request)
+    
+    updated = []
+    if eligible:
+        values = {
+            models.Request.status: new_status,
+            models.Request.version: models.Request.version + 1
+        }
+        if operation.action == "assign":
+            values[models.Request.assigned_to_id] = operation.assigned_to_id
+            # An org assignment supersedes any volunteer lease
+            values[models.Request.claimed_by_id] = None
+            values[models.Request.claimer] = None
+            values[models.Request.claim_token] = None
+            values[models.Request.lease_expires_at] = None
+        elif operation.action == "fulfill":
+            values[models.Request.fulfilled_at] = func.now()
+        
+        old_versions = {db_request.id: db_request.version for db_request in eligible}
+        # Matching on (id, version) makes the set-based UPDATE skip rows another
+        # writer changed since they were read, exactly like a versioned ORM flush
+        statement = update(models.Request).where(
+            tuple_(models.Request.id, models.Request.version).in_(list(old_versions.items()))
+        ).values(values).execution_options(synchronize_session=False)
+        if getattr(db.get_bind(models.Request).dialect, "update_returning", False):
+            changed_ids = set(db.execute(statement.returning(models.Request.id)).scalars())
+        else:
+            rowcount = db.execute(statement).rowcount
+            current_versions = dict(db.query(models.Request.id, models.Request.version).filter(
+                models.Request.id.in_(list(old_versions))
+            ).all())
+            changed_ids = {request_id for request_id, version in old_versions.items()
+                           if current_versions.get(request_id) == version + 1}
+            # Without RETURNING, a row another writer bumped once looks like one of ours
+            if len(changed_ids) != rowcount:
+                db.rollback()
+                raise HTTPException(status_code=409, detail="Requests were modified by another user, try again")
+        
+        # The loaded objects are detached so they can describe the new state for
+        # the ledger and history without being flushed as a second UPDATE
+        changed = []
+        for db_request in eligible:
+            db.expunge(db_request)
+            if db_request.id not in changed_ids:
+                outcomes[db_request.id] = ("conflict", "Request was modified by another user")
+                continue
+            old = (db_request.status, db_request.assigned_to_id)
+            db_request.status = new_status
+            if operation.action == "assign":
+                db_request.assigned_to_id = operation.assigned_to_id
+            changed.append((db_request, old, ledger.request_transition_entries(db_request, *old, user_id)))
+        
+        if is_postgres(db):
+            # Requests are appended one by one below; locking every inventory row they
+            # touch up front, in key order, keeps concurrent writers from deadlocking
+            keys = sorted({(entry.foodbank_id, entry.food_item_id) for _, _, entries in changed for entry in entries})
+            if keys:
+                db.query(models.InventoryItem.id).filter(
+                    tuple_(models.InventoryItem.foodbank_id, models.InventoryItem.food_item_id).in_(keys)
+                ).order_by(models.InventoryItem.foodbank_id, models.InventoryItem.food_item_id).with_for_update().all()
+        
+        for db_request, old, entries in changed:
+            # Stock is checked per request, so one shortfall only holds back that
+            # request: its entries are rolled back to the savepoint and its row restored
+            savepoint = db.begin_nested()
+            try:
+                ledger.append(db, entries)
+            except HTTPException as exc:
+                if exc.status_code != 409:
+                    raise
+                savepoint.rollback()
+                _restore_request(db, db_request, *old, old_versions[db_request.id])
+                outcomes[db_request.id] = ("insufficient_stock", exc.detail)
+                continue
+            savepoint.commit()
+            updated.append((db_request, old))
+            outcomes[db_request.id] = ("updated", None)
+        
+        for db_request, (old_status, _) in updated:
+            request_history.record_status_change(db, db_request, old_status, user_id)
+        
+        districts = {db_request.district for db_request, _ in updated}
+        foodbank_ids = {db_request.assigned_to_id for db_request, _ in updated}
+        foodbank_ids |= {old_assigned_to_id for _, (_, old_assigned_to_id) in updated}
+        workspace.invalidate(db, foodbank_ids)
+        for district in districts:
+            workspace.invalidate(db, district=district)
+    
+    commit_or_conflict(db)
+    return requested_ids, outcomes, len(updated), has_more
+
+@router.post("/requests/bulk", response_model=schemas.BulkRequestResult)
+def bulk_update_requests(
+    operation: schemas.BulkRequestOperation,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    Assign, fulfill or cancel many requests in one transaction, selected by
+    `ids` or by `filter` (status/district, oldest first, at most 1000 per
+    call; has_more says whether to call again). The per-request rules of
+    PUT /requests/{id} apply: only org admins assign or cancel, and foodbank
+    users may only fulfill requests assigned to them. Returns an outcome per id;
+    requests the foodbank lacks stock for are reported as insufficient_stock
+    and the rest are still applied. With sharded request data, each region's
+    requests are updated in parallel, in a transaction of their own.
+    """
+    if (operation.ids is None) == (operation.filter is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of ids or filter")
+    
+    foodbank = None
+    if current_user.role == "foodbank":
+        if operation.action != "fulfill":
+            raise HTTPException(status_code=403, detail="Foodbank users can only mark requests as fulfilled")
+        foodbank = db.query(models.FoodBank).filter(models.FoodBank.admin_id == current_user.id).first()
+        if not foodbank:
+            raise HTTPException(status_code=404, detail="Foodbank not found")
+    elif current_user.role != "org":
+        raise HTTPException(status_code=403, detail="Not authorized to update requests")
+    
+    assignee_shard = None
+    if operation.action == "assign":
+        if not operation.assigned_to_id:
+            raise HTTPException(status_code=400, detail="assigned_to_id is required to assign requests")
+        assignee = db.query(models.FoodBank).filter(models.FoodBank.id == operation.assigned_to_id).first()
+        if not assignee:
+            raise HTTPException(status_code=404, detail="Foodbank not found")
+        assignee_shard = shards.shard_for_foodbank(assignee)
+    
+    outcomes = {}
+    if operation.ids is not None:
+        requested_ids = list(dict.fromkeys(operation.ids))
+        ids_by_shard = {}
+        for request_id in requested_ids:
+            shard = shards.shard_for_request_id(request_id)
+            # Stock is reserved on the assignee's shard, so it only takes requests from its own region
+            if assignee_shard is not None and shard != assignee_shard:
+                outcomes[request_id] = ("forbidden", "Foodbank serves another region")
+                continue
+            ids_by_shard.setdefault(shard, []).append(request_id)
     else:
-        query = db.query(models.Request)
+        if operation.filter.district:
+            shard = shards.shard_for_district(operation.filter.district)
+        elif foodbank is not None:
+            shard = shards.shard_for_foodbank(foodbank)
+        elif shards.configured():
+            raise HTTPException(status_code=400, detail="filter.district is required when request data is sharded")
+        else:
+            shard = shards.PRIMARY
+        if assignee_shard is not None and shard != assignee_shard:
+            raise HTTPException(status_code=400, detail="Foodbank serves another region")
+        ids_by_shard = {shard: None}
+    
+    # Plain values only: the shard threads must not touch objects of this session
+    foodbank_id = foodbank.id if foodbank is not None else None
+    user_id = current_user.id
+    results = shards.fan_out(
+        lambda shard_db: _bulk_update_shard(
+            shard_db, operation, ids_by_shard[shards.current(shard_db)], foodbank_id, user_id
+        ),
+        ids_by_shard, db=db
+    )
+    
+    updated, has_more = 0, False
+    for shard_ids, shard_outcomes, shard_updated, shard_has_more in results.values():
+        outcomes.update(shard_outcomes)
+        updated += shard_updated
+        has_more = has_more or shard_has_more
+        if operation.ids is None:
+            requested_ids = shard_ids
+    
+    return schemas.BulkRequestResult(
+        action=operation.action,
+        updated=updated,
+        has_more=has_more,
+        results=[
+            schemas.BulkRequestOutcome(id=request_id, outcome=outcomes[request_id][0], detail=outcomes[request_id][1])
+            for request_id in requested_ids
+        ]
+    )
+
+# Claim queue for foodbank volunteers. They share their foodbank's account, so
+# each device identifies its volunteer with the X-Claimer-Id header.
+ClaimerId = Header(..., alias="X-Claimer-Id", min_length=1, max_length=64)
+
+def _clear_claim(db_request: models.Request):
+    db_request.claimed_by_id = None
+    db_request.claimer = None
+    db_request.claim_token = None
+    db_request.lease_expires_at = None
+
+def _claimable(query, district: str, now: datetime):
+    # Pending requests in the district that are unleased or whose lease has expired
+    return query.filter(
+        models.Request.district == district,
+        models.Request.status == "Pending",
+        or_(models.Request.lease_expires_at.is_(None), models.Request.lease_expires_at < now)
+    )
+
+@router.post("/requests/claims", response_model=List[schemas.Request])
+def claim_requests(
+    claim: schemas.ClaimCreate,
+    claimer: str = ClaimerId,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_foodbank_user)
+):
+    """
+    Atomically lease up to `count` of the oldest pending requests in the
+    foodbank's district to the volunteer identified by X-Claimer-Id. Expired leases are
+    reclaimed by the same statement, so no sweeper is needed.
+    """
+    foodbank = db.query(models.FoodBank).filter(models.FoodBank.admin_id == current_user.id).first()
+    if not foodbank:
+        raise HTTPException(status_code=404, detail="Foodbank not found")
+    shards.use(db, shards.shard_for_foodbank(foodbank))
+    
+    now = datetime.utcnow()
+    claim_token = uuid.uuid4().hex
+    
+    # Walks ix_requests_claim_queue (district, status, created_at) in created_at order,
+    # skipping live leases on the way, and stops after `count` rows. The outer UPDATE
+    # re-checks availability so concurrent claimers can never lease the same request twice
+    candidates = _claimable(db.query(models.Request.id), foodbank.district, now).order_by(
+        models.Request.created_at
+    ).limit(claim.count)
+    if is_postgres(db):
+        # Lock the candidate rows, skipping ones another volunteer is claiming right now
+        candidate_ids = [row.id for row in candidates.with_for_update(skip_locked=True)]
+    else:
+        # SQLite runs the whole UPDATE ... WHERE id IN (SELECT ...) under its write lock
+        candidate_ids = candidates.scalar_subquery()
+    
+    _claimable(db.query(models.Request), foodbank.district, now).filter(
+        models.Request.id.in_(candidate_ids)
+    ).update({
+        models.Request.claimed_by_id: current_user.id,
+        models.Request.claimer: claimer,
+        models.Request.claim_token: claim_token,
+        models.Request.lease_expires_at: now + timedelta(seconds=claim.lease_seconds),
+        models.Request.version: models.Request.version + 1
+    }, synchronize_session=False)
+    db.commit()
+    
+    return db.query(models.Request).filter(
+        models.Request.claim_token == claim_token
+    ).order_by(models.Request.created_at).all()
+
+@router.get("/requests/claims", response_model=List[schemas.Request])
+def get_my_claims(
+    claimer: str = ClaimerId,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_foodbank_user)
+):
+    """
+    Requests currently leased to the current volunteer.
+    """
+    foodbank = db.query(models.FoodBank).filter(models.FoodBank.admin_id == current_user.id).first()
+    if not foodbank:
+        raise HTTPException(status_code=404, detail="Foodbank not found")
+    shards.use(db, shards.shard_for_foodbank(foodbank))
+    
+    return db.query(models.Request).filter(
+        models.Request.claimed_by_id == current_user.id,
+        models.Request.claimer == claimer,
+        models.Request.status == "Pending",
+        models.Request.lease_expires_at >= datetime.utcnow()
+    ).order_by(models.Request.created_at).all()
+
+def _get_own_claim(db: Session, request_id: int, current_user: models.User, claimer: str):
+    shards.use(db, shards.shard_for_request_id(request_id))
+    db_request = db.query(models.Request).filter(models.Request.id == request_id).first()
+    if not db_request:
+        raise HTTPException(status_code=404, detail="Request not found")
+    
+    # A lease that expired but was not yet reclaimed by anyone else is still honoured
+    if (db_request.claimed_by_id != current_user.id or db_request.claimer != claimer
+            or db_request.status != "Pending"):
+        raise HTTPException(status_code=409, detail="Request is not claimed by you")
+    
+    return db_request
+
+@router.post("/requests/{request_id}/claim/complete", response_model=schemas.Request)
+def complete_claim(
+    request_id: int,
+    claimer: str = ClaimerId,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_foodbank_user)
+):
+    """
+    Mark a claimed request as fulfilled by the volunteer's foodbank.
+    """
+    foodbank = db.query(models.FoodBank).filter(models.FoodBank.admin_id == current_user.id).first()
+    if not foodbank:
+        raise HTTPException(status_code=404, detail="Foodbank not found")
     
-    # Apply filters if provided
-    if status:
-        query = query.filter(models.Request.status == status)
-    if district:
-        query = query.filter(models.Request.district == district)
+    db_request = _get_own_claim(db, request_id, current_user, claimer)
+    old_status, old_assigned_to_id = db_request.status, db_request.assigned_to_id
+    db_request.status = "Fulfilled"
+    db_request.assigned_to_id = foodbank.id
+    db_request.fulfilled_at = func.now()
+    db_request.claim_token = None
+    db_request.lease_expires_at = None
     
-    return query.order_by(models.Request.created_at.desc()).all()
+    # Consume the delivered items from the foodbank's stock in the same transaction
+    ledger.apply_request_transition(db, db_request, old_status, old_assigned_to_id, current_user.id)
+    request_history.record_status_change(db, db_request, old_status, current_user.id)
+    
+    commit_or_conflict(db)
+    db.refresh(db_request)
+    return db_request
+
+@router.delete("/requests/{request_id}/claim", response_model=schemas.Request)
+def release_claim(
+    request_id: int,
+    claimer: str = ClaimerId,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_foodbank_user)
+):
+    """
+    Give a claimed request back to the district queue before its lease expires.
+    """
+    db_request = _get_own_claim(db, request_id, current_user, claimer)
+    _clear_claim(db_request)
+    
+    commit_or_conflict(db)
+    db.refresh(db_request)
+    return db_request
 
 @router.get("/requests/{request_id}", response_model=schemas.Request)
 def get_request(
     request_id: int,
+    response: Response,
+    fields: Optional[str] = None,
+    include: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
+    selected_fields = _parse_csv_param(fields, REQUEST_FIELDS, "fields")
+    includes = _parse_csv_param(include, REQUEST_INCLUDES, "include")
+    
+    shards.use(db, shards.shard_for_request_id(request_id))
     db_request = db.query(models.Request).filter(models.Request.id == request_id).first()
     if not db_request:
         raise HTTPException(status_code=404, detail="Request not found")
@@ -97,19 +651,35 @@ def get_request(
         if db_request.assigned_to_id != foodbank.id and (db_request.status != "Pending" or db_request.district != foodbank.district):
             raise HTTPException(status_code=403, detail="Not authorized to view this request")
     
+    if selected_fields is not None or includes is not None:
+        query = db.query(models.Request).filter(models.Request.id == request_id)
+        return FastJSONResponse(_project_requests(
+            db, query,
+            fields=selected_fields or REQUEST_FIELDS,
+            include_items="items" in (includes or [])
+        )[0], headers={"ETag": etag_for(db_request)})
+    
+    set_etag(response, db_request)
     return db_request
 
 @router.put("/requests/{request_id}", response_model=schemas.Request)
 def update_request(
     request_id: int,
     request_update: schemas.RequestUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
+    shards.use(db, shards.shard_for_request_id(request_id))
     db_request = db.query(models.Request).filter(models.Request.id == request_id).first()
     if not db_request:
         raise HTTPException(status_code=404, detail="Request not found")
     
+    # Reject edits based on a stale read; the versioned UPDATE below catches the
+    # remaining race between this check and the commit
+    check_if_match(db_request, if_match)
+    
     # Handle request assignment/reassignment
     if request_update.assigned_to_id is not None:
         # Organization admins can assign/reassign any request
@@ -118,6 +688,12 @@ def update_request(
         # Foodbank users aren't allowed to assign requests
         else:
             raise HTTPException(status_code=403, detail="Only organization admins can assign requests")
+        
+        # Stock is reserved on the request's shard, so the foodbank must be in the same region
+        if request_update.assigned_to_id > 0 and shards.configured():
+            assignee = db.query(models.FoodBank).filter(models.FoodBank.id == request_update.assigned_to_id).first()
+            if assignee and shards.shard_for_foodbank(assignee) != shards.current(db):
+                raise HTTPException(status_code=400, detail="Foodbank serves another region")
     
     # Foodbank users can only update status of requests assigned to them
     if current_user.role == "foodbank":
@@ -132,6 +708,8 @@ def update_request(
         if request_update.status and request_update.status != "Fulfilled":
             raise HTTPException(status_code=403, detail="Foodbank users can only mark requests as fulfilled")
     
+    old_status, old_assigned_to_id = db_request.status, db_request.assigned_to_id
+    
     # Update request fields
     if request_update.status:
         db_request.status = request_update.status
@@ -142,7 +720,14 @@ def update_request(
         db_request.assigned_to_id = request_update.assigned_to_id
         if request_update.assigned_to_id > 0:  # Assigned to a foodbank
             db_request.status = "Assigned"
+        # An org assignment supersedes any volunteer lease
+        _clear_claim(db_request)
     
-    db.commit()
+    # Reserve, release or consume stock for the transition in the same transaction
+    ledger.apply_request_transition(db, db_request, old_status, old_assigned_to_id, current_user.id)
+    request_history.record_status_change(db, db_request, old_status, current_user.id)
+    
+    commit_or_conflict(db)
     db.refresh(db_request)
-    return db_request
\ No newline at end of file
+    set_etag(response, db_request)
+    return db_request
@@ -0,0 +1,31 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+import search
+from database import get_db
+from auth import get_current_org_user
+
+router = APIRouter(tags=["search"])
+
+@router.get("/search", response_model=schemas.SearchResults)
+def search_all(
+    q: str = Query(..., min_length=search.MIN_QUERY_LENGTH),
+    type: Optional[str] = Query(None, regex="^(requests|foodbanks)$"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_org_user)
+):
+    """
+    Ranked substring search over request tracking numbers/addresses and
+    foodbank names/locations. Pass `type` to search only one of them.
+    """
+    results = schemas.SearchResults()
+    if type in (None, "requests"):
+        results.requests = search.search_requests(db, q, limit, offset)
+    if type in (None, "foodbanks"):
+        results.foodbanks = search.search_foodbanks(db, q, limit, offset)
+    return results
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+import shards
+import sync
+from database import get_db
+from auth import get_current_active_user
+from serialization import FastJSONResponse
+
+router = APIRouter(tags=["sync"])
+
+@router.get("/sync", response_model=schemas.SyncPage)
+def get_changes(
+    since: str = Query("0", regex=r"^\d+$|^\d+:\d+(,\d+:\d+)*$"),
+    limit: int = Query(500, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    Requests, request items and inventory rows changed after the `since`
+    cursor, plus tombstones for deleted (or archived) rows, oldest first.
+    Start with since=0, then pass back `cursor` until has_more is false.
+    With sharded request data the cursor of users and org admins is a
+    "shard:seq" list; treat it as opaque.
+    When `reset` is true the cursor is too old: drop local data and resync from 0.
+    Foodbank users receive their district's requests, their assignments and
+    their own inventory; regular users their own requests.
+    """
+    user_id = None
+    foodbank = None
+    if current_user.role == "user":
+        user_id = current_user.id
+    elif current_user.role == "foodbank":
+        foodbank = db.query(models.FoodBank).filter(models.FoodBank.admin_id == current_user.id).first()
+        if not foodbank:
+            raise HTTPException(status_code=404, detail="Foodbank not found")
+    
+    # A foodbank's rows all live on its shard, where a plain cursor is enough
+    if foodbank is not None or not shards.configured():
+        shard = shards.shard_for_foodbank(foodbank) if foodbank is not None else shards.PRIMARY
+        shards.use(db, shard)
+        cursor = sync.parse_cursor(since, shard).get(shard, 0)
+        return FastJSONResponse(sync.changes(db, cursor, limit, user_id=user_id, foodbank=foodbank))
+    
+    return FastJSONResponse(sync.sharded_changes(db, since, limit, user_id=user_id))
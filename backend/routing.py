@@ -0,0 +1,252 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import models
+
+# numpy is imported lazily inside the functions below to keep worker startup fast
+
+EARTH_RADIUS_KM = 6371.0088
+ROUTE_TIME_BUDGET_SECONDS = 0.5
+ROUTE_CACHE_SIZE = 256
+IMPROVEMENT_EPSILON = 1e-9
+
+
+def distance_matrix(latitudes, longitudes):
+    """
+    Pairwise great-circle distances in km, computed with one broadcast haversine.
+    """
+    import numpy as np
+
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _nearest_neighbour(dist, demand, vehicles: int, capacity: Optional[float]):
+    """
+    Grow all routes together: the vehicle with the shortest route so far takes
+    the nearest unvisited stop that still fits its remaining capacity. Node 0
+    is the depot. Returns (routes, unassigned stop indices).
+    """
+    import numpy as np
+
+    n = dist.shape[0]
+    unvisited = np.ones(n, dtype=bool)
+    unvisited[0] = False
+    routes = [[] for _ in range(vehicles)]
+    positions = [0] * vehicles
+    lengths = np.zeros(vehicles)
+    loads = np.zeros(vehicles)
+    active = np.ones(vehicles, dtype=bool)
+
+    while unvisited.any() and active.any():
+        vehicle = int(np.argmin(np.where(active, lengths, np.inf)))
+        candidates = unvisited.copy()
+        if capacity is not None:
+            candidates &= demand <= capacity - loads[vehicle]
+        if not candidates.any():
+            # Full: nothing left fits this vehicle
+            active[vehicle] = False
+            continue
+        stop = int(np.argmin(np.where(candidates, dist[positions[vehicle]], np.inf)))
+        routes[vehicle].append(stop)
+        lengths[vehicle] += dist[positions[vehicle], stop]
+        loads[vehicle] += demand[stop]
+        positions[vehicle] = stop
+        unvisited[stop] = False
+
+    return routes, [int(stop) for stop in np.flatnonzero(unvisited)]
+
+
+def _two_opt(dist, route: List[int], deadline: float) -> List[int]:
+    """
+    Reverse segments while that shortens the closed tour depot -> route -> depot.
+    Each candidate position is evaluated against every segment end at once.
+    """
+    import numpy as np
+
+    path = np.array([0] + route + [0])
+    last = len(path) - 2
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        for i in range(1, last):
+            j = np.arange(i + 1, last + 1)
+            gain = (
+                dist[path[i - 1], path[i]] + dist[path[j], path[j + 1]]
+                - dist[path[i - 1], path[j]] - dist[path[i], path[j + 1]]
+            )
+            best = int(np.argmax(gain))
+            if gain[best] > IMPROVEMENT_EPSILON:
+                path[i:j[best] + 1] = path[i:j[best] + 1][::-1]
+                improved = True
+    return path[1:-1].tolist()
+
+
+def _or_opt(dist, route: List[int], deadline: float) -> List[int]:
+    """
+    Move chains of 1-3 consecutive stops (optionally reversed) to the cheapest
+    other position in the same route.
+    """
+    import numpy as np
+
+    path = [0] + route + [0]
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        for length in (1, 2, 3):
+            i = 1
+            while i + length < len(path):
+                first, end = path[i], path[i + length - 1]
+                prev, nxt = path[i - 1], path[i + length]
+                removal_gain = dist[prev, first] + dist[end, nxt] - dist[prev, nxt]
+
+                rest = np.array(path[:i] + path[i + length:])
+                a, b = rest[:-1], rest[1:]
+                forward = dist[a, first] + dist[end, b] - dist[a, b]
+                backward = dist[a, end] + dist[first, b] - dist[a, b]
+                # Re-inserting where the chain came from is not a move
+                forward[i - 1] = backward[i - 1] = np.inf
+                position = int(np.argmin(np.minimum(forward, backward)))
+                cost = min(forward[position], backward[position])
+
+                if removal_gain - cost > IMPROVEMENT_EPSILON:
+                    chain = path[i:i + length]
+                    if backward[position] < forward[position]:
+                        chain = chain[::-1]
+                    path = rest[:position + 1].tolist() + chain + rest[position + 1:].tolist()
+                    improved = True
+                else:
+                    i += 1
+    return path[1:-1]
+
+
+def _route_length(dist, route: List[int]) -> float:
+    path = [0] + route + [0]
+    return float(sum(dist[a, b] for a, b in zip(path, path[1:])))
+
+
+def solve(dist, demand, vehicles: int, capacity: Optional[float] = None):
+    """
+    Capacity-aware nearest neighbour construction followed by 2-opt and Or-opt
+    on each route, bounded by ROUTE_TIME_BUDGET_SECONDS.
+    """
+    deadline = time.monotonic() + ROUTE_TIME_BUDGET_SECONDS
+    routes, unassigned = _nearest_neighbour(dist, demand, vehicles, capacity)
+    improved = []
+    for route in routes:
+        if len(route) > 2:
+            route = _two_opt(dist, route, deadline)
+            route = _or_opt(dist, route, deadline)
+        improved.append(route)
+    return improved, unassigned
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _fingerprint(foodbank: models.FoodBank, stops) -> str:
+    digest = hashlib.sha1(f"{foodbank.latitude},{foodbank.longitude}".encode())
+    for stop in stops:
+        digest.update(f"|{stop['request_id']}:{stop['version']}".encode())
+    return digest.hexdigest()
+
+
+def plan_routes(db: Session, foodbank: models.FoodBank, vehicles: int, capacity: Optional[int]) -> dict:
+    """
+    Delivery plan for the foodbank's Assigned requests. Demand is the total
+    item quantity of a request. Plans are cached per (foodbank, vehicles,
+    capacity) until the set of assigned requests changes.
+    """
+    import numpy as np
+
+    rows = db.query(
+        models.Request.id,
+        models.Request.tracking_number,
+        models.Request.latitude,
+        models.Request.longitude,
+        models.Request.version,
+        func.coalesce(func.sum(models.RequestItem.quantity), 0)
+    ).outerjoin(
+        models.RequestItem, models.RequestItem.request_id == models.Request.id
+    ).filter(
+        models.Request.assigned_to_id == foodbank.id,
+        models.Request.status == "Assigned"
+    ).group_by(models.Request.id).order_by(models.Request.id).all()
+
+    stops, unroutable = [], []
+    for request_id, tracking_number, latitude, longitude, version, demand in rows:
+        # Public submissions default to 0,0 when the location was not shared
+        if not latitude and not longitude:
+            unroutable.append(request_id)
+            continue
+        stops.append({
+            "request_id": request_id,
+            "tracking_number": tracking_number,
+            "latitude": latitude,
+            "longitude": longitude,
+            "version": version,
+            "demand": int(demand),
+        })
+
+    key = (foodbank.id, vehicles, capacity)
+    fingerprint = _fingerprint(foodbank, stops)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            _cache.move_to_end(key)
+            return cached[1]
+
+    dist = distance_matrix(
+        [foodbank.latitude] + [stop["latitude"] for stop in stops],
+        [foodbank.longitude] + [stop["longitude"] for stop in stops]
+    )
+    demand = np.array([0] + [stop["demand"] for stop in stops], dtype=np.float64)
+    routes, unassigned = solve(dist, demand, vehicles, capacity)
+
+    vehicle_routes = []
+    for vehicle, route in enumerate(routes, start=1):
+        route_stops = []
+        previous = 0
+        for node in route:
+            stop = stops[node - 1]
+            route_stops.append({
+                "request_id": stop["request_id"],
+                "tracking_number": stop["tracking_number"],
+                "latitude": stop["latitude"],
+                "longitude": stop["longitude"],
+                "demand": stop["demand"],
+                "distance_from_previous_km": round(float(dist[previous, node]), 3),
+            })
+            previous = node
+        vehicle_routes.append({
+            "vehicle": vehicle,
+            "stops": route_stops,
+            "load": int(demand[route].sum()) if route else 0,
+            "distance_km": round(_route_length(dist, route), 3) if route else 0.0,
+        })
+
+    plan = {
+        "foodbank_id": foodbank.id,
+        "vehicles": vehicle_routes,
+        "total_distance_km": round(sum(route["distance_km"] for route in vehicle_routes), 3),
+        "unassigned_request_ids": [stops[node - 1]["request_id"] for node in unassigned],
+        "unroutable_request_ids": unroutable,
+    }
+
+    with _cache_lock:
+        _cache[key] = (fingerprint, plan)
+        _cache.move_to_end(key)
+        if len(_cache) > ROUTE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return plan
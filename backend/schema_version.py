@@ -0,0 +1,282 @@
+import os
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateTable
+
+import models
+from search import ensure_search_index
+from sync import TRACKED_TABLES, ensure_change_tracking
+
+try:
+    import fcntl
+except ImportError:  # Windows: workers there start one at a time anyway
+    fcntl = None
+
+# Arbitrary key for pg_advisory_lock so only one worker upgrades at a time
+MIGRATION_LOCK_KEY = 40_037
+
+# UPGRADES[n] brings a database at version n - 1 up to version n. create_all()
+# runs first and creates missing tables in their current shape, so a step only
+# has to change tables that already existed (new columns, backfills, unique
+# indexes). Versions that only added tables, or search and change-tracking
+# triggers (installed after the steps), need no step. Steps must be safe
+# to re-run, since a failed upgrade is retried from the last stamped version.
+UPGRADES: Dict[int, Callable[[Connection], None]] = {}
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+def upgrade(version: int):
+    def register(step):
+        UPGRADES[version] = step
+        return step
+    return register
+
+
+def _add_columns(conn: Connection, table_name: str, *names: str):
+    """
+    ALTER TABLE ... ADD COLUMN for each of `names` the table does not have yet,
+    typed and defaulted as declared in models.
+    """
+    table = models.Base.metadata.tables[table_name]
+    existing = {column["name"] for column in inspect(conn).get_columns(table_name)}
+    for name in names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        ddl = f"ALTER TABLE {table_name} ADD COLUMN {name} {column.type.compile(conn.dialect)}"
+        default = getattr(column.server_default, "arg", None)
+        if default is not None:
+            ddl += f" DEFAULT {default}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+        for foreign_key in column.foreign_keys:
+            ddl += f" REFERENCES {foreign_key.column.table.name} ({foreign_key.column.name})"
+        conn.execute(text(ddl))
+
+
+def _create_indexes(conn: Connection, table_name: str):
+    # Indexes on columns a later step adds are created by that step
+    existing = {column["name"] for column in inspect(conn).get_columns(table_name)}
+    for index in models.Base.metadata.tables[table_name].indexes:
+        if all(column.name in existing for column in index.columns):
+            index.create(conn, checkfirst=True)
+
+
+@upgrade(1)
+def _claims_versions_and_ledger(conn: Connection):
+    # Databases from before schema versioning: claim leases, optimistic
+    # locking columns, one inventory row per item and the ledger balances
+    _add_columns(conn, "requests", "claimed_by_id", "claim_token", "lease_expires_at", "version")
+    _add_columns(conn, "inventory", "reserved", "version")
+    _create_indexes(conn, "requests")
+
+    duplicates = conn.execute(text(
+        "SELECT foodbank_id, food_item_id, MIN(id), SUM(quantity) FROM inventory "
+        "GROUP BY foodbank_id, food_item_id HAVING COUNT(*) > 1"
+    )).all()
+    for foodbank_id, food_item_id, keep_id, quantity in duplicates:
+        params = {"foodbank_id": foodbank_id, "food_item_id": food_item_id, "keep_id": keep_id}
+        conn.execute(text(
+            "DELETE FROM inventory WHERE foodbank_id = :foodbank_id AND food_item_id = :food_item_id "
+            "AND id != :keep_id"
+        ), params)
+        conn.execute(text("UPDATE inventory SET quantity = :quantity WHERE id = :keep_id"),
+                     {"quantity": quantity, "keep_id": keep_id})
+    inspector = inspect(conn)
+    unique_names = {constraint["name"] for constraint in inspector.get_unique_constraints("inventory")}
+    unique_names |= {index["name"] for index in inspector.get_indexes("inventory") if index["unique"]}
+    if "uq_inventory_foodbank_food_item" not in unique_names:
+        conn.execute(text(
+            "CREATE UNIQUE INDEX uq_inventory_foodbank_food_item ON inventory (foodbank_id, food_item_id)"
+        ))
+
+    # The ledger table was just created; open it with the current stock and
+    # reserve stock for requests that were already assigned
+    if conn.execute(text("SELECT 1 FROM inventory_ledger LIMIT 1")).first():
+        return
+    assigned = (
+        "FROM request_items ri JOIN requests r ON r.id = ri.request_id "
+        "WHERE r.status = 'Assigned' AND r.assigned_to_id IS NOT NULL"
+    )
+    conn.execute(text(
+        "INSERT INTO inventory (foodbank_id, food_item_id, quantity, reserved, version) "
+        f"SELECT DISTINCT r.assigned_to_id, ri.food_item_id, 0, 0, 1 {assigned} AND NOT EXISTS ("
+        "SELECT 1 FROM inventory i WHERE i.foodbank_id = r.assigned_to_id AND i.food_item_id = ri.food_item_id)"
+    ))
+    conn.execute(text(
+        "INSERT INTO inventory_ledger (foodbank_id, food_item_id, kind, quantity_delta, reserved_delta, created_at) "
+        "SELECT foodbank_id, food_item_id, 'compaction', quantity, 0, CURRENT_TIMESTAMP FROM inventory"
+    ))
+    conn.execute(text(
+        "INSERT INTO inventory_ledger "
+        "(foodbank_id, food_item_id, request_id, kind, quantity_delta, reserved_delta, created_at) "
+        f"SELECT r.assigned_to_id, ri.food_item_id, r.id, 'reservation', 0, ri.quantity, CURRENT_TIMESTAMP {assigned}"
+    ))
+    conn.execute(text(
+        "UPDATE inventory SET reserved = (SELECT COALESCE(SUM(ri.quantity), 0) "
+        f"{assigned} AND r.assigned_to_id = inventory.foodbank_id AND ri.food_item_id = inventory.food_item_id)"
+    ))
+
+
+@upgrade(4)
+def _change_seq(conn: Connection):
+    # ensure_change_tracking() numbers the existing rows once the triggers exist
+    for table_name in TRACKED_TABLES:
+        _add_columns(conn, table_name, "change_seq")
+        _create_indexes(conn, table_name)
+
+
+@upgrade(5)
+def _claimer(conn: Connection):
+    _add_columns(conn, "requests", "claimer")
+
+
+@upgrade(6)
+def _job_leases(conn: Connection):
+    _add_columns(conn, "jobs", "locked_until", "dedupe_key")
+    _create_indexes(conn, "jobs")
+
+
+@upgrade(7)
+def _idempotency_fingerprint(conn: Connection):
+    # Keys stored before this have no fingerprint and are replayed unchecked
+    _add_columns(conn, "idempotency_keys", "fingerprint")
+
+
+def _rebuild_sqlite_table(conn: Connection, table_name: str):
+    """
+    Recreate a table in its current model shape for changes SQLite cannot
+    ALTER in place. Triggers go with the old table; ensure_schema() installs
+    them again after the upgrade steps.
+    """
+    table = models.Base.metadata.tables[table_name]
+    rebuilt = f"{table_name}_rebuild"
+    ddl = str(CreateTable(table).compile(dialect=conn.dialect)).strip()
+    conn.execute(text(ddl.replace(f"CREATE TABLE {table_name} ", f"CREATE TABLE {rebuilt} ", 1)))
+    columns = ", ".join(column.name for column in table.columns)
+    conn.execute(text(f"INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {table_name}"))
+    conn.execute(text(f"DROP TABLE {table_name}"))
+    conn.execute(text(f"ALTER TABLE {rebuilt} RENAME TO {table_name}"))
+    _create_indexes(conn, table_name)
+
+
+@upgrade(8)
+def _autoincrement_ids(conn: Connection):
+    # SQLite handed the id of the newest deleted row out again, so a request
+    # created after its predecessor was archived collided with the archived
+    # copy. PostgreSQL sequences never go back.
+    if conn.dialect.name != "sqlite":
+        return
+    for table_name, archive_name in (("requests", "requests_archive"), ("request_items", "request_items_archive")):
+        sql = conn.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"
+        ), {"name": table_name}).scalar()
+        if "AUTOINCREMENT" not in sql.upper():
+            _rebuild_sqlite_table(conn, table_name)
+        # Continue after the highest id ever handed out, archived ones included
+        conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": table_name})
+        conn.execute(text(
+            "INSERT INTO sqlite_sequence (name, seq) SELECT :name, MAX("
+            f"(SELECT COALESCE(MAX(id), 0) FROM {table_name}), "
+            f"(SELECT COALESCE(MAX(id), 0) FROM {archive_name}))"
+        ), {"name": table_name})
+
+
+@upgrade(10)
+def _claim_queue_index(conn: Connection):
+    # The claim queue index used to include lease_expires_at before created_at
+    columns = next((index["column_names"] for index in inspect(conn).get_indexes("requests")
+                    if index["name"] == "ix_requests_claim_queue"), None)
+    if columns != ["district", "status", "created_at"]:
+        conn.execute(text("DROP INDEX IF EXISTS ix_requests_claim_queue"))
+        _create_indexes(conn, "requests")
+
+
+def stored_schema_version(engine: Engine):
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    except DBAPIError:
+        # Fresh database without the schema_version table yet
+        return None
+
+
+def _stamp(conn: Connection, version: int):
+    conn.execute(models.SchemaVersion.__table__.delete())
+    conn.execute(models.SchemaVersion.__table__.insert().values(version=version))
+
+
+@contextmanager
+def _migration_lock(engine: Engine):
+    """
+    Serialize upgrades between workers starting at the same time.
+    """
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        return
+    database = engine.url.database
+    if fcntl is None or engine.dialect.name != "sqlite" or not database or database == ":memory:":
+        yield
+        return
+    with open(os.path.abspath(database) + ".migrate.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def ensure_schema(engine: Engine) -> bool:
+    """
+    Bring the database up to models.SCHEMA_VERSION: create missing tables, run
+    the UPGRADES steps after the stored version in order, then (re)install
+    the search and change-tracking triggers. Starting a worker against an
+    up-to-date database costs a single query. Returns True when anything ran.
+    """
+    if stored_schema_version(engine) == models.SCHEMA_VERSION:
+        return False
+
+    with _migration_lock(engine):
+        current = stored_schema_version(engine)
+        if current == models.SCHEMA_VERSION:
+            # Another worker finished the upgrade while we waited
+            return False
+        if current is not None and current > models.SCHEMA_VERSION:
+            raise SchemaVersionError(
+                f"Database schema version {current} is newer than this code's version "
+                f"{models.SCHEMA_VERSION}; deploy the matching code or restore a matching backup"
+            )
+
+        existing = inspect(engine).has_table("requests")
+        models.Base.metadata.create_all(bind=engine)
+        if existing:
+            for version in range((current or 0) + 1, models.SCHEMA_VERSION + 1):
+                step = UPGRADES.get(version)
+                try:
+                    with engine.begin() as conn:
+                        if step is not None:
+                            step(conn)
+                        _stamp(conn, version)
+                except DBAPIError as exc:
+                    raise SchemaVersionError(
+                        f"Upgrading the database schema from version {current or 0} failed at "
+                        f"version {version}: {exc.orig}"
+                    ) from exc
+
+        ensure_search_index(engine)
+        ensure_change_tracking(engine)
+        with engine.begin() as conn:
+            _stamp(conn, models.SCHEMA_VERSION)
+    return True
@@ -1,5 +1,5 @@
-from typing import List, Optional, Dict, Any
-from pydantic import BaseModel
+from typing import List, Optional, Dict, Any, Union
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 # User schemas
@@ -44,17 +44,65 @@ class InventoryItemCreate(InventoryItemBase):
     pass
 
 class InventoryItemUpdate(BaseModel):
-    quantity: int
+    # Either an absolute quantity or a commutative delta to apply
+    quantity: Optional[int] = None
+    delta: Optional[int] = None
 
 class InventoryItem(InventoryItemBase):
     id: int
     foodbank_id: int
+    reserved: int = 0
     last_updated: datetime
+    version: int
     food_item: FoodItem
     
     class Config:
         orm_mode = True
 
+class InventoryLedgerEntry(BaseModel):
+    id: int
+    foodbank_id: int
+    food_item_id: int
+    request_id: Optional[int] = None
+    kind: str
+    quantity_delta: int
+    reserved_delta: int
+    created_by_id: Optional[int] = None
+    created_at: datetime
+    
+    class Config:
+        orm_mode = True
+
+class StockThresholdUpdate(BaseModel):
+    low_level: int = Field(..., ge=0)
+    restore_level: Optional[int] = Field(None, ge=1)
+    cooldown_seconds: int = Field(3600, ge=0, le=7 * 86400)
+
+class StockThreshold(BaseModel):
+    id: int
+    foodbank_id: int
+    food_item_id: int
+    low_level: int
+    restore_level: int
+    cooldown_seconds: int
+    state: str
+    last_alert_at: Optional[datetime] = None
+    
+    class Config:
+        orm_mode = True
+
+class StockAlert(BaseModel):
+    id: int
+    foodbank_id: int
+    food_item_id: int
+    available: int
+    low_level: int
+    created_at: datetime
+    acknowledged_at: Optional[datetime] = None
+    
+    class Config:
+        orm_mode = True
+
 # Food Bank schemas
 class FoodBankBase(BaseModel):
     name: str
@@ -81,6 +129,28 @@ class FoodBankWithInventory(FoodBank):
     class Config:
         orm_mode = True
 
+# Delivery route schemas
+class RouteStop(BaseModel):
+    request_id: int
+    tracking_number: str
+    latitude: float
+    longitude: float
+    demand: int
+    distance_from_previous_km: float
+
+class VehicleRoute(BaseModel):
+    vehicle: int
+    stops: List[RouteStop]
+    load: int
+    distance_km: float
+
+class DeliveryPlan(BaseModel):
+    foodbank_id: int
+    vehicles: List[VehicleRoute]
+    total_distance_km: float
+    unassigned_request_ids: List[int] = []
+    unroutable_request_ids: List[int] = []
+
 # Request item schemas
 class RequestItemBase(BaseModel):
     food_item_id: int
@@ -115,6 +185,10 @@ class Request(RequestBase):
     created_at: datetime
     fulfilled_at: Optional[datetime] = None
     assigned_to_id: Optional[int] = None
+    claimed_by_id: Optional[int] = None
+    claimer: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    version: int
     request_items: List[RequestItem]
     
     class Config:
@@ -124,6 +198,74 @@ class RequestUpdate(BaseModel):
     status: Optional[str] = None
     assigned_to_id: Optional[int] = None
 
+class ClaimCreate(BaseModel):
+    count: int = Field(1, ge=1, le=50)
+    lease_seconds: int = Field(900, ge=60, le=86400)
+
+class BulkRequestFilter(BaseModel):
+    status: Optional[str] = None
+    district: Optional[str] = None
+
+class BulkRequestOperation(BaseModel):
+    action: str = Field(..., regex="^(assign|fulfill|cancel)$")
+    ids: Optional[List[int]] = Field(None, max_items=1000)
+    filter: Optional[BulkRequestFilter] = None
+    assigned_to_id: Optional[int] = None
+
+class BulkRequestOutcome(BaseModel):
+    id: int
+    outcome: str  # "updated", "not_found", "forbidden", "invalid_status", "conflict", "insufficient_stock"
+    detail: Optional[str] = None
+
+class BulkRequestResult(BaseModel):
+    action: str
+    updated: int
+    has_more: bool = False
+    results: List[BulkRequestOutcome]
+
+class RequestSummary(BaseModel):
+    id: int
+    tracking_number: str
+    status: str
+    location: str
+    district: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    created_at: datetime
+    item_count: int
+    total_quantity: int
+
+# Triage schemas
+class TriageRequest(BaseModel):
+    id: int
+    tracking_number: str
+    location: str
+    district: str
+    created_at: datetime
+    item_count: int
+    total_quantity: int
+    has_baby_items: bool
+    # Age plus the baby item and household size bonuses
+    priority_hours: float
+
+class TriageQueue(BaseModel):
+    requests: List[TriageRequest]
+    total_pending: int
+
+# Foodbank workspace schemas
+class WorkspaceCounters(BaseModel):
+    pending_requests: int
+    assigned_requests: int
+    fulfilled_requests: int
+    inventory_items: int
+    out_of_stock_items: int
+
+class FoodbankWorkspace(BaseModel):
+    foodbank: FoodBank
+    inventory: List[InventoryItem]
+    requests: List[RequestSummary]
+    counters: WorkspaceCounters
+
 # District schemas
 class DistrictBase(BaseModel):
     name: str
@@ -160,6 +302,124 @@ class DashboardStats(BaseModel):
     district_stats: List[DistrictStats]
     inventory_stats: List[InventoryStats]
 
+class LatencyStats(BaseModel):
+    metric: str
+    district: Optional[str] = None
+    foodbank_id: Optional[int] = None
+    count: int
+    p50_seconds: float
+    p90_seconds: float
+    p99_seconds: float
+
+class CoverageHotspot(BaseModel):
+    latitude: float
+    longitude: float
+    distance_km: float
+    requests: int
+    score: float
+
+class DistrictCoverage(BaseModel):
+    district: str
+    cells: int
+    area_km2: float
+    requests: int
+    mean_distance_km: Optional[float] = None
+    max_distance_km: Optional[float] = None
+    request_weighted_distance_km: Optional[float] = None
+    requests_served_pct: Optional[float] = None
+    hotspots: List[CoverageHotspot] = []
+
+class CoverageReport(BaseModel):
+    computed_at: datetime
+    served_radius_km: float
+    districts: List[DistrictCoverage]
+
+# Analytics snapshot schemas
+class SnapshotFreshness(BaseModel):
+    generated_at: datetime
+    age_seconds: int
+    stale: bool
+
+class AnalyticsDashboard(BaseModel):
+    snapshot: SnapshotFreshness
+    total_requests: int
+    pending_requests: int
+    assigned_requests: int
+    fulfilled_requests: int
+    district_stats: List[DistrictStats]
+
+class TrendPoint(BaseModel):
+    date: str
+    district: str
+    requests: int
+
+class AnalyticsTrends(BaseModel):
+    snapshot: SnapshotFreshness
+    points: List[TrendPoint]
+
+class ShortfallItem(BaseModel):
+    food_item: str
+    requested: int
+    on_hand: int
+    reserved: int
+    shortfall: int
+
+class AnalyticsShortfall(BaseModel):
+    snapshot: SnapshotFreshness
+    items: List[ShortfallItem]
+
+# Search schemas
+class RequestSearchResult(BaseModel):
+    id: int
+    tracking_number: str
+    location: str
+    district: str
+    status: str
+    created_at: datetime
+    rank: float
+
+class FoodBankSearchResult(BaseModel):
+    id: int
+    name: str
+    location: str
+    district: str
+    rank: float
+
+class SearchResults(BaseModel):
+    requests: List[RequestSearchResult] = []
+    foodbanks: List[FoodBankSearchResult] = []
+
+# Delta sync schemas
+class SyncTombstone(BaseModel):
+    table: str
+    id: int
+    change_seq: int
+
+class SyncPage(BaseModel):
+    cursor: Union[int, str]
+    has_more: bool
+    reset: bool = False
+    requests: List[Dict[str, Any]] = []
+    request_items: List[Dict[str, Any]] = []
+    inventory: List[Dict[str, Any]] = []
+    deleted: List[SyncTombstone] = []
+
+# Job schemas
+class Job(BaseModel):
+    id: int
+    kind: str
+    status: str
+    progress: float
+    attempts: int
+    max_attempts: int
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        orm_mode = True
+
 # Login schemas
 class Login(BaseModel):
     username: str
@@ -167,4 +427,45 @@ class Login(BaseModel):
 
 class Token(BaseModel):
     access_token: str
-    token_type: str
\ No newline at end of file
+    token_type: str
+
+# Diagnostics schemas
+class MemorySnapshotInfo(BaseModel):
+    id: int
+    taken_at: datetime
+    traced_bytes: int
+    rss_bytes: int
+
+class MemoryStatus(BaseModel):
+    pid: int
+    rss_bytes: int
+    tracing: bool
+    trace_frames: int
+    traced_bytes: int
+    traced_peak_bytes: int
+    gc_counts: List[int]
+    snapshots: List[MemorySnapshotInfo]
+
+class AllocationSite(BaseModel):
+    # filename:lineno, oldest frame first and the allocating line last
+    site: List[str]
+    size_bytes: int
+    count: int
+    size_diff_bytes: int
+    count_diff: int
+
+class MemorySnapshotDiff(BaseModel):
+    snapshot_id: int
+    against_id: int
+    traced_bytes_diff: int
+    rss_bytes_diff: int
+    sites: List[AllocationSite]
+
+class ObjectCounts(BaseModel):
+    pid: int
+    gc_objects: int
+    orm_objects: int
+    models: Dict[str, int]
+    sessions: int
+    identity_map_objects: int
+    gc_garbage: int
@@ -0,0 +1,136 @@
+import heapq
+from itertools import islice
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+import shards
+from database import is_postgres
+
+# External-content FTS5 tables with the trigram tokenizer, so any substring of
+# 3+ characters matches ("Kampung Bar", "ABC1"). Update triggers only fire on
+# the indexed columns, so status/assignment writes never touch the index.
+FTS_TABLES = {
+    "requests_fts": ("requests", ("tracking_number", "location")),
+    "foodbanks_fts": ("foodbanks", ("name", "location")),
+}
+MIN_QUERY_LENGTH = 3
+
+# PostgreSQL counterpart: pg_trgm GIN indexes serve the same substring ILIKE queries
+PG_TRGM_INDEXES = {
+    "ix_requests_tracking_number_trgm": ("requests", "tracking_number"),
+    "ix_requests_location_trgm": ("requests", "location"),
+    "ix_foodbanks_name_trgm": ("foodbanks", "name"),
+    "ix_foodbanks_location_trgm": ("foodbanks", "location"),
+}
+
+
+def _fts_ddl(fts_table: str, content_table: str, columns) -> List[str]:
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+        f"{column_list}, content='{content_table}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {content_table} BEGIN "
+        f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {content_table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {column_list} ON {content_table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values}); END",
+    ]
+
+
+def ensure_search_index(engine: Engine):
+    """
+    Create the FTS5 tables and sync triggers if missing, and backfill them
+    from existing rows the first time.
+    """
+    if is_postgres(engine):
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for index_name, (table, column) in PG_TRGM_INDEXES.items():
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} USING gin ({column} gin_trgm_ops)"
+                ))
+        return
+    if engine.dialect.name != "sqlite":
+        return
+
+    with engine.begin() as conn:
+        for fts_table, (content_table, columns) in FTS_TABLES.items():
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": fts_table}
+            ).first()
+            for statement in _fts_ddl(fts_table, content_table, columns):
+                conn.execute(text(statement))
+            if not exists:
+                conn.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+
+
+def _match_expression(query: str) -> str:
+    # Quote as a single FTS5 string so user input is never parsed as query syntax
+    return '"' + query.replace('"', '""') + '"'
+
+
+def _like_pattern(query: str) -> str:
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _search_shard_requests(db: Session, query: str, limit: int, offset: int) -> List[schemas.RequestSearchResult]:
+    # Raw SQL is routed by mapper, so it reads the shard `db` is routed to
+    bind_arguments = {"mapper": models.Request}
+    if is_postgres(db):
+        rows = db.execute(text(
+            "SELECT r.id, r.tracking_number, r.location, r.district, r.status, r.created_at, "
+            "-GREATEST(similarity(r.tracking_number, :query), similarity(r.location, :query)) AS rank "
+            "FROM requests r WHERE r.tracking_number ILIKE :pattern OR r.location ILIKE :pattern "
+            "ORDER BY rank LIMIT :limit OFFSET :offset"
+        ), {"query": query, "pattern": _like_pattern(query), "limit": limit, "offset": offset},
+            bind_arguments=bind_arguments)
+        return [schemas.RequestSearchResult(**row._mapping) for row in rows]
+
+    rows = db.execute(text(
+        "SELECT r.id, r.tracking_number, r.location, r.district, r.status, r.created_at, "
+        "bm25(requests_fts) AS rank "
+        "FROM requests_fts JOIN requests r ON r.id = requests_fts.rowid "
+        "WHERE requests_fts MATCH :match ORDER BY rank LIMIT :limit OFFSET :offset"
+    ), {"match": _match_expression(query), "limit": limit, "offset": offset}, bind_arguments=bind_arguments)
+    return [schemas.RequestSearchResult(**row._mapping) for row in rows]
+
+
+def search_requests(db: Session, query: str, limit: int, offset: int) -> List[schemas.RequestSearchResult]:
+    """
+    Requests matching `query`, best rank first. With shards, each one returns
+    its best limit + offset rows in parallel and the page is cut from their
+    merge; bm25 ranks use per-shard statistics, so the order is approximate.
+    """
+    if not shards.configured():
+        return _search_shard_requests(db, query, limit, offset)
+    pages = shards.fan_out(lambda shard_db: _search_shard_requests(shard_db, query, limit + offset, 0), db=db)
+    return list(islice(heapq.merge(*pages.values(), key=lambda row: row.rank), offset, offset + limit))
+
+
+def search_foodbanks(db: Session, query: str, limit: int, offset: int) -> List[schemas.FoodBankSearchResult]:
+    if is_postgres(db):
+        rows = db.execute(text(
+            "SELECT f.id, f.name, f.location, f.district, "
+            "-GREATEST(similarity(f.name, :query), similarity(f.location, :query)) AS rank "
+            "FROM foodbanks f WHERE f.name ILIKE :pattern OR f.location ILIKE :pattern "
+            "ORDER BY rank LIMIT :limit OFFSET :offset"
+        ), {"query": query, "pattern": _like_pattern(query), "limit": limit, "offset": offset})
+        return [schemas.FoodBankSearchResult(**row._mapping) for row in rows]
+
+    rows = db.execute(text(
+        "SELECT f.id, f.name, f.location, f.district, bm25(foodbanks_fts) AS rank "
+        "FROM foodbanks_fts JOIN foodbanks f ON f.id = foodbanks_fts.rowid "
+        "WHERE foodbanks_fts MATCH :match ORDER BY rank LIMIT :limit OFFSET :offset"
+    ), {"match": _match_expression(query), "limit": limit, "offset": offset})
+    return [schemas.FoodBankSearchResult(**row._mapping) for row in rows]
@@ -3,12 +3,14 @@ import os
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
+import ledger
 import models
 from database import SessionLocal, engine
 from auth import get_password_hash
+from schema_version import ensure_schema
 
-# Create tables
-models.Base.metadata.create_all(bind=engine)
+# Create tables if the stored schema version is out of date
+ensure_schema(engine)
 
 # Sample GeoJSON for a district
 SAMPLE_DISTRICT_GEOJSON = json.dumps({
@@ -204,10 +206,9 @@ def seed_data():
         # Commit to get IDs for foodbanks
         db.commit()
         
-        # Seed inventory
+        # Seed inventory through the ledger so stock history starts with an intake
         for inv_data in inventory_items:
-            inv_item = models.InventoryItem(**inv_data)
-            db.add(inv_item)
+            ledger.intake(db, **inv_data)
         
         # Seed requests
         for req_data in requests:
@@ -222,6 +223,12 @@ def seed_data():
             req_item = models.RequestItem(**item_data)
             db.add(req_item)
         
+        db.commit()
+        
+        # Reserve/consume stock for the seeded assigned and fulfilled requests
+        for request in db.query(models.Request).all():
+            ledger.apply_request_transition(db, request, None, None)
+        
         db.commit()
         print("Database seeded successfully!")
     
@@ -0,0 +1,335 @@
+import json
+import logging
+import math
+import os
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+import models
+import shards
+from jobs import JobContext, job
+from routing import EARTH_RADIUS_KM
+
+# numpy is imported lazily inside the functions below to keep worker startup fast
+
+logger = logging.getLogger(__name__)
+
+COVERAGE_DIR = os.getenv("COVERAGE_DIR", "./coverage")
+COVERAGE_CELL_KM = 0.5
+COVERAGE_MAX_CELLS_PER_AXIS = 400
+COVERAGE_SERVED_KM = 5.0
+COVERAGE_HOTSPOTS = 5
+COVERAGE_REBUILD_SECONDS = 24 * 60 * 60
+KM_PER_DEGREE = 2 * math.pi * EARTH_RADIUS_KM / 360
+
+_lock = threading.Lock()
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    import numpy as np
+
+    lat1, lon1, lat2, lon2 = (np.radians(value) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _polygon_rings(geojson: dict) -> List[list]:
+    """
+    Every ring (outer boundaries and holes) of a Feature, FeatureCollection,
+    Polygon or MultiPolygon as lists of [lon, lat].
+    """
+    kind = geojson.get("type")
+    if kind == "FeatureCollection":
+        return [ring for feature in geojson["features"] for ring in _polygon_rings(feature)]
+    if kind == "Feature":
+        return _polygon_rings(geojson["geometry"])
+    if kind == "Polygon":
+        return list(geojson["coordinates"])
+    if kind == "MultiPolygon":
+        return [ring for polygon in geojson["coordinates"] for ring in polygon]
+    raise ValueError(f"Unsupported geometry type: {kind}")
+
+
+def rasterize(geojson: dict):
+    """
+    Grid of roughly COVERAGE_CELL_KM cells over the polygon's bounding box.
+    Returns (lat0, lon0, dlat, dlon, mask) where mask[i, j] is True when the
+    centre of cell (i, j) lies inside the polygon (even-odd rule, so holes work).
+    """
+    import numpy as np
+
+    rings = [np.asarray(ring, dtype=np.float64) for ring in _polygon_rings(geojson)]
+    points = np.concatenate(rings)
+    lon_min, lat_min = points.min(axis=0)
+    lon_max, lat_max = points.max(axis=0)
+
+    mid_lat = math.radians((lat_min + lat_max) / 2)
+    dlat = max(COVERAGE_CELL_KM / KM_PER_DEGREE, (lat_max - lat_min) / COVERAGE_MAX_CELLS_PER_AXIS)
+    dlon = max(
+        COVERAGE_CELL_KM / (KM_PER_DEGREE * max(math.cos(mid_lat), 0.01)),
+        (lon_max - lon_min) / COVERAGE_MAX_CELLS_PER_AXIS
+    )
+    rows = max(1, math.ceil((lat_max - lat_min) / dlat))
+    cols = max(1, math.ceil((lon_max - lon_min) / dlon))
+
+    lat = lat_min + (np.arange(rows) + 0.5) * dlat
+    lon = lon_min + (np.arange(cols) + 0.5) * dlon
+    lat_grid, lon_grid = np.meshgrid(lat, lon, indexing="ij")
+
+    inside = np.zeros((rows, cols), dtype=bool)
+    for ring in rings:
+        x1, y1 = ring[:-1, 0], ring[:-1, 1]
+        x2, y2 = ring[1:, 0], ring[1:, 1]
+        # Toggle for every edge a ray cast eastwards from the cell centre crosses
+        for ex1, ey1, ex2, ey2 in zip(x1, y1, x2, y2):
+            if ey1 == ey2:
+                continue
+            crosses = (ey1 > lat_grid) != (ey2 > lat_grid)
+            x_at = ex1 + (lat_grid - ey1) * (ex2 - ex1) / (ey2 - ey1)
+            inside ^= crosses & (lon_grid < x_at)
+
+    return lat_min, lon_min, dlat, dlon, inside
+
+
+def _cell_centres(grid: dict):
+    import numpy as np
+
+    rows, cols = grid["mask"].shape
+    lat = grid["lat0"] + (np.arange(rows) + 0.5) * grid["dlat"]
+    lon = grid["lon0"] + (np.arange(cols) + 0.5) * grid["dlon"]
+    return np.meshgrid(lat, lon, indexing="ij")
+
+
+def _nearest_distance(grid: dict, foodbanks, block: int = 64):
+    """
+    Distance in km from every cell centre inside the district to the nearest
+    foodbank, NaN outside the district. Foodbanks are processed in blocks to
+    bound memory on large grids.
+    """
+    import numpy as np
+
+    lat_grid, lon_grid = _cell_centres(grid)
+    cell_lat = lat_grid[grid["mask"]][:, None]
+    cell_lon = lon_grid[grid["mask"]][:, None]
+    nearest = np.full(cell_lat.shape[0], np.inf)
+    for start in range(0, len(foodbanks), block):
+        chunk = np.asarray(foodbanks[start:start + block], dtype=np.float64)
+        distances = _haversine(cell_lat, cell_lon, chunk[None, :, 0], chunk[None, :, 1])
+        nearest = np.minimum(nearest, distances.min(axis=1))
+
+    result = np.full(grid["mask"].shape, np.nan, dtype=np.float32)
+    result[grid["mask"]] = nearest
+    return result
+
+
+def _request_density(grid: dict, latitudes, longitudes):
+    import numpy as np
+
+    rows, cols = grid["mask"].shape
+    i = np.floor((latitudes - grid["lat0"]) / grid["dlat"]).astype(np.int64)
+    j = np.floor((longitudes - grid["lon0"]) / grid["dlon"]).astype(np.int64)
+    valid = (i >= 0) & (i < rows) & (j >= 0) & (j < cols)
+    counts = np.bincount(i[valid] * cols + j[valid], minlength=rows * cols).reshape(rows, cols)
+    counts[~grid["mask"]] = 0
+    return counts.astype(np.int32)
+
+
+def _grid_path(district_id: int) -> str:
+    return os.path.join(COVERAGE_DIR, f"district_{district_id}.npz")
+
+
+def _summary_path() -> str:
+    return os.path.join(COVERAGE_DIR, "summary.json")
+
+
+def _save_grid(district_id: int, grid: dict):
+    import numpy as np
+
+    tmp_path = _grid_path(district_id) + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(f, **grid)
+    os.replace(tmp_path, _grid_path(district_id))
+
+
+def _load_grid(district_id: int) -> Optional[dict]:
+    import numpy as np
+
+    try:
+        with np.load(_grid_path(district_id)) as data:
+            grid = {name: data[name] for name in data.files}
+    except FileNotFoundError:
+        return None
+    for name in ("lat0", "lon0", "dlat", "dlon"):
+        grid[name] = float(grid[name])
+    return grid
+
+
+def summarize(district: str, grid: dict) -> dict:
+    """
+    Per-district coverage figures plus the cells where many requests are far
+    from any foodbank (score = requests in the cell x distance in km).
+    """
+    import numpy as np
+
+    mask = grid["mask"]
+    distance = grid["distance_km"]
+    density = grid["density"]
+    inside = distance[mask].astype(np.float64)
+    weights = density[mask].astype(np.float64)
+    requests = int(weights.sum())
+    cell_area = (grid["dlat"] * KM_PER_DEGREE) * (
+        grid["dlon"] * KM_PER_DEGREE * math.cos(math.radians(grid["lat0"] + grid["dlat"] * mask.shape[0] / 2))
+    )
+    finite = np.isfinite(inside)
+
+    hotspots = []
+    score = np.where(
+        mask & np.isfinite(distance) & (distance > COVERAGE_SERVED_KM),
+        density * np.nan_to_num(distance), 0
+    )
+    if score.any():
+        lat_grid, lon_grid = _cell_centres(grid)
+        flat = score.ravel()
+        top = np.argpartition(-flat, min(COVERAGE_HOTSPOTS, flat.size - 1))[:COVERAGE_HOTSPOTS]
+        for index in top[np.argsort(-flat[top])]:
+            if flat[index] <= 0:
+                continue
+            i, j = np.unravel_index(index, score.shape)
+            hotspots.append({
+                "latitude": round(float(lat_grid[i, j]), 5),
+                "longitude": round(float(lon_grid[i, j]), 5),
+                "distance_km": round(float(distance[i, j]), 2),
+                "requests": int(density[i, j]),
+                "score": round(float(score[i, j]), 2),
+            })
+
+    return {
+        "district": district,
+        "cells": int(mask.sum()),
+        "area_km2": round(float(mask.sum() * cell_area), 2),
+        "requests": requests,
+        "mean_distance_km": round(float(inside[finite].mean()), 2) if finite.any() else None,
+        "max_distance_km": round(float(inside[finite].max()), 2) if finite.any() else None,
+        "request_weighted_distance_km": round(
+            float((inside[finite] * weights[finite]).sum() / weights[finite].sum()), 2
+        ) if finite.any() and weights[finite].sum() else None,
+        "requests_served_pct": round(
+            100.0 * float(weights[finite & (inside <= COVERAGE_SERVED_KM)].sum()) / requests, 1
+        ) if requests else None,
+        "hotspots": hotspots,
+    }
+
+
+def _foodbank_coordinates(db: Session):
+    return [
+        (latitude, longitude)
+        for latitude, longitude in db.query(models.FoodBank.latitude, models.FoodBank.longitude).filter(
+            models.FoodBank.latitude.isnot(None),
+            models.FoodBank.longitude.isnot(None)
+        )
+    ]
+
+
+def _request_coordinates(db: Session):
+    import numpy as np
+
+    def shard_coordinates(shard_db: Session):
+        coordinates = []
+        for model in (models.Request, models.ArchivedRequest):
+            coordinates.extend(shard_db.query(model.latitude, model.longitude).filter(
+                model.latitude.isnot(None),
+                model.longitude.isnot(None)
+            ).all())
+        return coordinates
+
+    coordinates = [row for rows in shards.fan_out(shard_coordinates, db=db).values() for row in rows]
+    points = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+    return points[:, 0], points[:, 1]
+
+
+def _write_summary(districts: List[dict]):
+    summary = {"computed_at": datetime.utcnow().isoformat(), "districts": districts}
+    tmp_path = _summary_path() + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(summary, f)
+    os.replace(tmp_path, _summary_path())
+
+
+def rebuild(db: Session, ctx: Optional[JobContext] = None) -> int:
+    os.makedirs(COVERAGE_DIR, exist_ok=True)
+    foodbanks = _foodbank_coordinates(db)
+    request_lat, request_lon = _request_coordinates(db)
+    districts = db.query(models.District).order_by(models.District.id).all()
+
+    summaries = []
+    for index, district in enumerate(districts):
+        try:
+            lat0, lon0, dlat, dlon, mask = rasterize(district.get_geojson())
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning("Skipping coverage for district %s: %s", district.name, e)
+            continue
+        grid = {"lat0": lat0, "lon0": lon0, "dlat": dlat, "dlon": dlon, "mask": mask}
+        grid["distance_km"] = _nearest_distance(grid, foodbanks)
+        grid["density"] = _request_density(grid, request_lat, request_lon)
+        _save_grid(district.id, grid)
+        summaries.append(summarize(district.name, grid))
+        if ctx is not None:
+            ctx.set_progress((index + 1) / len(districts))
+
+    _write_summary(summaries)
+    return len(summaries)
+
+
+def add_foodbank(db: Session, latitude: float, longitude: float) -> int:
+    """
+    A new foodbank can only bring cells closer, so each cached grid just takes
+    the minimum of its distances and the distances to the new site.
+    """
+    import numpy as np
+
+    summaries = []
+    for district in db.query(models.District).order_by(models.District.id).all():
+        grid = _load_grid(district.id)
+        if grid is None:
+            continue
+        grid["distance_km"] = np.fmin(grid["distance_km"], _nearest_distance(grid, [(latitude, longitude)]))
+        _save_grid(district.id, grid)
+        summaries.append(summarize(district.name, grid))
+
+    _write_summary(summaries)
+    return len(summaries)
+
+
+@job("coverage", every=COVERAGE_REBUILD_SECONDS)
+def compute_coverage(ctx: JobContext):
+    with _lock:
+        foodbank = None
+        if ctx.payload.get("foodbank_id") and os.path.exists(_summary_path()):
+            foodbank = ctx.db.query(models.FoodBank).filter(
+                models.FoodBank.id == ctx.payload["foodbank_id"]
+            ).first()
+
+        if foodbank is not None and foodbank.latitude is not None and foodbank.longitude is not None:
+            districts = add_foodbank(ctx.db, foodbank.latitude, foodbank.longitude)
+            return {"mode": "incremental", "districts": districts}
+
+        districts = rebuild(ctx.db, ctx)
+        return {"mode": "full", "districts": districts}
+
+
+_summary_cache = {"mtime": None, "summary": None}
+
+
+def load_summary() -> Optional[dict]:
+    try:
+        mtime = os.path.getmtime(_summary_path())
+    except FileNotFoundError:
+        return None
+    if _summary_cache["mtime"] != mtime:
+        with open(_summary_path()) as f:
+            _summary_cache["summary"] = json.load(f)
+        _summary_cache["mtime"] = mtime
+    return _summary_cache["summary"]
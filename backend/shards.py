@@ -0,0 +1,215 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, TypeVar
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import models
+import reference
+from database import SessionLocal, engine, make_engine
+
+T = TypeVar("T")
+
+PRIMARY = 0
+# Request ids are unique across shards: shard n hands out ids from
+# n * SHARD_ID_SPAN + 1, so the shard holding a request is known from its id.
+# Ids are 32-bit integers, which leaves room for 21 shards
+SHARD_ID_SPAN = 100_000_000
+MAX_SHARDS = 21
+GLOBAL_ID_TABLES = ("requests", "request_items")
+
+# Per-state tables: requests and inventory plus everything written in the same
+# transaction as them. Users, foodbanks, food items, districts and jobs stay
+# on the primary database
+SHARDED_MODELS = (
+    models.Request,
+    models.RequestItem,
+    models.ArchivedRequest,
+    models.ArchivedRequestItem,
+    models.RequestStatusEvent,
+    models.LatencyHistogramBucket,
+    models.IdempotencyKey,
+    models.InventoryItem,
+    models.InventoryLedgerEntry,
+    models.StockThreshold,
+    models.StockAlert,
+    models.ChangeCounter,
+    models.SyncTombstone,
+)
+SHARDED_TABLES = {model.__tablename__ for model in SHARDED_MODELS}
+
+_engines: List[Engine] = [engine]
+_names: List[str] = ["primary"]
+_state_shards: Dict[str, int] = {}
+
+
+def _parse_pairs(value: str) -> Dict[str, str]:
+    pairs = {}
+    for part in value.split(","):
+        name, sep, target = part.partition("=")
+        if sep and name.strip() and target.strip():
+            pairs[name.strip()] = target.strip()
+    return pairs
+
+
+def configure(urls: Dict[str, str], states: Dict[str, str]):
+    """
+    Register shard databases by name and the states each one holds, replacing
+    any earlier configuration. States that are not listed stay on the primary.
+    """
+    engines, names = [engine], ["primary"]
+    for name, url in urls.items():
+        shard_engine = make_engine(url)
+        if shard_engine.dialect.name != engine.dialect.name:
+            raise ValueError(f"Shard {name} must use the same database backend as DATABASE_URL")
+        engines.append(shard_engine)
+        names.append(name)
+    if len(engines) > MAX_SHARDS:
+        raise ValueError(f"At most {MAX_SHARDS - 1} shard databases are supported")
+    unknown = sorted(set(states.values()) - set(names))
+    if unknown:
+        raise ValueError(f"SHARD_STATES names unknown shards: {', '.join(unknown)}")
+
+    global _engines, _names, _state_shards
+    for old_engine in _engines[1:]:
+        old_engine.dispose()
+    _engines, _names = engines, names
+    _state_shards = {state: names.index(name) for state, name in states.items()}
+
+
+# e.g. SHARD_DATABASE_URLS="east=postgresql+psycopg2://...@east-db/b40_food_aid"
+# and SHARD_STATES="Kelantan=east,Terengganu=east,Pahang=east"
+configure(_parse_pairs(os.getenv("SHARD_DATABASE_URLS", "")), _parse_pairs(os.getenv("SHARD_STATES", "")))
+
+
+def configured() -> bool:
+    return len(_engines) > 1
+
+
+def all_shards() -> List[int]:
+    return list(range(len(_engines)))
+
+
+def shard_name(shard: int) -> str:
+    return _names[shard]
+
+
+def engines() -> List[Engine]:
+    return list(_engines)
+
+
+def shard_for_state(state: Optional[str]) -> int:
+    return _state_shards.get(state, PRIMARY)
+
+
+def shard_for_district(district: Optional[str]) -> int:
+    if not _state_shards:
+        return PRIMARY
+    for entry in reference.districts():
+        if entry.name == district:
+            return shard_for_state(entry.state)
+    return PRIMARY
+
+
+def shard_for_foodbank(foodbank) -> int:
+    return shard_for_district(foodbank.district)
+
+
+def shard_for_request_id(request_id: int) -> int:
+    shard = (request_id - 1) // SHARD_ID_SPAN
+    return shard if 0 <= shard < len(_engines) else PRIMARY
+
+
+def use(db: Session, shard: int) -> Session:
+    """
+    Route `db`'s per-state tables to `shard`; everything else keeps going to
+    the primary. Call it before the session reads or writes a per-state
+    table, since a session only ever talks to one shard. Returns `db`.
+    """
+    routed = db.info.get("shard")
+    if routed == shard:
+        return db
+    if routed is not None:
+        raise RuntimeError(f"Session is already routed to shard {_names[routed]}")
+    db.info["shard"] = shard
+    if shard != PRIMARY:
+        for model in SHARDED_MODELS:
+            db.bind_mapper(model, _engines[shard])
+    return db
+
+
+def current(db: Session) -> int:
+    return db.info.get("shard", PRIMARY)
+
+
+def session_for(shard: int) -> Session:
+    return use(SessionLocal(), shard)
+
+
+def run(shard: int, operation: Callable[[Session], T], db: Optional[Session] = None) -> T:
+    """
+    Run `operation` with a session routed to `shard`. `db` is reused when it
+    is routed there (or, unrouted, for the primary); otherwise a session is
+    opened and closed around the call, so the operation commits its own writes.
+    """
+    if db is not None and current(db) == shard:
+        return operation(use(db, shard))
+    shard_db = session_for(shard)
+    try:
+        return operation(shard_db)
+    finally:
+        shard_db.close()
+
+
+def fan_out(
+    operation: Callable[[Session], T],
+    shards: Optional[Iterable[int]] = None,
+    db: Optional[Session] = None
+) -> Dict[int, T]:
+    """
+    Run `operation` against every shard (or the given ones) in parallel and
+    return the results by shard. `db` serves the shard it is routed to, as in
+    run(); with one shard the operation runs inline.
+    """
+    targets = all_shards() if shards is None else list(dict.fromkeys(shards))
+    if len(targets) <= 1:
+        return {shard: run(shard, operation, db) for shard in targets}
+    with ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix="shard") as executor:
+        futures = {shard: executor.submit(run, shard, operation, db) for shard in targets}
+        return {shard: future.result() for shard, future in futures.items()}
+
+
+def prepare():
+    """
+    Get shard databases ready after ensure_schema(): move their id sequences
+    into the shard's range and, on PostgreSQL, drop the foreign keys from
+    per-state tables to tables that only the primary fills.
+    """
+    for shard, shard_engine in enumerate(_engines):
+        if shard == PRIMARY:
+            continue
+        floor = shard * SHARD_ID_SPAN
+        with shard_engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                for table_name in SHARDED_TABLES:
+                    for foreign_key in inspect(conn).get_foreign_keys(table_name):
+                        if foreign_key["referred_table"] not in SHARDED_TABLES:
+                            conn.execute(text(f'ALTER TABLE {table_name} DROP CONSTRAINT "{foreign_key["name"]}"'))
+                for table_name in GLOBAL_ID_TABLES:
+                    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"),
+                                            {"table": table_name}).scalar()
+                    conn.execute(text(
+                        f"SELECT setval(:sequence, :floor) FROM {sequence} WHERE last_value < :floor"
+                    ), {"sequence": sequence, "floor": floor})
+                continue
+            for table_name in GLOBAL_ID_TABLES:
+                seq = conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = :name"),
+                                   {"name": table_name}).scalar()
+                if seq is None:
+                    conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :floor)"),
+                                 {"name": table_name, "floor": floor})
+                elif seq < floor:
+                    conn.execute(text("UPDATE sqlite_sequence SET seq = :floor WHERE name = :name"),
+                                 {"name": table_name, "floor": floor})
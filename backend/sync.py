@@ -0,0 +1,389 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, exists, func, or_, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import models
+import shards
+from jobs import JobContext, job
+
+# change_seq comes from one counter shared by these tables, so a single cursor
+# orders every change a client has seen
+TRACKED_TABLES = ("requests", "request_items", "inventory")
+# Deletes that clients must hear about; items go away with their request
+TOMBSTONE_COLUMNS = {
+    "requests": ("old.user_id", "old.assigned_to_id", "old.district"),
+    "inventory": ("NULL", "old.foodbank_id", "NULL"),
+}
+# A request leaves a foodbank's view when it stops being Pending in its
+# district or assigned to it; that client gets a tombstone like for a delete
+SCOPE_COLUMNS = ("status", "assigned_to_id", "district")
+SCOPE_TOMBSTONE_VALUES = ("old.user_id", "old.assigned_to_id", "CASE WHEN old.status = 'Pending' THEN old.district END")
+TOMBSTONE_RETENTION = timedelta(days=30)
+TOMBSTONE_PRUNE_INTERVAL_SECONDS = 24 * 60 * 60
+BACKFILL_BATCH_SIZE = 1000
+
+SYNC_REQUEST_COLUMNS = (
+    models.Request.id,
+    models.Request.tracking_number,
+    models.Request.user_id,
+    models.Request.location,
+    models.Request.district,
+    models.Request.latitude,
+    models.Request.longitude,
+    models.Request.status,
+    models.Request.assigned_to_id,
+    models.Request.created_at,
+    models.Request.fulfilled_at,
+    models.Request.version,
+    models.Request.change_seq,
+)
+SYNC_REQUEST_ITEM_COLUMNS = (
+    models.RequestItem.id,
+    models.RequestItem.request_id,
+    models.RequestItem.food_item_id,
+    models.RequestItem.quantity,
+    models.RequestItem.change_seq,
+)
+SYNC_INVENTORY_COLUMNS = (
+    models.InventoryItem.id,
+    models.InventoryItem.foodbank_id,
+    models.InventoryItem.food_item_id,
+    models.InventoryItem.quantity,
+    models.InventoryItem.reserved,
+    models.InventoryItem.last_updated,
+    models.InventoryItem.version,
+    models.InventoryItem.change_seq,
+)
+
+
+def foodbank_request_scope(foodbank: models.FoodBank):
+    """
+    The requests a foodbank works on: assigned to it, or still Pending in its
+    district. GET /requests and sync use the same filter.
+    """
+    return or_(
+        models.Request.assigned_to_id == foodbank.id,
+        and_(models.Request.status == "Pending", models.Request.district == foodbank.district)
+    )
+
+
+def _scope_changed(prefix_old: str, prefix_new: str) -> str:
+    return " OR ".join(f"{prefix_old}.{column} IS DISTINCT FROM {prefix_new}.{column}" for column in SCOPE_COLUMNS)
+
+
+# On SQLite every tracked write is two row writes plus a counter update: the
+# AFTER trigger bumps change_counter and writes change_seq back into the row,
+# and the single counter row serializes writers (SQLite has one writer at a
+# time anyway). bench/bench_change_tracking.py measures the cost.
+def _sqlite_ddl() -> List[str]:
+    next_seq = "UPDATE change_counter SET value = value + 1 WHERE id = 1"
+    current_seq = "(SELECT value FROM change_counter WHERE id = 1)"
+    statements = []
+    for table in TRACKED_TABLES:
+        set_seq = f"UPDATE {table} SET change_seq = {current_seq} WHERE id = new.id"
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {table}_seq_ai AFTER INSERT ON {table} BEGIN "
+            f"{next_seq}; {set_seq}; END",
+            # The WHEN clause skips the trigger's own change_seq write
+            f"CREATE TRIGGER IF NOT EXISTS {table}_seq_au AFTER UPDATE ON {table} "
+            f"WHEN new.change_seq IS old.change_seq BEGIN {next_seq}; {set_seq}; END",
+        ]
+    for table, (user_id, foodbank_id, district) in TOMBSTONE_COLUMNS.items():
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_seq_ad AFTER DELETE ON {table} BEGIN {next_seq}; "
+            f"INSERT INTO sync_tombstones (change_seq, table_name, row_id, user_id, foodbank_id, district) "
+            f"VALUES ({current_seq}, '{table}', old.id, {user_id}, {foodbank_id}, {district}); END"
+        )
+    user_id, foodbank_id, district = SCOPE_TOMBSTONE_VALUES
+    statements.append(
+        f"CREATE TRIGGER IF NOT EXISTS requests_scope_au AFTER UPDATE OF {', '.join(SCOPE_COLUMNS)} ON requests "
+        f"WHEN {_scope_changed('old', 'new').replace('IS DISTINCT FROM', 'IS NOT')} BEGIN {next_seq}; "
+        f"INSERT INTO sync_tombstones (change_seq, table_name, row_id, user_id, foodbank_id, district) "
+        f"VALUES ({current_seq}, 'requests', old.id, {user_id}, {foodbank_id}, {district}); END"
+    )
+    return statements
+
+
+# On PostgreSQL nextval() hands out change_seq before commit, so transactions
+# can become visible out of order: a reader that saw seq 11 and moved its
+# cursor there would never see seq 10 committing later. The plain "everything
+# after the cursor" scheme only holds on SQLite, where writers are serialized.
+# Here each writing transaction first takes a shared advisory lock keyed on
+# the last value it saw before its first nextval() (its floor: every seq it
+# writes is above it), and readers only return rows up to
+# change_seq_horizon(): the sequence's last value, read before the locks, or
+# below the lowest floor still held, whichever is lower. Floors are split over
+# the two int4 lock keys, the first one starting at CHANGE_FLOOR_LOCK_CLASS.
+CHANGE_FLOOR_LOCK_CLASS = 40_047
+
+
+def _postgres_ddl() -> List[str]:
+    last_value = "CASE WHEN is_called THEN last_value ELSE last_value - 1 END"
+    statements = [
+        "CREATE SEQUENCE IF NOT EXISTS change_seq_counter",
+        "CREATE OR REPLACE FUNCTION next_change_seq() RETURNS bigint AS $$ DECLARE seq_floor bigint; BEGIN "
+        "IF coalesce(current_setting('b40.change_seq_floor', true), '') = '' THEN "
+        f"SELECT {last_value} INTO seq_floor FROM change_seq_counter; "
+        f"PERFORM pg_advisory_xact_lock_shared({CHANGE_FLOOR_LOCK_CLASS} + (seq_floor >> 31)::int, "
+        "(seq_floor & 2147483647)::int); "
+        "PERFORM set_config('b40.change_seq_floor', seq_floor::text, true); "
+        "END IF; RETURN nextval('change_seq_counter'); END $$ LANGUAGE plpgsql",
+        "CREATE OR REPLACE FUNCTION change_seq_horizon() RETURNS bigint AS $$ "
+        "DECLARE horizon bigint; oldest bigint; BEGIN "
+        f"SELECT {last_value} INTO horizon FROM change_seq_counter; "
+        f"SELECT min(((classid::bigint - {CHANGE_FLOOR_LOCK_CLASS}) << 31) + objid::bigint) INTO oldest "
+        f"FROM pg_locks WHERE locktype = 'advisory' AND objsubid = 2 AND classid::bigint >= {CHANGE_FLOOR_LOCK_CLASS} "
+        "AND database = (SELECT oid FROM pg_database WHERE datname = current_database()); "
+        "RETURN LEAST(horizon, oldest); END $$ LANGUAGE plpgsql",
+        "CREATE OR REPLACE FUNCTION bump_change_seq() RETURNS trigger AS $$ BEGIN "
+        "NEW.change_seq := next_change_seq(); RETURN NEW; END $$ LANGUAGE plpgsql",
+    ]
+    for table in TRACKED_TABLES:
+        statements += [
+            f"DROP TRIGGER IF EXISTS {table}_change_seq ON {table}",
+            f"CREATE TRIGGER {table}_change_seq BEFORE INSERT OR UPDATE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION bump_change_seq()",
+        ]
+    for table, (user_id, foodbank_id, district) in TOMBSTONE_COLUMNS.items():
+        values = ", ".join(value.replace("old.", "OLD.") for value in (user_id, foodbank_id, district))
+        statements += [
+            f"CREATE OR REPLACE FUNCTION {table}_tombstone() RETURNS trigger AS $$ BEGIN "
+            f"INSERT INTO sync_tombstones (change_seq, table_name, row_id, user_id, foodbank_id, district, created_at) "
+            f"VALUES (next_change_seq(), '{table}', OLD.id, {values}, now()); RETURN OLD; END $$ LANGUAGE plpgsql",
+            f"DROP TRIGGER IF EXISTS {table}_tombstone ON {table}",
+            f"CREATE TRIGGER {table}_tombstone AFTER DELETE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION {table}_tombstone()",
+        ]
+    values = ", ".join(value.replace("old.", "OLD.") for value in SCOPE_TOMBSTONE_VALUES)
+    statements += [
+        "CREATE OR REPLACE FUNCTION requests_scope_tombstone() RETURNS trigger AS $$ BEGIN "
+        "INSERT INTO sync_tombstones (change_seq, table_name, row_id, user_id, foodbank_id, district, created_at) "
+        f"VALUES (next_change_seq(), 'requests', OLD.id, {values}, now()); RETURN NULL; END $$ LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS requests_scope_tombstone ON requests",
+        f"CREATE TRIGGER requests_scope_tombstone AFTER UPDATE OF {', '.join(SCOPE_COLUMNS)} ON requests "
+        f"FOR EACH ROW WHEN ({_scope_changed('OLD', 'NEW')}) EXECUTE FUNCTION requests_scope_tombstone()",
+    ]
+    return statements
+
+
+def ensure_change_tracking(engine: Engine):
+    """
+    Install the change_seq triggers (and the counter row) and number any
+    rows written before tracking existed.
+    """
+    is_postgres = engine.dialect.name == "postgresql"
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO change_counter (id, value, pruned_through) VALUES (1, 0, 0) ON CONFLICT DO NOTHING"
+            if is_postgres else
+            "INSERT OR IGNORE INTO change_counter (id, value, pruned_through) VALUES (1, 0, 0)"
+        ))
+        for statement in _postgres_ddl() if is_postgres else _sqlite_ddl():
+            conn.execute(text(statement))
+
+        for table in TRACKED_TABLES:
+            if is_postgres:
+                # The BEFORE UPDATE trigger replaces the value with nextval()
+                conn.execute(text(f"UPDATE {table} SET change_seq = 0 WHERE change_seq IS NULL"))
+                continue
+            while True:
+                ids = [row[0] for row in conn.execute(text(
+                    f"SELECT id FROM {table} WHERE change_seq IS NULL ORDER BY id LIMIT {BACKFILL_BATCH_SIZE}"
+                ))]
+                if not ids:
+                    break
+                for row_id in ids:
+                    conn.execute(text("UPDATE change_counter SET value = value + 1 WHERE id = 1"))
+                    conn.execute(text(
+                        f"UPDATE {table} SET change_seq = (SELECT value FROM change_counter WHERE id = 1) WHERE id = :id"
+                    ), {"id": row_id})
+
+
+def change_seq_horizon(db: Session) -> Optional[int]:
+    """
+    The highest change_seq that is safe to hand out as a cursor on `db`'s
+    shard: no transaction still in flight can commit a lower one. None on
+    SQLite, where every committed change is below any later one.
+    """
+    if db.get_bind(models.Request).dialect.name != "postgresql":
+        return None
+    return db.execute(text("SELECT change_seq_horizon()"), bind_arguments={"mapper": models.Request}).scalar()
+
+
+def changed_after(column, cursor: int, horizon: Optional[int]) -> tuple:
+    """
+    Filters for rows whose `column` (a change_seq) is past `cursor` and, when
+    there is one, not past `horizon`.
+    """
+    return (column > cursor,) if horizon is None else (column > cursor, column <= horizon)
+
+
+def changes(
+    db: Session,
+    since: int,
+    limit: int,
+    user_id: Optional[int] = None,
+    foodbank: Optional[models.FoodBank] = None
+) -> Dict:
+    """
+    Up to `limit` changes after cursor `since`, oldest first, scoped to what
+    the caller may see: their own requests (user_id), their district and
+    their assignments (foodbank), or everything. Returns the rows per table,
+    tombstones, the new cursor and whether more changes are waiting. A
+    request that left the caller's view (reassigned, no longer Pending, moved
+    district) comes back as a tombstone unless it is visible again. `reset`
+    means tombstones after `since` were pruned and the client must resync
+    from 0.
+    """
+    pruned_through = db.query(models.ChangeCounter.pruned_through).filter(
+        models.ChangeCounter.id == 1
+    ).scalar() or 0
+    if 0 < since < pruned_through:
+        return {"cursor": 0, "has_more": True, "reset": True,
+                "requests": [], "request_items": [], "inventory": [], "deleted": []}
+
+    request_scope = []
+    if user_id is not None:
+        request_scope.append(models.Request.user_id == user_id)
+    elif foodbank is not None:
+        request_scope.append(foodbank_request_scope(foodbank))
+
+    # Capped below transactions still in flight, which may commit lower values
+    horizon = change_seq_horizon(db)
+
+    requests = db.query(*SYNC_REQUEST_COLUMNS).filter(
+        *changed_after(models.Request.change_seq, since, horizon), *request_scope
+    ).order_by(models.Request.change_seq).limit(limit).all()
+
+    items = db.query(*SYNC_REQUEST_ITEM_COLUMNS).join(
+        models.Request, models.Request.id == models.RequestItem.request_id
+    ).filter(
+        *changed_after(models.RequestItem.change_seq, since, horizon), *request_scope
+    ).order_by(models.RequestItem.change_seq).limit(limit).all()
+
+    inventory = []
+    if user_id is None:
+        inventory_query = db.query(*SYNC_INVENTORY_COLUMNS).filter(
+            *changed_after(models.InventoryItem.change_seq, since, horizon)
+        )
+        if foodbank is not None:
+            inventory_query = inventory_query.filter(models.InventoryItem.foodbank_id == foodbank.id)
+        inventory = inventory_query.order_by(models.InventoryItem.change_seq).limit(limit).all()
+
+    Tombstone = models.SyncTombstone
+    tombstone_query = db.query(Tombstone.change_seq, Tombstone.table_name, Tombstone.row_id).filter(
+        *changed_after(Tombstone.change_seq, since, horizon)
+    )
+    if user_id is not None:
+        tombstone_query = tombstone_query.filter(Tombstone.table_name == "requests", Tombstone.user_id == user_id)
+    elif foodbank is not None:
+        tombstone_query = tombstone_query.filter(or_(
+            Tombstone.foodbank_id == foodbank.id,
+            (Tombstone.table_name == "requests") & (Tombstone.district == foodbank.district)
+        ))
+    if request_scope:
+        # Scope changes leave tombstones for every earlier viewer; skip the
+        # ones for requests the caller can (again) see
+        tombstone_query = tombstone_query.filter(~exists().where(
+            Tombstone.table_name == "requests",
+            models.Request.id == Tombstone.row_id,
+            *request_scope
+        ))
+    tombstones = tombstone_query.order_by(Tombstone.change_seq).limit(limit).all()
+
+    # Merge the per-table pages and cut at `limit` so the cursor never skips a change
+    merged = sorted(
+        [(row.change_seq, "requests", row) for row in requests] +
+        [(row.change_seq, "request_items", row) for row in items] +
+        [(row.change_seq, "inventory", row) for row in inventory] +
+        [(row.change_seq, "deleted", row) for row in tombstones],
+        key=lambda entry: entry[0]
+    )
+    has_more = len(merged) > limit or any(
+        len(rows) == limit for rows in (requests, items, inventory, tombstones)
+    )
+    merged = merged[:limit]
+
+    page = {"requests": [], "request_items": [], "inventory": [], "deleted": []}
+    for _, kind, row in merged:
+        if kind == "deleted":
+            page["deleted"].append({"table": row.table_name, "id": row.row_id, "change_seq": row.change_seq})
+        else:
+            page[kind].append(dict(row._mapping))
+
+    page["cursor"] = merged[-1][0] if merged else since
+    page["has_more"] = has_more
+    page["reset"] = False
+    return page
+
+
+def parse_cursor(since: str, default_shard: int = shards.PRIMARY) -> Dict[int, int]:
+    """
+    Per-shard positions from a `since` value: a plain number is the position
+    on `default_shard` (the only kind of cursor without shards), otherwise
+    "shard:seq" pairs such as "0:812,1:40".
+    """
+    if ":" not in since:
+        return {default_shard: int(since)}
+    return {int(shard): int(seq) for shard, seq in (part.split(":") for part in since.split(","))}
+
+
+def sharded_changes(db: Session, since: str, limit: int, user_id: Optional[int] = None) -> Dict:
+    """
+    changes() across every shard, for callers whose rows are not in one region
+    (regular users and the organization). Each shard has its own change_seq,
+    so the cursor carries one position per shard; shards are read in order
+    with what is left of `limit`.
+    """
+    cursors = parse_cursor(since)
+    page = {"requests": [], "request_items": [], "inventory": [], "deleted": []}
+    has_more = False
+    for shard in shards.all_shards():
+        remaining = limit - sum(len(rows) for rows in page.values())
+        if remaining <= 0:
+            has_more = True
+            break
+        shard_page = shards.run(
+            shard, lambda shard_db: changes(shard_db, cursors.get(shard, 0), remaining, user_id=user_id), db=db
+        )
+        if shard_page["reset"]:
+            return {"cursor": "0", "has_more": True, "reset": True,
+                    "requests": [], "request_items": [], "inventory": [], "deleted": []}
+        for kind in page:
+            page[kind] += shard_page[kind]
+        cursors[shard] = shard_page["cursor"]
+        if shard_page["has_more"]:
+            has_more = True
+            break
+
+    page["cursor"] = ",".join(f"{shard}:{seq}" for shard, seq in sorted(cursors.items()))
+    page["has_more"] = has_more
+    page["reset"] = False
+    return page
+
+
+@job("prune_sync_tombstones", every=TOMBSTONE_PRUNE_INTERVAL_SECONDS)
+def prune_tombstones(ctx: JobContext):
+    cutoff = datetime.utcnow() - TOMBSTONE_RETENTION
+    removed = shards.fan_out(lambda db: _prune_tombstones(db, cutoff), db=ctx.db)
+    return {"removed": sum(removed.values())}
+
+
+def _prune_tombstones(db: Session, cutoff: datetime) -> int:
+    Tombstone = models.SyncTombstone
+    pruned_through = db.query(func.max(Tombstone.change_seq)).filter(Tombstone.created_at < cutoff).scalar()
+    if pruned_through is None:
+        return 0
+
+    removed = db.query(Tombstone).filter(
+        Tombstone.change_seq <= pruned_through
+    ).delete(synchronize_session=False)
+    # Clients whose cursor is older than this missed deletes and must resync
+    db.query(models.ChangeCounter).filter(models.ChangeCounter.id == 1).update(
+        {models.ChangeCounter.pruned_through: pruned_through}, synchronize_session=False
+    )
+    db.commit()
+    return removed
@@ -0,0 +1,120 @@
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+# Point the app at a throwaway database before anything imports database.py.
+# Set TEST_DATABASE_URL to run the suite against PostgreSQL instead.
+_workdir = tempfile.mkdtemp(prefix="b40-tests-")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite:///{_workdir}/test.db")
+os.environ["RATE_LIMIT_BACKEND"] = "memory"
+os.environ["ANALYTICS_SNAPSHOT_DIR"] = os.path.join(_workdir, "analytics_snapshot")
+os.environ["COVERAGE_DIR"] = os.path.join(_workdir, "coverage")
+os.environ["EXPORT_DIR"] = os.path.join(_workdir, "exports")
+os.environ.pop("TRAFFIC_CAPTURE_PATH", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+import analytics  # noqa: E402
+import auth  # noqa: E402
+import idempotency  # noqa: E402
+import main  # noqa: E402
+import models  # noqa: E402
+import ratelimit  # noqa: E402
+import reference  # noqa: E402
+import routing  # noqa: E402
+import triage  # noqa: E402
+import workspace  # noqa: E402
+from database import SessionLocal, engine  # noqa: E402
+from schema_version import ensure_schema  # noqa: E402
+
+ensure_schema(engine)
+
+# Rows the schema setup owns and the tests must not clear
+KEPT_TABLES = {"schema_version", "change_counter"}
+
+
+def _reset_database():
+    with engine.begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            if table.name not in KEPT_TABLES:
+                conn.execute(table.delete())
+        conn.execute(text("UPDATE change_counter SET pruned_through = 0"))
+
+
+def _reset_caches():
+    workspace._cache.clear()
+    idempotency._cache._entries.clear()
+    routing._cache.clear()
+    analytics._snapshot_cache.update(generated_at=None, snapshot=None)
+    ratelimit.reset()
+    triage.indexes.clear()
+    reference.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    _reset_database()
+    _reset_caches()
+    yield
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client():
+    # Without the context manager the lifespan hook (and the job runner) never starts
+    return TestClient(main.app)
+
+
+def auth_headers(username: str) -> dict:
+    return {"Authorization": f"Bearer {auth.create_access_token({'sub': username})}"}
+
+
+@pytest.fixture
+def world(db):
+    """
+    An org admin, a foodbank in Petaling with its admin, a recipient and two
+    food items (one in the Baby category).
+    """
+    users = {}
+    for username, role in (("org", "org"), ("foodbank", "foodbank"), ("recipient", "user")):
+        users[role] = models.User(username=username, email=f"{username}@example.com",
+                                  hashed_password="", role=role, is_active=True)
+    db.add_all(users.values())
+    db.flush()
+    foodbank = models.FoodBank(name="Petaling Food Bank", location="Jalan 1", district="Petaling",
+                               contact_info="03-0000000", admin_id=users["foodbank"].id,
+                               latitude=3.1, longitude=101.6)
+    rice = models.FoodItem(name="Rice", icon="rice.png", category="Basic")
+    formula = models.FoodItem(name="Infant formula", icon="formula.png", category="Baby")
+    db.add_all([foodbank, rice, formula])
+    db.commit()
+    return SimpleNamespace(
+        org=auth_headers("org"),
+        foodbank=auth_headers("foodbank"),
+        recipient=auth_headers("recipient"),
+        foodbank_id=foodbank.id,
+        rice_id=rice.id,
+        formula_id=formula.id,
+    )
+
+
+def create_request(client, headers, items, district="Petaling"):
+    response = client.post("/api/requests", json={
+        "location": "Jalan 2", "district": district, "latitude": 3.11, "longitude": 101.61,
+        "items": [{"food_item_id": food_item_id, "quantity": quantity} for food_item_id, quantity in items],
+    }, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
@@ -0,0 +1,104 @@
+-- SQLite database as created by the baseline models (before schema versioning),
+-- with duplicate inventory rows and an assigned request
+BEGIN TRANSACTION;
+CREATE TABLE districts (
+	id INTEGER NOT NULL, 
+	name VARCHAR, 
+	state VARCHAR, 
+	geojson VARCHAR, 
+	PRIMARY KEY (id)
+);
+CREATE TABLE food_items (
+	id INTEGER NOT NULL, 
+	name VARCHAR, 
+	icon VARCHAR, 
+	category VARCHAR, 
+	PRIMARY KEY (id)
+);
+INSERT INTO "food_items" VALUES(1,'Rice','rice.png','Basic');
+INSERT INTO "food_items" VALUES(2,'Infant formula','formula.png','Baby');
+CREATE TABLE foodbanks (
+	id INTEGER NOT NULL, 
+	name VARCHAR, 
+	location VARCHAR, 
+	district VARCHAR, 
+	contact_info VARCHAR, 
+	admin_id INTEGER, 
+	latitude FLOAT, 
+	longitude FLOAT, 
+	created_at DATETIME DEFAULT CURRENT_TIMESTAMP, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(admin_id) REFERENCES users (id)
+);
+INSERT INTO "foodbanks" VALUES(1,'Petaling Food Bank','Jalan 1','Petaling','03-0000000',2,3.1,101.6,'2025-01-01 00:00:00');
+CREATE TABLE inventory (
+	id INTEGER NOT NULL, 
+	foodbank_id INTEGER, 
+	food_item_id INTEGER, 
+	quantity INTEGER, 
+	last_updated DATETIME DEFAULT CURRENT_TIMESTAMP, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(foodbank_id) REFERENCES foodbanks (id), 
+	FOREIGN KEY(food_item_id) REFERENCES food_items (id)
+);
+INSERT INTO "inventory" VALUES(1,1,1,10,'2025-01-01 00:00:00');
+INSERT INTO "inventory" VALUES(2,1,1,5,'2025-01-01 00:00:00');
+CREATE TABLE request_items (
+	id INTEGER NOT NULL, 
+	request_id INTEGER, 
+	food_item_id INTEGER, 
+	quantity INTEGER, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(request_id) REFERENCES requests (id), 
+	FOREIGN KEY(food_item_id) REFERENCES food_items (id)
+);
+INSERT INTO "request_items" VALUES(1,1,1,2);
+INSERT INTO "request_items" VALUES(2,2,1,3);
+INSERT INTO "request_items" VALUES(3,2,2,1);
+INSERT INTO "request_items" VALUES(4,3,1,1);
+CREATE TABLE requests (
+	id INTEGER NOT NULL, 
+	tracking_number VARCHAR, 
+	user_id INTEGER, 
+	location VARCHAR, 
+	district VARCHAR, 
+	latitude FLOAT, 
+	longitude FLOAT, 
+	status VARCHAR, 
+	assigned_to_id INTEGER, 
+	created_at DATETIME DEFAULT CURRENT_TIMESTAMP, 
+	fulfilled_at DATETIME, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(user_id) REFERENCES users (id), 
+	FOREIGN KEY(assigned_to_id) REFERENCES foodbanks (id)
+);
+INSERT INTO "requests" VALUES(1,'B40-00000001',3,'Jalan 2','Petaling',3.11,101.61,'Pending',NULL,'2025-01-02 00:00:00',NULL);
+INSERT INTO "requests" VALUES(2,'B40-00000002',3,'Jalan 3','Petaling',3.12,101.62,'Assigned',1,'2025-01-03 00:00:00',NULL);
+INSERT INTO "requests" VALUES(3,'B40-00000003',3,'Jalan 4','Petaling',3.13,101.63,'Fulfilled',1,'2025-01-04 00:00:00','2025-01-05 00:00:00');
+CREATE TABLE users (
+	id INTEGER NOT NULL, 
+	username VARCHAR, 
+	email VARCHAR, 
+	hashed_password VARCHAR, 
+	role VARCHAR, 
+	is_active BOOLEAN, 
+	created_at DATETIME DEFAULT CURRENT_TIMESTAMP, 
+	PRIMARY KEY (id)
+);
+INSERT INTO "users" VALUES(1,'org','org@example.com','','org',1,'2025-01-01 00:00:00');
+INSERT INTO "users" VALUES(2,'foodbank','foodbank@example.com','','foodbank',1,'2025-01-01 00:00:00');
+INSERT INTO "users" VALUES(3,'recipient','recipient@example.com','','user',1,'2025-01-01 00:00:00');
+CREATE UNIQUE INDEX ix_users_email ON users (email);
+CREATE INDEX ix_users_id ON users (id);
+CREATE UNIQUE INDEX ix_users_username ON users (username);
+CREATE UNIQUE INDEX ix_food_items_name ON food_items (name);
+CREATE INDEX ix_food_items_id ON food_items (id);
+CREATE UNIQUE INDEX ix_districts_name ON districts (name);
+CREATE INDEX ix_districts_id ON districts (id);
+CREATE INDEX ix_foodbanks_id ON foodbanks (id);
+CREATE INDEX ix_foodbanks_name ON foodbanks (name);
+CREATE INDEX ix_inventory_id ON inventory (id);
+CREATE INDEX ix_requests_id ON requests (id);
+CREATE UNIQUE INDEX ix_requests_tracking_number ON requests (tracking_number);
+CREATE INDEX ix_request_items_id ON request_items (id);
+COMMIT;
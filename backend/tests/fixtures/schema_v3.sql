@@ -0,0 +1,251 @@
+-- SQLite database at schema version 3 (before change_seq), with the search index
+BEGIN TRANSACTION;
+CREATE TABLE districts (
+	id INTEGER NOT NULL, 
+	name VARCHAR, 
+	state VARCHAR, 
+	geojson VARCHAR, 
+	PRIMARY KEY (id)
+);
+CREATE TABLE food_items (
+	id INTEGER NOT NULL, 
+	name VARCHAR, 
+	icon VARCHAR, 
+	category VARCHAR, 
+	PRIMARY KEY (id)
+);
+INSERT INTO "food_items" VALUES(1,'Rice','rice.png','Basic');
+INSERT INTO "food_items" VALUES(2,'Infant formula','formula.png','Baby');
+CREATE TABLE foodbanks (
+	id INTEGER NOT NULL, 
+	name VARCHAR, 
+	location VARCHAR, 
+	district VARCHAR, 
+	contact_info VARCHAR, 
+	admin_id INTEGER, 
+	latitude FLOAT, 
+	longitude FLOAT, 
+	created_at DATETIME DEFAULT CURRENT_TIMESTAMP, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(admin_id) REFERENCES users (id)
+);
+INSERT INTO "foodbanks" VALUES(1,'Petaling Food Bank','Jalan 1','Petaling','03-0000000',2,3.1,101.6,'2025-01-01 00:00:00');
+CREATE VIRTUAL TABLE foodbanks_fts USING fts5(name, location, content='foodbanks', content_rowid='id', tokenize='trigram');
+CREATE TABLE idempotency_keys (
+	"key" VARCHAR NOT NULL, 
+	response JSON, 
+	created_at DATETIME, 
+	expires_at DATETIME, 
+	PRIMARY KEY ("key")
+);
+CREATE TABLE inventory (
+	id INTEGER NOT NULL, 
+	foodbank_id INTEGER, 
+	food_item_id INTEGER, 
+	quantity INTEGER, 
+	reserved INTEGER DEFAULT '0' NOT NULL, 
+	last_updated DATETIME DEFAULT CURRENT_TIMESTAMP, 
+	version INTEGER DEFAULT '1' NOT NULL, 
+	PRIMARY KEY (id), 
+	CONSTRAINT uq_inventory_foodbank_food_item UNIQUE (foodbank_id, food_item_id), 
+	FOREIGN KEY(foodbank_id) REFERENCES foodbanks (id), 
+	FOREIGN KEY(food_item_id) REFERENCES food_items (id)
+);
+INSERT INTO "inventory" VALUES(1,1,1,15,3,'2025-01-01 00:00:00',1);
+CREATE TABLE inventory_ledger (
+	id INTEGER NOT NULL, 
+	foodbank_id INTEGER, 
+	food_item_id INTEGER, 
+	request_id INTEGER, 
+	kind VARCHAR, 
+	quantity_delta INTEGER, 
+	reserved_delta INTEGER, 
+	created_by_id INTEGER, 
+	created_at DATETIME DEFAULT CURRENT_TIMESTAMP, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(foodbank_id) REFERENCES foodbanks (id), 
+	FOREIGN KEY(food_item_id) REFERENCES food_items (id)
+);
+INSERT INTO "inventory_ledger" VALUES(1,1,1,NULL,'intake',15,0,NULL,'2025-01-01 00:00:00');
+INSERT INTO "inventory_ledger" VALUES(2,1,1,2,'reservation',0,3,NULL,'2025-01-03 00:00:00');
+CREATE TABLE jobs (
+	id INTEGER NOT NULL, 
+	kind VARCHAR, 
+	status VARCHAR, 
+	payload JSON, 
+	result JSON, 
+	error VARCHAR, 
+	progress FLOAT, 
+	attempts INTEGER, 
+	max_attempts INTEGER, 
+	run_after DATETIME, 
+	created_by_id INTEGER, 
+	created_at DATETIME, 
+	finished_at DATETIME, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(created_by_id) REFERENCES users (id)
+);
+CREATE TABLE latency_histogram (
+	metric VARCHAR NOT NULL, 
+	district VARCHAR NOT NULL, 
+	foodbank_id INTEGER NOT NULL, 
+	bucket INTEGER NOT NULL, 
+	count INTEGER, 
+	PRIMARY KEY (metric, district, foodbank_id, bucket)
+);
+CREATE TABLE request_items (
+	id INTEGER NOT NULL, 
+	request_id INTEGER, 
+	food_item_id INTEGER, 
+	quantity INTEGER, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(request_id) REFERENCES requests (id), 
+	FOREIGN KEY(food_item_id) REFERENCES food_items (id)
+);
+INSERT INTO "request_items" VALUES(1,1,1,2);
+INSERT INTO "request_items" VALUES(2,2,1,3);
+INSERT INTO "request_items" VALUES(3,2,2,1);
+INSERT INTO "request_items" VALUES(4,3,1,1);
+CREATE TABLE request_items_archive (
+	id INTEGER NOT NULL, 
+	request_id INTEGER, 
+	food_item_id INTEGER, 
+	quantity INTEGER, 
+	PRIMARY KEY (id)
+);
+CREATE TABLE request_status_events (
+	id INTEGER NOT NULL, 
+	request_id INTEGER, 
+	from_status VARCHAR, 
+	to_status VARCHAR, 
+	district VARCHAR, 
+	foodbank_id INTEGER, 
+	changed_by_id INTEGER, 
+	seconds_since_created INTEGER, 
+	created_at DATETIME, 
+	PRIMARY KEY (id)
+);
+CREATE TABLE requests (
+	id INTEGER NOT NULL, 
+	tracking_number VARCHAR, 
+	user_id INTEGER, 
+	location VARCHAR, 
+	district VARCHAR, 
+	latitude FLOAT, 
+	longitude FLOAT, 
+	status VARCHAR, 
+	assigned_to_id INTEGER, 
+	created_at DATETIME DEFAULT CURRENT_TIMESTAMP, 
+	fulfilled_at DATETIME, 
+	claimed_by_id INTEGER, 
+	claim_token VARCHAR, 
+	lease_expires_at DATETIME, 
+	version INTEGER DEFAULT '1' NOT NULL, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(user_id) REFERENCES users (id), 
+	FOREIGN KEY(assigned_to_id) REFERENCES foodbanks (id), 
+	FOREIGN KEY(claimed_by_id) REFERENCES users (id)
+);
+INSERT INTO "requests" VALUES(1,'B40-00000001',3,'Jalan 2','Petaling',3.11,101.61,'Pending',NULL,'2025-01-02 00:00:00',NULL,NULL,NULL,NULL,1);
+INSERT INTO "requests" VALUES(2,'B40-00000002',3,'Jalan 3','Petaling',3.12,101.62,'Assigned',1,'2025-01-03 00:00:00',NULL,NULL,NULL,NULL,1);
+INSERT INTO "requests" VALUES(3,'B40-00000003',3,'Jalan 4','Petaling',3.13,101.63,'Fulfilled',1,'2025-01-04 00:00:00','2025-01-05 00:00:00',NULL,NULL,NULL,1);
+CREATE TABLE requests_archive (
+	id INTEGER NOT NULL, 
+	tracking_number VARCHAR, 
+	user_id INTEGER, 
+	location VARCHAR, 
+	district VARCHAR, 
+	latitude FLOAT, 
+	longitude FLOAT, 
+	status VARCHAR, 
+	assigned_to_id INTEGER, 
+	created_at DATETIME, 
+	fulfilled_at DATETIME, 
+	archived_at DATETIME, 
+	PRIMARY KEY (id)
+);
+CREATE VIRTUAL TABLE requests_fts USING fts5(tracking_number, location, content='requests', content_rowid='id', tokenize='trigram');
+CREATE TABLE schema_version (
+	version INTEGER NOT NULL, 
+	applied_at DATETIME, 
+	PRIMARY KEY (version)
+);
+INSERT INTO "schema_version" VALUES(3,'2026-10-19 00:22:37.671010');
+CREATE TABLE stock_alerts (
+	id INTEGER NOT NULL, 
+	foodbank_id INTEGER, 
+	food_item_id INTEGER, 
+	available INTEGER, 
+	low_level INTEGER, 
+	created_at DATETIME, 
+	acknowledged_at DATETIME, 
+	acknowledged_by_id INTEGER, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(foodbank_id) REFERENCES foodbanks (id), 
+	FOREIGN KEY(food_item_id) REFERENCES food_items (id), 
+	FOREIGN KEY(acknowledged_by_id) REFERENCES users (id)
+);
+CREATE TABLE stock_thresholds (
+	id INTEGER NOT NULL, 
+	foodbank_id INTEGER, 
+	food_item_id INTEGER, 
+	low_level INTEGER NOT NULL, 
+	restore_level INTEGER NOT NULL, 
+	cooldown_seconds INTEGER NOT NULL, 
+	state VARCHAR NOT NULL, 
+	last_alert_at DATETIME, 
+	PRIMARY KEY (id), 
+	CONSTRAINT uq_stock_threshold_foodbank_food_item UNIQUE (foodbank_id, food_item_id), 
+	FOREIGN KEY(foodbank_id) REFERENCES foodbanks (id), 
+	FOREIGN KEY(food_item_id) REFERENCES food_items (id)
+);
+CREATE TABLE users (
+	id INTEGER NOT NULL, 
+	username VARCHAR, 
+	email VARCHAR, 
+	hashed_password VARCHAR, 
+	role VARCHAR, 
+	is_active BOOLEAN, 
+	created_at DATETIME DEFAULT CURRENT_TIMESTAMP, 
+	PRIMARY KEY (id)
+);
+INSERT INTO "users" VALUES(1,'org','org@example.com','','org',1,'2025-01-01 00:00:00');
+INSERT INTO "users" VALUES(2,'foodbank','foodbank@example.com','','foodbank',1,'2025-01-01 00:00:00');
+INSERT INTO "users" VALUES(3,'recipient','recipient@example.com','','user',1,'2025-01-01 00:00:00');
+CREATE UNIQUE INDEX ix_users_username ON users (username);
+CREATE UNIQUE INDEX ix_users_email ON users (email);
+CREATE INDEX ix_users_id ON users (id);
+CREATE UNIQUE INDEX ix_food_items_name ON food_items (name);
+CREATE INDEX ix_food_items_id ON food_items (id);
+CREATE UNIQUE INDEX ix_requests_archive_tracking_number ON requests_archive (tracking_number);
+CREATE INDEX ix_request_items_archive_request_id ON request_items_archive (request_id);
+CREATE INDEX ix_request_status_events_request_id ON request_status_events (request_id);
+CREATE INDEX ix_districts_id ON districts (id);
+CREATE UNIQUE INDEX ix_districts_name ON districts (name);
+CREATE INDEX ix_idempotency_keys_expires_at ON idempotency_keys (expires_at);
+CREATE INDEX ix_foodbanks_id ON foodbanks (id);
+CREATE INDEX ix_foodbanks_name ON foodbanks (name);
+CREATE INDEX ix_jobs_kind ON jobs (kind);
+CREATE INDEX ix_jobs_queue ON jobs (status, run_after);
+CREATE INDEX ix_jobs_id ON jobs (id);
+CREATE INDEX ix_inventory_id ON inventory (id);
+CREATE INDEX ix_stock_thresholds_id ON stock_thresholds (id);
+CREATE INDEX ix_stock_alerts_foodbank ON stock_alerts (foodbank_id, created_at);
+CREATE INDEX ix_stock_alerts_id ON stock_alerts (id);
+CREATE INDEX ix_inventory_ledger_request_id ON inventory_ledger (request_id);
+CREATE INDEX ix_inventory_ledger_id ON inventory_ledger (id);
+CREATE INDEX ix_inventory_ledger_item ON inventory_ledger (foodbank_id, food_item_id, created_at);
+CREATE INDEX ix_requests_claim_queue ON requests (district, status, lease_expires_at, created_at);
+CREATE UNIQUE INDEX ix_requests_tracking_number ON requests (tracking_number);
+CREATE INDEX ix_requests_claim_token ON requests (claim_token);
+CREATE INDEX ix_requests_id ON requests (id);
+CREATE INDEX ix_request_items_id ON request_items (id);
+CREATE TRIGGER requests_fts_ai AFTER INSERT ON requests BEGIN INSERT INTO requests_fts(rowid, tracking_number, location) VALUES (new.id, new.tracking_number, new.location); END;
+CREATE TRIGGER requests_fts_ad AFTER DELETE ON requests BEGIN INSERT INTO requests_fts(requests_fts, rowid, tracking_number, location) VALUES ('delete', old.id, old.tracking_number, old.location); END;
+CREATE TRIGGER requests_fts_au AFTER UPDATE OF tracking_number, location ON requests BEGIN INSERT INTO requests_fts(requests_fts, rowid, tracking_number, location) VALUES ('delete', old.id, old.tracking_number, old.location); INSERT INTO requests_fts(rowid, tracking_number, location) VALUES (new.id, new.tracking_number, new.location); END;
+CREATE TRIGGER foodbanks_fts_ai AFTER INSERT ON foodbanks BEGIN INSERT INTO foodbanks_fts(rowid, name, location) VALUES (new.id, new.name, new.location); END;
+CREATE TRIGGER foodbanks_fts_ad AFTER DELETE ON foodbanks BEGIN INSERT INTO foodbanks_fts(foodbanks_fts, rowid, name, location) VALUES ('delete', old.id, old.name, old.location); END;
+CREATE TRIGGER foodbanks_fts_au AFTER UPDATE OF name, location ON foodbanks BEGIN INSERT INTO foodbanks_fts(foodbanks_fts, rowid, name, location) VALUES ('delete', old.id, old.name, old.location); INSERT INTO foodbanks_fts(rowid, name, location) VALUES (new.id, new.name, new.location); END;
+INSERT INTO foodbanks_fts(foodbanks_fts) VALUES('rebuild');
+INSERT INTO requests_fts(requests_fts) VALUES('rebuild');
+COMMIT;
@@ -0,0 +1,29 @@
+import pytest
+
+import analytics
+from conftest import create_request
+
+
+def test_incremental_snapshot_after_a_failed_run(client, world, db, tmp_path, monkeypatch):
+    directory = str(tmp_path / "snapshot")
+    first = create_request(client, world.recipient, [(world.rice_id, 1)])
+    meta = analytics.build_full_snapshot(db, directory)
+
+    second = create_request(client, world.recipient, [(world.rice_id, 2)])
+
+    def fail(*args):
+        raise RuntimeError("database went away")
+
+    # Fails after the new rows were appended but before meta.json was replaced
+    with monkeypatch.context() as patch:
+        patch.setattr(analytics, "_encode_inventory", fail)
+        with pytest.raises(RuntimeError):
+            analytics.append_snapshot(db, meta, directory)
+
+    third = create_request(client, world.recipient, [(world.rice_id, 3)])
+    meta = analytics.append_snapshot(db, analytics._read_meta(directory), directory)
+
+    snapshot = analytics.Snapshot(meta, directory)
+    assert list(snapshot.tables["requests"]["id"]) == [first["id"], second["id"], third["id"]]
+    assert list(snapshot.tables["request_items"]["quantity"]) == [1, 2, 3]
+    assert (tmp_path / "snapshot" / "requests.id.bin").stat().st_size == 3 * 8
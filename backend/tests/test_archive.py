@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+import archive
+import models
+from conftest import create_request
+
+
+def _archive_fulfilled(db, request_id):
+    db.query(models.Request).filter(models.Request.id == request_id).update(
+        {models.Request.status: "Fulfilled", models.Request.fulfilled_at: datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.commit()
+    assert archive.archive_batch(db, cutoff=datetime.utcnow() + timedelta(days=1)) == 1
+
+
+def test_dashboard_counts_archived_requests(client, world, db):
+    archived = create_request(client, world.recipient, [(world.rice_id, 1)])
+    create_request(client, world.recipient, [(world.rice_id, 2)])
+    _archive_fulfilled(db, archived["id"])
+
+    stats = client.get("/api/stats/dashboard", headers=world.org).json()
+    assert (stats["total_requests"], stats["pending_requests"], stats["fulfilled_requests"]) == (2, 1, 1)
+
+
+def test_new_requests_never_reuse_archived_ids(client, world, db):
+    archived = create_request(client, world.recipient, [(world.rice_id, 1)])
+    _archive_fulfilled(db, archived["id"])
+
+    created = create_request(client, world.recipient, [(world.rice_id, 1)])
+    assert created["id"] > archived["id"]
+    assert created["request_items"][0]["id"] > archived["request_items"][0]["id"]
@@ -0,0 +1,117 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+import models
+from conftest import create_request
+from database import engine
+from routers import requests as requests_router
+
+
+def _bulk(client, headers, **operation):
+    response = client.post("/api/requests/bulk", json=operation, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _outcomes(result):
+    return {row["id"]: row["outcome"] for row in result["results"]}
+
+
+def test_outcomes_per_id(client, world, db):
+    pending = create_request(client, world.recipient, [(world.rice_id, 1)])
+    cancelled = create_request(client, world.recipient, [(world.rice_id, 1)])
+    _bulk(client, world.org, action="cancel", ids=[cancelled["id"]])
+
+    result = _bulk(client, world.org, action="fulfill", ids=[pending["id"], cancelled["id"], 999_999])
+
+    assert result["updated"] == 0
+    assert _outcomes(result) == {pending["id"]: "invalid_status", cancelled["id"]: "invalid_status",
+                                 999_999: "not_found"}
+    assert result["results"][0]["detail"] == "Request is Pending"
+    assert db.query(models.RequestStatusEvent).filter(
+        models.RequestStatusEvent.request_id == pending["id"]
+    ).count() == 0
+
+
+def test_foodbank_may_only_fulfill_its_own_requests(client, world, db):
+    other_admin = models.User(username="foodbank2", email="foodbank2@example.com", hashed_password="",
+                              role="foodbank", is_active=True)
+    db.add(other_admin)
+    db.flush()
+    other = models.FoodBank(name="Klang Food Bank", location="Jalan 9", district="Klang",
+                            contact_info="03-0000001", admin_id=other_admin.id)
+    db.add(other)
+    db.commit()
+    for foodbank_id in (world.foodbank_id, other.id):
+        client.post(f"/api/foodbanks/{foodbank_id}/inventory", json={"food_item_id": world.rice_id, "quantity": 5},
+                    headers=world.org)
+    mine = create_request(client, world.recipient, [(world.rice_id, 1)])
+    theirs = create_request(client, world.recipient, [(world.rice_id, 1)], district="Klang")
+    _bulk(client, world.org, action="assign", ids=[mine["id"]], assigned_to_id=world.foodbank_id)
+    _bulk(client, world.org, action="assign", ids=[theirs["id"]], assigned_to_id=other.id)
+
+    result = _bulk(client, world.foodbank, action="fulfill", ids=[mine["id"], theirs["id"]])
+
+    assert _outcomes(result) == {mine["id"]: "updated", theirs["id"]: "forbidden"}
+    assert client.get(f"/api/requests/{theirs['id']}", headers=world.org).json()["status"] == "Assigned"
+    assert client.post("/api/requests/bulk", json={"action": "cancel", "ids": [mine["id"]]},
+                       headers=world.foodbank).status_code == 403
+
+
+@contextmanager
+def _bumped_before_bulk_update(request_id):
+    # Another writer bumps the request between the bulk read and its UPDATE
+    bumped = []
+
+    def bump(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE requests SET status") and not bumped:
+            bumped.append(True)
+            conn.exec_driver_sql(f"UPDATE requests SET version = version + 1 WHERE id = {request_id}")
+
+    event.listen(engine, "before_cursor_execute", bump)
+    try:
+        yield
+    finally:
+        event.remove(engine, "before_cursor_execute", bump)
+
+
+def test_concurrent_change_is_a_conflict(client, world):
+    first = create_request(client, world.recipient, [(world.rice_id, 1)])
+    second = create_request(client, world.recipient, [(world.rice_id, 1)])
+
+    with _bumped_before_bulk_update(first["id"]):
+        result = _bulk(client, world.org, action="cancel", ids=[first["id"], second["id"]])
+
+    assert _outcomes(result) == {first["id"]: "conflict", second["id"]: "updated"}
+    assert client.get(f"/api/requests/{first['id']}", headers=world.org).json()["status"] == "Pending"
+
+
+def test_ambiguous_conflict_without_returning_rejects_the_batch(client, world, monkeypatch):
+    monkeypatch.setattr(engine.dialect, "update_returning", False, raising=False)
+    first = create_request(client, world.recipient, [(world.rice_id, 1)])
+    second = create_request(client, world.recipient, [(world.rice_id, 1)])
+
+    with _bumped_before_bulk_update(first["id"]):
+        response = client.post("/api/requests/bulk", json={"action": "cancel", "ids": [first["id"], second["id"]]},
+                               headers=world.org)
+
+    assert response.status_code == 409
+    for request in (first, second):
+        assert client.get(f"/api/requests/{request['id']}", headers=world.org).json()["status"] == "Pending"
+
+
+def test_filter_pages_with_has_more(client, world, monkeypatch):
+    monkeypatch.setattr(requests_router, "BULK_MAX_REQUESTS", 2)
+    created = [create_request(client, world.recipient, [(world.rice_id, 1)]) for _ in range(3)]
+    create_request(client, world.recipient, [(world.rice_id, 1)], district="Klang")
+    operation = {"action": "cancel", "filter": {"status": "Pending", "district": "Petaling"}}
+
+    first = _bulk(client, world.org, **operation)
+    second = _bulk(client, world.org, **operation)
+    third = _bulk(client, world.org, **operation)
+
+    assert (first["updated"], first["has_more"]) == (2, True)
+    assert [row["id"] for row in first["results"]] == [request["id"] for request in created[:2]]
+    assert (second["updated"], second["has_more"]) == (1, False)
+    assert (third["updated"], third["results"]) == (0, [])
@@ -0,0 +1,45 @@
+import json
+import os
+import subprocess
+import sys
+
+import capture
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_public_submission_personal_data_is_masked():
+    body = {
+        "first_name": "Siti", "last_name": "Aminah", "ic_number": "900101-14-5678",
+        "phone_number": "012-3456789", "address": "No 5, Jalan 5", "district": "Petaling",
+        "items": [{"food_item_id": 1, "quantity": 2}],
+    }
+    sanitized = capture.sanitize(body)
+    for key in ("first_name", "last_name", "ic_number", "phone_number", "address"):
+        assert sanitized[key] == capture.MASK
+    assert sanitized["district"] == "Petaling"
+    assert sanitized["items"] == body["items"]
+
+
+def test_extra_mask_keys_from_environment():
+    env = dict(os.environ, TRAFFIC_CAPTURE_MASK_KEYS="Location, latitude")
+    output = subprocess.run(
+        [sys.executable, "-c", "import capture, json; print(json.dumps(capture.sanitize("
+                               "{'location': 'Jalan 2', 'latitude': 3.1, 'district': 'Klang'})))"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    assert json.loads(output) == {"location": capture.MASK, "latitude": capture.MASK, "district": "Klang"}
+
+
+def test_identifiers_become_pseudonyms_per_capture():
+    salt, other_salt = b"a" * 16, b"b" * 16
+    first = capture.sanitize({"ic_number": "900101-14-5678", "email": "siti@example.org", "password": "secret"}, salt)
+    again = capture.sanitize({"ic_number": "900101-14-5678"}, salt)
+    second = capture.sanitize({"ic_number": "850505-10-1234"}, salt)
+
+    # One pseudonym per submitter, so replay keeps their guest user and rate limit bucket apart
+    assert first["ic_number"] == again["ic_number"] != second["ic_number"]
+    assert "900101" not in first["ic_number"] and first["ic_number"] != capture.MASK
+    assert first["email"].endswith("@example.com") and "siti" not in first["email"]
+    assert first["password"] == capture.MASK
+    assert capture.sanitize({"ic_number": "900101-14-5678"}, other_salt)["ic_number"] != first["ic_number"]
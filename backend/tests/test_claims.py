@@ -0,0 +1,68 @@
+from datetime import datetime
+
+import pytest
+
+import models
+from conftest import create_request
+from database import engine
+from routers.requests import _claimable
+
+
+def _claim(client, world, claimer, count=1):
+    response = client.post("/api/requests/claims", json={"count": count},
+                           headers=dict(world.foodbank, **{"X-Claimer-Id": claimer}))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_volunteers_sharing_an_account_hold_separate_leases(client, world):
+    for _ in range(2):
+        create_request(client, world.recipient, [(world.rice_id, 1)])
+
+    [aminah] = _claim(client, world, "aminah")
+    [badrul] = _claim(client, world, "badrul")
+    assert aminah["id"] != badrul["id"]
+    assert aminah["claimer"] == "aminah"
+
+    mine = client.get("/api/requests/claims", headers=dict(world.foodbank, **{"X-Claimer-Id": "badrul"}))
+    assert [request["id"] for request in mine.json()] == [badrul["id"]]
+
+    stolen = client.delete(f"/api/requests/{aminah['id']}/claim",
+                           headers=dict(world.foodbank, **{"X-Claimer-Id": "badrul"}))
+    assert stolen.status_code == 409
+    released = client.delete(f"/api/requests/{aminah['id']}/claim",
+                             headers=dict(world.foodbank, **{"X-Claimer-Id": "aminah"}))
+    assert released.status_code == 200
+    assert released.json()["claimer"] is None
+
+
+def test_claims_require_a_claimer_id(client, world):
+    response = client.post("/api/requests/claims", json={"count": 1}, headers=world.foodbank)
+    assert response.status_code == 422
+
+
+def test_org_assignment_clears_the_lease(client, world):
+    request = create_request(client, world.recipient, [(world.rice_id, 1)])
+    client.post(f"/api/foodbanks/{world.foodbank_id}/inventory",
+                json={"food_item_id": world.rice_id, "quantity": 10}, headers=world.foodbank)
+    _claim(client, world, "aminah")
+
+    response = client.put(f"/api/requests/{request['id']}", json={"assigned_to_id": world.foodbank_id},
+                          headers=world.org)
+
+    assert response.status_code == 200, response.text
+    assigned = response.json()
+    assert assigned["status"] == "Assigned"
+    assert (assigned["claimed_by_id"], assigned["claimer"], assigned["lease_expires_at"]) == (None, None, None)
+
+
+@pytest.mark.skipif(engine.dialect.name != "sqlite", reason="reads SQLite's query plan")
+def test_claims_walk_the_queue_index_in_created_at_order(db):
+    query = _claimable(db.query(models.Request.id), "Petaling", datetime.utcnow()).order_by(
+        models.Request.created_at
+    ).limit(5)
+    compiled = query.statement.compile(dialect=engine.dialect)
+    params = tuple(str(compiled.params[name]) for name in compiled.positiontup)
+    plan = " ".join(row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params))
+    assert "ix_requests_claim_queue" in plan
+    assert "TEMP B-TREE" not in plan
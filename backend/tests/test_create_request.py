@@ -0,0 +1,26 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import models
+from conftest import create_request
+from database import SessionLocal
+
+
+def test_request_and_items_commit_together(client, world):
+    committed = []
+
+    def record(session):
+        # What any other reader (e.g. an analytics snapshot) could see right now
+        reader = SessionLocal()
+        try:
+            committed.append((reader.query(models.Request).count(), reader.query(models.RequestItem).count()))
+        finally:
+            reader.close()
+
+    event.listen(Session, "after_commit", record)
+    try:
+        create_request(client, world.recipient, [(world.rice_id, 1), (world.formula_id, 2)])
+    finally:
+        event.remove(Session, "after_commit", record)
+
+    assert committed == [(1, 2)]
@@ -0,0 +1,51 @@
+import pytest
+
+import diagnostics
+from conftest import create_request
+
+
+@pytest.fixture
+def tracing():
+    yield
+    # tracemalloc is process wide; never leave it running for the rest of the suite
+    diagnostics.stop()
+
+
+def test_memory_endpoints_are_for_the_org_only(client, world):
+    for headers in (world.foodbank, world.recipient):
+        assert client.get("/api/diagnostics/memory", headers=headers).status_code == 403
+        assert client.post("/api/diagnostics/memory/start", headers=headers).status_code == 403
+
+
+def test_snapshot_top_and_diff(client, world, tracing):
+    status = client.get("/api/diagnostics/memory", headers=world.org).json()
+    assert status["rss_bytes"] > 0 and status["tracing"] is False
+    assert client.post("/api/diagnostics/memory/snapshots", headers=world.org).status_code == 409
+
+    started = client.post("/api/diagnostics/memory/start?frames=5", headers=world.org).json()
+    assert started["tracing"] is True and started["trace_frames"] == 5
+    first = client.post("/api/diagnostics/memory/snapshots", headers=world.org).json()
+    create_request(client, world.recipient, [(world.rice_id, 1)])
+    second = client.post("/api/diagnostics/memory/snapshots", headers=world.org).json()
+
+    top = client.get(f"/api/diagnostics/memory/snapshots/{second['id']}/top?limit=5", headers=world.org).json()
+    assert 0 < len(top) <= 5 and all(site["size_bytes"] > 0 for site in top)
+    diff = client.get(f"/api/diagnostics/memory/snapshots/{second['id']}/diff", headers=world.org).json()
+    assert diff["against_id"] == first["id"]
+    assert client.get("/api/diagnostics/memory/snapshots/999/top", headers=world.org).status_code == 404
+
+    stopped = client.post("/api/diagnostics/memory/stop", headers=world.org).json()
+    assert stopped["tracing"] is False and stopped["snapshots"] == []
+
+
+def test_no_orm_objects_outlive_their_requests(client, world, db):
+    db.close()
+    # The diagnostics call itself holds a session and the org user
+    before = client.get("/api/diagnostics/objects", headers=world.org).json()
+    for _ in range(3):
+        create_request(client, world.recipient, [(world.rice_id, 2)])
+        assert client.get("/api/requests", headers=world.org).status_code == 200
+
+    after = client.get("/api/diagnostics/objects", headers=world.org).json()
+    assert after["models"] == before["models"]
+    assert after["sessions"] == before["sessions"]
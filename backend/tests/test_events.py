@@ -0,0 +1,31 @@
+import asyncio
+
+import auth
+from database import engine
+from routers import events
+
+
+class _Client:
+    """Stands in for the Starlette request: connected for `polls` checks."""
+
+    def __init__(self, polls: int):
+        self.polls = polls
+
+    async def is_disconnected(self):
+        self.polls -= 1
+        return self.polls < 0
+
+
+def test_stream_does_not_hold_a_database_connection(world, db, monkeypatch):
+    monkeypatch.setattr(events, "EVENT_STREAM_HEARTBEAT_SECONDS", 0.01)
+    token = auth.create_access_token({"sub": "foodbank"})
+    db.close()
+
+    async def consume():
+        response = await events.stream_events(_Client(polls=1), topic=None, token=token)
+        checked_out = engine.pool.checkedout()
+        return checked_out, [chunk async for chunk in response.body_iterator]
+
+    checked_out, chunks = asyncio.run(consume())
+    assert checked_out == 0
+    assert chunks == [": keep-alive\n\n"]
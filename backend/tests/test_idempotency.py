@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+
+import main
+import models
+
+
+def _body(world, quantity=1):
+    return {"ic_number": "900101-14-5678", "name": "Siti", "phone": "012-3456789", "address": "Jalan 5",
+            "district": "Petaling", "items": [{"food_item_id": world.rice_id, "quantity": quantity}]}
+
+
+def test_retry_replays_the_original_response(client, world):
+    first = client.post("/api/public/requests", json=_body(world), headers={"Idempotency-Key": "k-1"})
+    retry = client.post("/api/public/requests", json=_body(world), headers={"Idempotency-Key": "k-1"})
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+
+
+def test_key_reused_for_a_different_body_is_rejected(client, world):
+    client.post("/api/public/requests", json=_body(world), headers={"Idempotency-Key": "k-2"})
+
+    response = client.post("/api/public/requests", json=_body(world, quantity=3), headers={"Idempotency-Key": "k-2"})
+
+    assert response.status_code == 422
+
+
+def test_concurrent_retries_create_one_request(world, db):
+    def submit(_):
+        return TestClient(main.app).post("/api/public/requests", json=_body(world),
+                                         headers={"Idempotency-Key": "k-3"})
+
+    with ThreadPoolExecutor(8) as pool:
+        responses = list(pool.map(submit, range(8)))
+
+    assert {response.status_code for response in responses} == {201}
+    assert len({response.json()["tracking_number"] for response in responses}) == 1
+    assert db.query(models.Request).count() == 1
@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func
+
+import main
+import models
+
+WORKERS = 8
+WRITES_PER_WORKER = 20
+
+
+def test_concurrent_inventory_writes_are_not_lost(client, world, db):
+    intake_url = f"/api/foodbanks/{world.foodbank_id}/inventory"
+    item = client.post(intake_url, json={"food_item_id": world.rice_id, "quantity": 100},
+                       headers=world.foodbank).json()
+    adjust_url = f"{intake_url}/{item['id']}"
+
+    def writer(worker):
+        worker_client = TestClient(main.app)
+        statuses = []
+        for write in range(WRITES_PER_WORKER):
+            if (worker + write) % 2:
+                response = worker_client.post(intake_url, json={"food_item_id": world.rice_id, "quantity": 2},
+                                              headers=world.foodbank)
+            else:
+                response = worker_client.put(adjust_url, json={"delta": -1}, headers=world.foodbank)
+            statuses.append(response.status_code)
+        return statuses
+
+    with ThreadPoolExecutor(WORKERS) as pool:
+        statuses = [status for result in pool.map(writer, range(WORKERS)) for status in result]
+
+    assert set(statuses) == {200}
+    writes = WORKERS * WRITES_PER_WORKER
+    expected = 100 + (writes // 2) * 2 - writes // 2
+    final = client.get(intake_url, headers=world.foodbank).json()
+    assert [row["quantity"] for row in final] == [expected]
+    ledger_total = db.query(func.sum(models.InventoryLedgerEntry.quantity_delta)).scalar()
+    assert ledger_total == expected
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta, timezone
+
+import jobs
+import models
+
+
+def _naive_utc(value):
+    # PostgreSQL returns aware datetimes, SQLite naive UTC ones
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _periodic_kinds():
+    return {kind for kind, spec in jobs.JOB_HANDLERS.items() if spec.every}
+
+
+def test_periodic_jobs_are_enqueued_once(db):
+    assert jobs._enqueue_due_periodic_jobs() == len(_periodic_kinds())
+    # A second worker polling at the same time finds them already queued
+    assert jobs._enqueue_due_periodic_jobs() == 0
+
+    queued = [kind for (kind,) in db.query(models.Job.kind)]
+    assert sorted(queued) == sorted(_periodic_kinds())
+
+
+def test_periodic_job_is_not_enqueued_twice_in_one_slot(db):
+    jobs._enqueue_due_periodic_jobs()
+    # Finished within the current slot: no new job until the next one
+    db.query(models.Job).update({models.Job.status: "succeeded"}, synchronize_session=False)
+    db.commit()
+
+    assert jobs._enqueue_due_periodic_jobs() == 0
+
+
+def test_only_expired_leases_are_requeued(db):
+    now = datetime.utcnow()
+    live = models.Job(kind="archive_closed_requests", status="running", locked_until=now + timedelta(minutes=1))
+    expired = models.Job(kind="archive_closed_requests", status="running", locked_until=now - timedelta(minutes=1))
+    db.add_all([live, expired])
+    db.commit()
+
+    assert jobs._requeue_expired_jobs() == 1
+
+    db.expire_all()
+    assert (live.status, expired.status) == ("running", "queued")
+    jobs._renew_leases([live.id])
+    db.expire_all()
+    assert _naive_utc(live.locked_until) > now + timedelta(minutes=1)
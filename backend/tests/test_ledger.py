@@ -0,0 +1,88 @@
+from conftest import create_request
+
+
+def _stock(client, world, quantity):
+    response = client.post(f"/api/foodbanks/{world.foodbank_id}/inventory",
+                           json={"food_item_id": world.rice_id, "quantity": quantity}, headers=world.foodbank)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _assign(client, world, request):
+    return client.put(f"/api/requests/{request['id']}", json={"assigned_to_id": world.foodbank_id},
+                      headers=world.org)
+
+
+def test_assignment_reserves_stock(client, world):
+    _stock(client, world, 5)
+    request = create_request(client, world.recipient, [(world.rice_id, 3)])
+
+    assert _assign(client, world, request).status_code == 200
+    [row] = client.get(f"/api/foodbanks/{world.foodbank_id}/inventory", headers=world.foodbank).json()
+    assert (row["quantity"], row["reserved"]) == (5, 3)
+
+
+def test_assignment_without_enough_stock_is_rejected(client, world):
+    _stock(client, world, 5)
+    first = create_request(client, world.recipient, [(world.rice_id, 3)])
+    second = create_request(client, world.recipient, [(world.rice_id, 3)])
+    assert _assign(client, world, first).status_code == 200
+
+    response = _assign(client, world, second)
+
+    assert response.status_code == 409
+    assert "Not enough stock" in response.json()["detail"]
+    assert client.get(f"/api/requests/{second['id']}", headers=world.org).json()["status"] == "Pending"
+    [row] = client.get(f"/api/foodbanks/{world.foodbank_id}/inventory", headers=world.foodbank).json()
+    assert (row["quantity"], row["reserved"]) == (5, 3)
+
+
+def test_unstocked_item_cannot_be_reserved(client, world):
+    request = create_request(client, world.recipient, [(world.formula_id, 1)])
+
+    assert _assign(client, world, request).status_code == 409
+    assert client.get(f"/api/foodbanks/{world.foodbank_id}/inventory", headers=world.foodbank).json() == []
+
+
+def test_bulk_assignment_reserves_what_is_in_stock(client, world):
+    _stock(client, world, 5)
+    requests = [create_request(client, world.recipient, [(world.rice_id, quantity)]) for quantity in (3, 3, 2)]
+
+    response = client.post("/api/requests/bulk", json={
+        "action": "assign", "ids": [request["id"] for request in requests], "assigned_to_id": world.foodbank_id
+    }, headers=world.org)
+
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["updated"] == 2
+    assert [row["outcome"] for row in result["results"]] == ["updated", "insufficient_stock", "updated"]
+    assert "Not enough stock" in result["results"][1]["detail"]
+    short = client.get(f"/api/requests/{requests[1]['id']}", headers=world.org).json()
+    assert (short["status"], short["assigned_to_id"], short["version"]) == ("Pending", None, requests[1]["version"])
+    [row] = client.get(f"/api/foodbanks/{world.foodbank_id}/inventory", headers=world.foodbank).json()
+    assert (row["quantity"], row["reserved"]) == (5, 5)
+
+
+def test_fulfilment_consumes_reserved_stock(client, world):
+    _stock(client, world, 5)
+    request = create_request(client, world.recipient, [(world.rice_id, 3)])
+    _assign(client, world, request)
+
+    response = client.put(f"/api/requests/{request['id']}", json={"status": "Fulfilled"}, headers=world.foodbank)
+
+    assert response.status_code == 200, response.text
+    [row] = client.get(f"/api/foodbanks/{world.foodbank_id}/inventory", headers=world.foodbank).json()
+    assert (row["quantity"], row["reserved"]) == (2, 0)
+
+
+def test_adjustment_may_go_below_reserved_but_not_below_zero(client, world):
+    row = _stock(client, world, 5)
+    _assign(client, world, create_request(client, world.recipient, [(world.rice_id, 3)]))
+    path = f"/api/foodbanks/{world.foodbank_id}/inventory/{row['id']}"
+
+    response = client.put(path, json={"delta": -6}, headers=world.foodbank)
+    assert response.status_code == 409
+    assert "Not enough stock" in response.json()["detail"]
+    response = client.put(path, json={"delta": -4}, headers=world.foodbank)
+    assert response.status_code == 200, response.text
+    assert (response.json()["quantity"], response.json()["reserved"]) == (1, 3)
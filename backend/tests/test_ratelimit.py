@@ -0,0 +1,44 @@
+from starlette.requests import Request
+
+import ratelimit
+
+PROXIES = ratelimit.parse_networks("10.0.0.0/8, 192.168.1.5")
+
+
+def _request(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers, "client": (peer, 1234)})
+
+
+def test_forwarded_for_is_ignored_from_untrusted_peers():
+    assert ratelimit.client_ip(_request("203.0.113.9", "198.51.100.1"), PROXIES) == "203.0.113.9"
+    assert ratelimit.client_ip(_request("10.1.2.3", "198.51.100.1"), ()) == "10.1.2.3"
+
+
+def test_forwarded_for_from_a_trusted_proxy_names_the_client():
+    assert ratelimit.client_ip(_request("10.1.2.3", "198.51.100.1"), PROXIES) == "198.51.100.1"
+    # A client-supplied hop further left cannot pick its own bucket
+    request = _request("10.1.2.3", "1.2.3.4, 198.51.100.1, 192.168.1.5")
+    assert ratelimit.client_ip(request, PROXIES) == "198.51.100.1"
+
+
+def test_tracking_is_limited_per_client(client):
+    statuses = [client.get("/api/public/track/B40-NOPE").status_code for _ in range(31)]
+
+    assert statuses[:30] == [404] * 30
+    assert statuses[30] == 429
+    response = client.get("/api/public/track/B40-NOPE")
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_reset_refills_only_the_given_limiters(tmp_path):
+    memory = ratelimit.MemoryTokenBucketLimiter(rate=0.001, capacity=1)
+    shared = ratelimit.SQLiteTokenBucketLimiter("a", rate=0.001, capacity=1, path=str(tmp_path / "limits.db"))
+    other = ratelimit.SQLiteTokenBucketLimiter("b", rate=0.001, capacity=1, path=str(tmp_path / "limits.db"))
+    for limiter in (memory, shared, other):
+        limiter.check("client")
+        assert limiter.check("client") > 0
+
+    ratelimit.reset(memory, shared)
+    assert memory.check("client") == 0 and shared.check("client") == 0
+    assert other.check("client") > 0
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta, timezone
+
+import models
+import request_history
+from conftest import create_request
+
+
+def _backdate(db, request_id, seconds):
+    db.query(models.Request).filter(models.Request.id == request_id).update(
+        {"created_at": datetime.now(timezone.utc) - timedelta(seconds=seconds)}, synchronize_session=False
+    )
+    db.commit()
+
+
+def test_latency_percentiles_come_from_histogram_buckets(client, world, db):
+    client.post(f"/api/foodbanks/{world.foodbank_id}/inventory",
+                json={"food_item_id": world.rice_id, "quantity": 10}, headers=world.foodbank)
+    # Nine requests assigned ~100 s after creation, one after ~10000 s
+    for age in [100] * 9 + [10_000]:
+        request = create_request(client, world.recipient, [(world.rice_id, 1)])
+        _backdate(db, request["id"], age)
+        response = client.put(f"/api/requests/{request['id']}", json={"assigned_to_id": world.foodbank_id},
+                              headers=world.org)
+        assert response.status_code == 200, response.text
+
+    buckets = dict(db.query(models.LatencyHistogramBucket.bucket, models.LatencyHistogramBucket.count).filter(
+        models.LatencyHistogramBucket.metric == "assign"
+    ).all())
+    assert buckets == {request_history.bucket_for(100): 9, request_history.bucket_for(10_000): 1}
+    assert db.query(models.RequestStatusEvent).filter(models.RequestStatusEvent.to_status == "Assigned").count() == 10
+
+    [stats] = client.get("/api/stats/latency?metric=assign&group_by=both", headers=world.org).json()
+    fast, slow = (round(request_history.bucket_value(request_history.bucket_for(age)), 1) for age in (100, 10_000))
+    assert (stats["district"], stats["foodbank_id"], stats["count"]) == ("Petaling", world.foodbank_id, 10)
+    assert (stats["p50_seconds"], stats["p90_seconds"], stats["p99_seconds"]) == (fast, fast, slow)
+    # Each bucket spans [2 ** (n / 4), 2 ** ((n + 1) / 4)), so the estimate is within ~10%
+    assert 90 < fast < 110 and 9_000 < slow < 11_000
+
+    assert client.get("/api/stats/latency?metric=fulfill", headers=world.org).json() == []
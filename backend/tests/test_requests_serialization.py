@@ -0,0 +1,44 @@
+from conftest import create_request
+
+
+def test_fast_path_matches_default_serialization(client, world):
+    create_request(client, world.recipient, [(world.rice_id, 2), (world.formula_id, 1)])
+    create_request(client, world.recipient, [(world.rice_id, 5)], district="Klang")
+
+    default = client.get("/api/requests", headers=world.org).json()
+    fast = client.get("/api/requests?fast=true", headers=world.org).json()
+
+    assert len(default) == 2
+    for request in default + fast:
+        request["request_items"].sort(key=lambda item: item["id"])
+    assert fast == default
+
+
+
+def test_fields_project_only_the_requested_keys(client, world):
+    created = create_request(client, world.recipient, [(world.rice_id, 2)])
+
+    listed = client.get("/api/requests?fields=status,district", headers=world.org).json()
+    assert listed == [{"id": created["id"], "status": "Pending", "district": "Petaling"}]
+    single = client.get(f"/api/requests/{created['id']}?fields=tracking_number", headers=world.org).json()
+    assert single == {"id": created["id"], "tracking_number": created["tracking_number"]}
+
+
+def test_include_items_adds_request_items(client, world):
+    created = create_request(client, world.recipient, [(world.rice_id, 2)])
+
+    [listed] = client.get("/api/requests?fields=status&include=items", headers=world.org).json()
+    assert set(listed) == {"id", "status", "request_items"}
+    assert [(item["food_item_id"], item["quantity"]) for item in listed["request_items"]] == [(world.rice_id, 2)]
+    assert listed["request_items"][0]["food_item"]["name"] == "Rice"
+    single = client.get(f"/api/requests/{created['id']}?include=items", headers=world.org).json()
+    assert set(single) == set(created)
+
+
+def test_unknown_field_or_include_is_rejected(client, world):
+    create_request(client, world.recipient, [(world.rice_id, 2)])
+
+    response = client.get("/api/requests?fields=status,password", headers=world.org)
+    assert response.status_code == 400
+    assert "password" in response.json()["detail"]
+    assert client.get("/api/requests?include=inventory", headers=world.org).status_code == 400
@@ -0,0 +1,99 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+from sqlalchemy import func, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+import models
+from database import make_engine
+from schema_version import ensure_schema, stored_schema_version
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+@pytest.fixture(params=["schema_baseline", "schema_v3"])
+def old_engine(request, tmp_path):
+    path = tmp_path / f"{request.param}.db"
+    conn = sqlite3.connect(path)
+    conn.executescript((FIXTURES / f"{request.param}.sql").read_text())
+    conn.close()
+    old = make_engine(f"sqlite:///{path}")
+    yield old
+    old.dispose()
+
+
+def test_upgrade_keeps_data_and_tracks_changes(old_engine):
+    assert ensure_schema(old_engine) is True
+    assert stored_schema_version(old_engine) == models.SCHEMA_VERSION
+    claim_queue = [index["column_names"] for index in inspect(old_engine).get_indexes("requests")
+                   if index["name"] == "ix_requests_claim_queue"]
+    assert claim_queue == [["district", "status", "created_at"]]
+
+    db = sessionmaker(bind=old_engine)()
+    try:
+        requests = db.query(models.Request).order_by(models.Request.id).all()
+        assert [request.status for request in requests] == ["Pending", "Assigned", "Fulfilled"]
+        assert all(request.version == 1 and request.change_seq for request in requests)
+        assert db.query(models.RequestItem).filter(models.RequestItem.change_seq.is_(None)).count() == 0
+
+        rice = db.query(models.InventoryItem).filter_by(foodbank_id=1, food_item_id=1).one()
+        assert (rice.quantity, rice.reserved) == (15, 3)
+        # Every inventory row matches the sum of its ledger entries
+        for item in db.query(models.InventoryItem).all():
+            quantity, reserved = db.query(
+                func.sum(models.InventoryLedgerEntry.quantity_delta),
+                func.sum(models.InventoryLedgerEntry.reserved_delta)
+            ).filter_by(foodbank_id=item.foodbank_id, food_item_id=item.food_item_id).one()
+            assert (quantity, reserved) == (item.quantity, item.reserved)
+
+        before = requests[0].change_seq
+        requests[0].status = "Cancelled"
+        db.commit()
+        db.refresh(requests[0])
+        assert requests[0].change_seq > before
+        assert requests[0].version == 2
+        matches = db.execute(text("SELECT rowid FROM requests_fts WHERE requests_fts MATCH :match"),
+                             {"match": '"Jalan 2"'}).scalars().all()
+        assert matches == [1]
+    finally:
+        db.close()
+
+    # Restarting against the upgraded database is a single version check
+    assert ensure_schema(old_engine) is False
+
+
+def test_upgrade_never_reuses_archived_ids(tmp_path):
+    path = tmp_path / "schema_v3.db"
+    conn = sqlite3.connect(path)
+    conn.executescript((FIXTURES / "schema_v3.sql").read_text())
+    # The newest request (and its item) was archived before the upgrade
+    conn.executescript(
+        "INSERT INTO requests_archive (id, tracking_number, user_id, location, district, latitude, longitude, "
+        "status, assigned_to_id, created_at, fulfilled_at) SELECT id, tracking_number, user_id, location, "
+        "district, latitude, longitude, status, assigned_to_id, created_at, fulfilled_at FROM requests WHERE id = 3;"
+        "INSERT INTO request_items_archive (id, request_id, food_item_id, quantity) "
+        "SELECT id, request_id, food_item_id, quantity FROM request_items WHERE request_id = 3;"
+        "DELETE FROM request_items WHERE request_id = 3; DELETE FROM requests WHERE id = 3;"
+    )
+    conn.close()
+    old = make_engine(f"sqlite:///{path}")
+    try:
+        ensure_schema(old)
+        db = sessionmaker(bind=old)()
+        try:
+            request = models.Request(user_id=3, location="Jalan 5", district="Petaling", status="Pending")
+            db.add(request)
+            db.flush()
+            item = models.RequestItem(request_id=request.id, food_item_id=1, quantity=1)
+            db.add(item)
+            db.commit()
+            assert (request.id, item.id) == (4, 5)
+            matches = db.execute(text("SELECT rowid FROM requests_fts WHERE requests_fts MATCH :match"),
+                                 {"match": '"Jalan 5"'}).scalars().all()
+            assert matches == [4]
+            assert request.change_seq
+        finally:
+            db.close()
+    finally:
+        old.dispose()
@@ -0,0 +1,31 @@
+import pytest
+from sqlalchemy import inspect, text
+
+import models
+from database import make_engine
+from schema_version import SchemaVersionError, ensure_schema, stored_schema_version
+
+
+@pytest.fixture
+def scratch_engine(tmp_path):
+    scratch = make_engine(f"sqlite:///{tmp_path}/scratch.db")
+    yield scratch
+    scratch.dispose()
+
+
+def test_fresh_database_is_created_at_current_version(scratch_engine):
+    assert ensure_schema(scratch_engine) is True
+    assert stored_schema_version(scratch_engine) == models.SCHEMA_VERSION
+    assert "request_items" in inspect(scratch_engine).get_table_names()
+    # An up-to-date database is left alone
+    assert ensure_schema(scratch_engine) is False
+
+
+def test_newer_schema_fails_fast(scratch_engine):
+    ensure_schema(scratch_engine)
+    with scratch_engine.begin() as conn:
+        conn.execute(text("UPDATE schema_version SET version = :version"),
+                     {"version": models.SCHEMA_VERSION + 1})
+
+    with pytest.raises(SchemaVersionError, match="newer than this code"):
+        ensure_schema(scratch_engine)
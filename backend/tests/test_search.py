@@ -0,0 +1,38 @@
+import models
+
+
+def _search(client, world, q):
+    response = client.get("/api/search", params={"q": q, "type": "requests"}, headers=world.org)
+    assert response.status_code == 200, response.text
+    return [row["id"] for row in response.json()["requests"]]
+
+
+def test_requests_are_found_by_partial_address_and_tracking_number(client, world, db):
+    created = client.post("/api/requests", json={
+        "location": "Lot 12 Kampung Baru Sungai", "district": "Petaling", "latitude": 3.1, "longitude": 101.6,
+        "items": [{"food_item_id": world.rice_id, "quantity": 1}],
+    }, headers=world.recipient).json()
+    other = client.post("/api/requests", json={
+        "location": "Taman Melawati", "district": "Gombak", "latitude": 3.2, "longitude": 101.7,
+        "items": [{"food_item_id": world.rice_id, "quantity": 1}],
+    }, headers=world.recipient).json()
+
+    assert _search(client, world, "kampung bar") == [created["id"]]
+    assert _search(client, world, created["tracking_number"][2:7]) == [created["id"]]
+
+    # The sync triggers re-index an updated address and drop the old one
+    db.query(models.Request).filter(models.Request.id == other["id"]).update(
+        {"location": "Jalan Kampung Baharu"}, synchronize_session=False
+    )
+    db.commit()
+    assert _search(client, world, "melawati") == []
+    assert _search(client, world, "Baharu") == [other["id"]]
+    assert sorted(_search(client, world, "Kampung")) == sorted([created["id"], other["id"]])
+
+    foodbanks = client.get("/api/search", params={"q": "Petaling Food"}, headers=world.org).json()["foodbanks"]
+    assert [row["id"] for row in foodbanks] == [world.foodbank_id]
+
+
+def test_queries_shorter_than_three_characters_are_rejected(client, world):
+    assert client.get("/api/search", params={"q": "ab"}, headers=world.org).status_code == 422
+    assert client.get("/api/search", params={"q": "abc"}, headers=world.org).status_code == 200
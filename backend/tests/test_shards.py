@@ -0,0 +1,146 @@
+import csv
+import os
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import exports
+import jobs
+import models
+import reference
+import shards
+from conftest import auth_headers, create_request
+from database import engine
+from schema_version import ensure_schema
+
+
+@pytest.fixture
+def east(world, db, tmp_path):
+    """
+    An "east" shard holding Kelantan, with a foodbank in Kota Bharu. Petaling
+    (Selangor) stays on the primary.
+    """
+    # Set TEST_SHARD_DATABASE_URL (an empty scratch database) along with TEST_DATABASE_URL
+    shard_url = os.getenv("TEST_SHARD_DATABASE_URL")
+    if shard_url is None:
+        if engine.dialect.name != "sqlite":
+            pytest.skip("TEST_SHARD_DATABASE_URL is not set")
+        shard_url = f"sqlite:///{tmp_path}/east.db"
+    shards.configure({"east": shard_url}, {"Kelantan": "east"})
+    shard_engine = shards.engines()[1]
+    ensure_schema(shard_engine)
+    with shard_engine.begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            if table.name in shards.SHARDED_TABLES and table.name != "change_counter":
+                conn.execute(table.delete())
+    shards.prepare()
+
+    admin = models.User(username="eastbank", email="eastbank@example.com", hashed_password="",
+                        role="foodbank", is_active=True)
+    db.add(admin)
+    db.flush()
+    foodbank = models.FoodBank(name="Kota Bharu Food Bank", location="Jalan 5", district="Kota Bharu",
+                               contact_info="09-0000000", admin_id=admin.id,
+                               latitude=6.1, longitude=102.2)
+    db.add_all([
+        foodbank,
+        models.District(name="Petaling", state="Selangor", geojson="{}"),
+        models.District(name="Kota Bharu", state="Kelantan", geojson="{}"),
+    ])
+    db.commit()
+    reference.invalidate()
+    try:
+        yield SimpleNamespace(foodbank=auth_headers("eastbank"), foodbank_id=foodbank.id)
+    finally:
+        shards.configure({}, {})
+
+
+def _count(shard: int, model) -> int:
+    with Session(shards.engines()[shard]) as session:
+        return session.query(func.count(model.id)).scalar()
+
+
+def test_requests_are_written_to_their_state_shard(client, world, east):
+    west = create_request(client, world.recipient, [(world.rice_id, 1)])
+    east_request = create_request(client, world.recipient, [(world.rice_id, 2)], district="Kota Bharu")
+
+    assert west["id"] <= shards.SHARD_ID_SPAN < east_request["id"]
+    assert (_count(0, models.Request), _count(1, models.Request)) == (1, 1)
+    assert (_count(0, models.RequestItem), _count(1, models.RequestItem)) == (1, 1)
+
+    fetched = client.get(f"/api/requests/{east_request['id']}", headers=world.org).json()
+    assert fetched["request_items"][0]["food_item"]["name"] == "Rice"
+
+    # Org-wide lists are read from both shards and merged
+    listed = client.get("/api/requests", headers=world.org).json()
+    assert sorted(row["id"] for row in listed) == [west["id"], east_request["id"]]
+    fast = client.get("/api/requests?fields=id,status", headers=world.org).json()
+    assert sorted(fast, key=lambda row: row["id"]) == [
+        {"id": west["id"], "status": "Pending"}, {"id": east_request["id"], "status": "Pending"}
+    ]
+    assert [row["id"] for row in client.get("/api/requests?district=Kota Bharu", headers=world.org).json()] == [
+        east_request["id"]
+    ]
+
+
+def test_dashboard_tracking_and_export_fan_out(client, world, east, db):
+    west = create_request(client, world.recipient, [(world.rice_id, 1)])
+    east_request = create_request(client, world.recipient, [(world.rice_id, 3)], district="Kota Bharu")
+
+    stats = client.get("/api/stats/dashboard", headers=world.org).json()
+    assert (stats["total_requests"], stats["pending_requests"]) == (2, 2)
+
+    tracked = client.get(f"/api/public/track/{east_request['tracking_number']}").json()
+    assert tracked["items"] == [{"name": "Rice", "quantity": 3}]
+
+    db_job = models.Job(kind="export_requests", status="running", payload={})
+    db.add(db_job)
+    db.commit()
+    result = exports.export_requests(jobs.JobContext(db, db_job))
+    with open(exports.export_path(db_job.id), newline="") as f:
+        rows = list(csv.reader(f))
+    assert result["rows"] == 2
+    assert rows[0] == list(exports.REQUEST_EXPORT_COLUMNS)
+    assert sorted(int(row[0]) for row in rows[1:]) == [west["id"], east_request["id"]]
+    assert not [name for name in os.listdir(exports.EXPORT_DIR) if name.startswith(f"requests-{db_job.id}.csv.")]
+
+
+def test_assignment_stays_within_the_region(client, world, east):
+    client.post(f"/api/foodbanks/{east.foodbank_id}/inventory", json={"food_item_id": world.rice_id, "quantity": 10},
+                headers=east.foodbank)
+    assert (_count(0, models.InventoryItem), _count(1, models.InventoryItem)) == (0, 1)
+    west = create_request(client, world.recipient, [(world.rice_id, 1)])
+    east_request = create_request(client, world.recipient, [(world.rice_id, 2)], district="Kota Bharu")
+
+    response = client.put(f"/api/requests/{east_request['id']}", json={"assigned_to_id": world.foodbank_id},
+                          headers=world.org)
+    assert response.status_code == 400
+
+    response = client.post("/api/requests/bulk", json={
+        "action": "assign", "ids": [west["id"], east_request["id"]], "assigned_to_id": east.foodbank_id
+    }, headers=world.org)
+    assert response.status_code == 200, response.text
+    assert {row["id"]: row["outcome"] for row in response.json()["results"]} == {
+        west["id"]: "forbidden", east_request["id"]: "updated"
+    }
+
+    inventory = client.get(f"/api/foodbanks/{east.foodbank_id}/inventory", headers=east.foodbank).json()
+    assert [(row["quantity"], row["reserved"]) for row in inventory] == [(10, 2)]
+    workspace = client.get("/api/foodbanks/me/workspace", headers=east.foodbank).json()
+    assert workspace["counters"]["assigned_requests"] == 1
+
+
+def test_sync_cursor_tracks_each_shard(client, world, east):
+    west = create_request(client, world.recipient, [(world.rice_id, 1)])
+    east_request = create_request(client, world.recipient, [(world.rice_id, 2)], district="Kota Bharu")
+
+    page = client.get("/api/sync?since=0", headers=world.recipient).json()
+    assert sorted(row["id"] for row in page["requests"]) == [west["id"], east_request["id"]]
+    assert page["cursor"].startswith("0:") and ",1:" in page["cursor"]
+
+    assert client.get(f"/api/sync?since={page['cursor']}", headers=world.recipient).json()["requests"] == []
+    later = create_request(client, world.recipient, [(world.rice_id, 1)], district="Kota Bharu")
+    page = client.get(f"/api/sync?since={page['cursor']}", headers=world.recipient).json()
+    assert [row["id"] for row in page["requests"]] == [later["id"]]
@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy import text
+
+import models
+from conftest import auth_headers, create_request
+from database import engine
+
+
+def _sync(client, headers, since=0):
+    response = client.get(f"/api/sync?since={since}", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _other_foodbank(db, district):
+    admin = models.User(username="foodbank2", email="foodbank2@example.com", hashed_password="",
+                        role="foodbank", is_active=True)
+    db.add(admin)
+    db.flush()
+    foodbank = models.FoodBank(name=f"{district} Food Bank", location="Jalan 9", district=district,
+                               contact_info="03-0000001", admin_id=admin.id)
+    db.add(foodbank)
+    db.commit()
+    return foodbank.id
+
+
+def _move(db, request_id, **values):
+    db.query(models.Request).filter(models.Request.id == request_id).update(values, synchronize_session=False)
+    db.commit()
+
+
+def test_foodbank_scope_matches_request_list(client, world, db):
+    other_id = _other_foodbank(db, "Petaling")
+    pending = create_request(client, world.recipient, [(world.rice_id, 1)])
+    elsewhere = create_request(client, world.recipient, [(world.rice_id, 1)])
+    _move(db, elsewhere["id"], status="Assigned", assigned_to_id=other_id)
+
+    page = _sync(client, world.foodbank)
+    listed = client.get("/api/requests", headers=world.foodbank).json()
+    assert [row["id"] for row in page["requests"]] == [pending["id"]] == [row["id"] for row in listed]
+    assert [row["request_id"] for row in page["request_items"]] == [pending["id"]]
+
+
+def test_request_leaving_scope_sends_tombstone(client, world, db):
+    other_id = _other_foodbank(db, "Klang")
+    request = create_request(client, world.recipient, [(world.rice_id, 1)])
+    cursor = _sync(client, world.foodbank)["cursor"]
+
+    _move(db, request["id"], status="Assigned", assigned_to_id=other_id)
+    page = _sync(client, world.foodbank, cursor)
+    assert page["requests"] == []
+    assert [(row["table"], row["id"]) for row in page["deleted"]] == [("requests", request["id"])]
+    # The new assignee gets the row itself, not the tombstone
+    other = _sync(client, auth_headers("foodbank2"))
+    assert [row["id"] for row in other["requests"]] == [request["id"]]
+    assert other["deleted"] == []
+
+    # Back in view: the row again, and the stale tombstone is not replayed
+    _move(db, request["id"], assigned_to_id=world.foodbank_id)
+    page = _sync(client, world.foodbank, cursor)
+    assert [row["id"] for row in page["requests"]] == [request["id"]]
+    assert page["deleted"] == []
+
+
+def test_recipient_never_gets_scope_tombstones(client, world, db):
+    request = create_request(client, world.recipient, [(world.rice_id, 1)])
+    _move(db, request["id"], status="Assigned", assigned_to_id=world.foodbank_id)
+
+    page = _sync(client, world.recipient)
+    assert [row["id"] for row in page["requests"]] == [request["id"]]
+    assert page["deleted"] == []
+
+
+def test_cursor_waits_for_uncommitted_changes(client, world):
+    if engine.dialect.name != "postgresql":
+        pytest.skip("SQLite writers commit in change_seq order")
+    first = create_request(client, world.recipient, [(world.rice_id, 1)])
+    cursor = _sync(client, world.recipient)["cursor"]
+
+    # An older transaction takes a change_seq, a newer one commits a higher one
+    with engine.connect() as conn:
+        transaction = conn.begin()
+        conn.execute(text("UPDATE requests SET location = 'Jalan 3' WHERE id = :id"), {"id": first["id"]})
+        second = create_request(client, world.recipient, [(world.rice_id, 2)])
+        page = _sync(client, world.recipient, cursor)
+        assert page["requests"] == [] and page["cursor"] == cursor
+        transaction.commit()
+
+    page = _sync(client, world.recipient, cursor)
+    assert sorted(row["id"] for row in page["requests"]) == [first["id"], second["id"]]
@@ -0,0 +1,30 @@
+import random
+
+import triage
+from conftest import create_request
+
+
+def test_baby_items_move_a_request_up(client, world):
+    older = create_request(client, world.recipient, [(world.rice_id, 1)])
+    baby = create_request(client, world.recipient, [(world.formula_id, 1)])
+
+    queue = client.get("/api/requests/triage?k=5", headers=world.org).json()
+    assert queue["total_pending"] == 2
+    assert [(row["id"], row["has_baby_items"]) for row in queue["requests"]] == [
+        (baby["id"], True), (older["id"], False)
+    ]
+
+
+def test_smallest_across_heaps_matches_sorting():
+    rng = random.Random(48)
+    heaps, entries = [], []
+    for district in range(5):
+        heap = triage.IndexedHeap()
+        for number in range(rng.randint(0, 40)):
+            request_id = district * 1000 + number
+            key = rng.random()
+            heap.push(request_id, key)
+            entries.append((key, request_id))
+        heaps.append(heap)
+
+    assert triage.smallest(heaps, 25) == sorted(entries)[:25]
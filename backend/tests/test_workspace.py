@@ -0,0 +1,42 @@
+import models
+from conftest import create_request
+
+
+def _workspace(client, world):
+    response = client.get("/api/foodbanks/me/workspace", headers=world.foodbank)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_workspace_reflects_writes_before_the_ttl(client, world, db):
+    request = create_request(client, world.recipient, [(world.rice_id, 2)])
+    assert _workspace(client, world)["counters"]["pending_requests"] == 1
+
+    # A write that skips the invalidation hooks is served from the cache until the TTL
+    db.query(models.Request).filter(models.Request.id == request["id"]).update(
+        {"location": "Jalan 99"}, synchronize_session=False
+    )
+    db.commit()
+    assert [row["location"] for row in _workspace(client, world)["requests"]] == ["Jalan 2"]
+
+    client.post(f"/api/foodbanks/{world.foodbank_id}/inventory",
+                json={"food_item_id": world.rice_id, "quantity": 10}, headers=world.foodbank)
+    workspace = _workspace(client, world)
+    assert [(row["quantity"], row["reserved"]) for row in workspace["inventory"]] == [(10, 0)]
+    assert [row["location"] for row in workspace["requests"]] == ["Jalan 99"]
+
+    response = client.put(f"/api/requests/{request['id']}", json={"assigned_to_id": world.foodbank_id},
+                          headers=world.org)
+    assert response.status_code == 200, response.text
+    workspace = _workspace(client, world)
+    assert (workspace["counters"]["pending_requests"], workspace["counters"]["assigned_requests"]) == (0, 1)
+    assert [(row["quantity"], row["reserved"]) for row in workspace["inventory"]] == [(10, 2)]
+    assert [row["status"] for row in workspace["requests"]] == ["Assigned"]
+
+
+def test_new_submission_in_the_district_refreshes_the_workspace(client, world):
+    assert _workspace(client, world)["requests"] == []
+    create_request(client, world.recipient, [(world.rice_id, 1)])
+    create_request(client, world.recipient, [(world.rice_id, 1)], district="Klang")
+
+    assert _workspace(client, world)["counters"]["pending_requests"] == 1
@@ -0,0 +1,321 @@
+import heapq
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+import models
+import reference
+import shards
+import sync
+
+# Priority is "effective waiting time": age plus fixed bonuses. Because every
+# request ages at the same rate, ordering by created_at minus the bonuses is
+# the same ordering at any moment, so heap keys never need to be re-scored.
+BABY_CATEGORY = "Baby"
+BABY_BONUS_SECONDS = 24 * 60 * 60
+# Total requested quantity stands in for household size
+HOUSEHOLD_BONUS_SECONDS_PER_UNIT = 30 * 60
+HOUSEHOLD_BONUS_MAX_SECONDS = 12 * 60 * 60
+
+# Deltas are read by change_seq up to sync.change_seq_horizon(), so values
+# that commit out of order on PostgreSQL are not skipped; the periodic full
+# reload bounds drift from anything else
+FULL_RELOAD_SECONDS = 10 * 60
+ID_BATCH_SIZE = 500
+
+
+def _epoch(value: datetime) -> float:
+    # SQLite returns naive UTC timestamps
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _has_baby_item():
+    # Food items live on the primary, so the category comes from the reference
+    # cache rather than a join; new Baby items count once the cache reloads
+    baby_ids = [item.id for item in reference.food_items() if item.category == BABY_CATEGORY]
+    return func.max(case((models.RequestItem.food_item_id.in_(baby_ids), 1), else_=0))
+
+
+def priority_key(created_at: datetime, has_baby_items: bool, total_quantity: int) -> float:
+    """
+    Heap key of a pending request: lower is more urgent.
+    """
+    bonus = min(total_quantity * HOUSEHOLD_BONUS_SECONDS_PER_UNIT, HOUSEHOLD_BONUS_MAX_SECONDS)
+    if has_baby_items:
+        bonus += BABY_BONUS_SECONDS
+    return _epoch(created_at) - bonus
+
+
+class IndexedHeap:
+    """
+    Binary min-heap of (key, request_id) with a position index, so an entry
+    can be updated or removed in O(log n) instead of lazily.
+    """
+
+    def __init__(self):
+        self.heap: List[Tuple[float, int]] = []
+        self.positions: Dict[int, int] = {}
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, request_id: int):
+        return request_id in self.positions
+
+    def _swap(self, i: int, j: int):
+        heap = self.heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self.positions[heap[i][1]] = i
+        self.positions[heap[j][1]] = j
+
+    def _sift_up(self, i: int):
+        while i > 0:
+            parent = (i - 1) // 2
+            if self.heap[i] >= self.heap[parent]:
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i: int):
+        size = len(self.heap)
+        while True:
+            smallest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < size and self.heap[child] < self.heap[smallest]:
+                    smallest = child
+            if smallest == i:
+                return
+            self._swap(i, smallest)
+            i = smallest
+
+    def push(self, request_id: int, key: float):
+        position = self.positions.get(request_id)
+        if position is not None:
+            old_key = self.heap[position][0]
+            self.heap[position] = (key, request_id)
+            if key < old_key:
+                self._sift_up(position)
+            else:
+                self._sift_down(position)
+            return
+        self.heap.append((key, request_id))
+        self.positions[request_id] = len(self.heap) - 1
+        self._sift_up(len(self.heap) - 1)
+
+    def remove(self, request_id: int):
+        position = self.positions.pop(request_id, None)
+        if position is None:
+            return
+        last = self.heap.pop()
+        if position < len(self.heap):
+            self.heap[position] = last
+            self.positions[last[1]] = position
+            self._sift_up(position)
+            self._sift_down(self.positions[last[1]])
+
+
+def smallest(heaps: Iterable[IndexedHeap], k: int) -> List[Tuple[float, int]]:
+    """
+    The k smallest entries across `heaps` without popping them: a frontier
+    heap walks each heap's tree from the root, so the cost is O(k log k) plus
+    one entry per heap, independent of the backlog size.
+    """
+    heaps = [heap for heap in heaps if heap.heap]
+    frontier = [(heap.heap[0], index, 0) for index, heap in enumerate(heaps)]
+    heapq.heapify(frontier)
+    result = []
+    while frontier and len(result) < k:
+        entry, index, position = heapq.heappop(frontier)
+        result.append(entry)
+        tree = heaps[index].heap
+        for child in (2 * position + 1, 2 * position + 2):
+            if child < len(tree):
+                heapq.heappush(frontier, (tree[child], index, child))
+    return result
+
+
+class TriageIndex:
+    """
+    Pending requests per district in indexed heaps. Each worker keeps its own
+    copy and catches up on creates, assignments, fulfilments and deletes by
+    reading rows whose change_seq moved past its cursor, so writes made by
+    other workers are seen on the next read.
+    """
+
+    def __init__(self):
+        self.heaps: Dict[str, IndexedHeap] = {}
+        self.districts: Dict[int, str] = {}
+        self.cursor: Optional[int] = None
+        self.loaded_at = 0.0
+        self.lock = threading.Lock()
+
+    def _current_seq(self, db: Session) -> int:
+        horizon = sync.change_seq_horizon(db)
+        if horizon is not None:
+            return horizon
+        return max(
+            db.query(func.max(models.Request.change_seq)).scalar() or 0,
+            db.query(func.max(models.RequestItem.change_seq)).scalar() or 0,
+            db.query(func.max(models.SyncTombstone.change_seq)).scalar() or 0,
+        )
+
+    def _pending_rows(self, db: Session, request_ids: Optional[List[int]] = None):
+        query = db.query(
+            models.Request.id,
+            models.Request.district,
+            models.Request.created_at,
+            _has_baby_item(),
+            func.coalesce(func.sum(models.RequestItem.quantity), 0)
+        ).outerjoin(
+            models.RequestItem, models.RequestItem.request_id == models.Request.id
+        ).filter(models.Request.status == "Pending")
+        if request_ids is not None:
+            query = query.filter(models.Request.id.in_(request_ids))
+        return query.group_by(models.Request.id).all()
+
+    def _upsert(self, request_id: int, district: str, key: float):
+        previous = self.districts.get(request_id)
+        if previous is not None and previous != district:
+            self.heaps[previous].remove(request_id)
+        self.heaps.setdefault(district, IndexedHeap()).push(request_id, key)
+        self.districts[request_id] = district
+
+    def _remove(self, request_id: int):
+        district = self.districts.pop(request_id, None)
+        if district is not None:
+            self.heaps[district].remove(request_id)
+
+    def _load(self, db: Session):
+        # Read the cursor first: changes made during the load are replayed next time
+        cursor = self._current_seq(db)
+        self.heaps, self.districts = {}, {}
+        for request_id, district, created_at, has_baby, quantity in self._pending_rows(db):
+            if created_at is not None:
+                self._upsert(request_id, district, priority_key(created_at, bool(has_baby), int(quantity)))
+        self.cursor = cursor
+        self.loaded_at = time.monotonic()
+
+    def _catch_up(self, db: Session):
+        cursor = self.cursor
+        horizon = sync.change_seq_horizon(db)
+        changed = db.query(models.Request.id, models.Request.change_seq).filter(
+            *sync.changed_after(models.Request.change_seq, cursor, horizon)
+        ).all()
+        changed_items = db.query(models.RequestItem.request_id, models.RequestItem.change_seq).filter(
+            *sync.changed_after(models.RequestItem.change_seq, cursor, horizon)
+        ).all()
+        deleted = db.query(models.SyncTombstone.row_id, models.SyncTombstone.change_seq).filter(
+            models.SyncTombstone.table_name == "requests",
+            *sync.changed_after(models.SyncTombstone.change_seq, cursor, horizon)
+        ).all()
+
+        for request_id, _ in deleted:
+            self._remove(request_id)
+
+        request_ids = sorted({row[0] for row in changed} | {row[0] for row in changed_items})
+        for start in range(0, len(request_ids), ID_BATCH_SIZE):
+            batch = request_ids[start:start + ID_BATCH_SIZE]
+            pending = set()
+            for request_id, district, created_at, has_baby, quantity in self._pending_rows(db, batch):
+                if created_at is not None:
+                    pending.add(request_id)
+                    self._upsert(request_id, district, priority_key(created_at, bool(has_baby), int(quantity)))
+            # Assigned, fulfilled, cancelled or otherwise no longer pending
+            for request_id in batch:
+                if request_id not in pending:
+                    self._remove(request_id)
+
+        self.cursor = max([cursor] + [row[1] for row in changed + changed_items + deleted])
+
+    def top(self, db: Session, k: int, district: Optional[str] = None) -> Tuple[List[Tuple[float, int]], int]:
+        """
+        The k most urgent pending requests (optionally in one district) as
+        (key, request_id), and the number of pending requests considered.
+        """
+        with self.lock:
+            if self.cursor is None or time.monotonic() - self.loaded_at > FULL_RELOAD_SECONDS:
+                self._load(db)
+            else:
+                self._catch_up(db)
+            if district is not None:
+                heaps = [self.heaps[district]] if district in self.heaps else []
+            else:
+                heaps = list(self.heaps.values())
+            return smallest(heaps, k), sum(len(heap) for heap in heaps)
+
+
+# One index per shard, created on first use
+indexes: Dict[int, TriageIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def _index(shard: int) -> TriageIndex:
+    with _indexes_lock:
+        return indexes.setdefault(shard, TriageIndex())
+
+
+def _request_rows(db: Session, entries: List[Tuple[float, int]]) -> dict:
+    if not entries:
+        return {}
+    return {
+        row[0]: row for row in db.query(
+            models.Request.id,
+            models.Request.tracking_number,
+            models.Request.location,
+            models.Request.district,
+            models.Request.created_at,
+            func.count(models.RequestItem.id),
+            func.coalesce(func.sum(models.RequestItem.quantity), 0),
+            _has_baby_item()
+        ).outerjoin(
+            models.RequestItem, models.RequestItem.request_id == models.Request.id
+        ).filter(
+            models.Request.id.in_([request_id for _, request_id in entries])
+        ).group_by(models.Request.id).all()
+    }
+
+
+def top_requests(db: Session, k: int, district: Optional[str] = None) -> dict:
+    """
+    Top-k pending requests with their scoring inputs, most urgent first.
+    Each shard's index is read in parallel and the k smallest keys are kept.
+    """
+    def shard_top(shard_db: Session):
+        entries, total = _index(shards.current(shard_db)).top(shard_db, k, district)
+        return entries, total, _request_rows(shard_db, entries)
+
+    targets = [shards.shard_for_district(district)] if district is not None else None
+    results = list(shards.fan_out(shard_top, targets, db=db).values())
+    entries = heapq.nsmallest(k, (entry for shard_entries, _, _ in results for entry in shard_entries))
+    total = sum(shard_total for _, shard_total, _ in results)
+    rows = {}
+    for _, _, shard_rows in results:
+        rows.update(shard_rows)
+    if not entries:
+        return {"requests": [], "total_pending": total}
+    now = time.time()
+    requests = []
+    for key, request_id in entries:
+        row = rows.get(request_id)
+        # Deleted between the index read and this query
+        if row is None:
+            continue
+        _, tracking_number, location, district_name, created_at, item_count, total_quantity, has_baby = row
+        requests.append({
+            "id": request_id,
+            "tracking_number": tracking_number,
+            "location": location,
+            "district": district_name,
+            "created_at": created_at,
+            "item_count": item_count,
+            "total_quantity": int(total_quantity),
+            "has_baby_items": bool(has_baby),
+            "priority_hours": round((now - key) / 3600, 2),
+        })
+    return {"requests": requests, "total_pending": total}
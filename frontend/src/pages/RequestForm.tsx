@@ -13,6 +13,8 @@ const RequestForm = () => {
   const [error, setError] = useState<string | null>(null);
   const [success, setSuccess] = useState(false);
   const [trackingNumber, setTrackingNumber] = useState<string | null>(null);
+  // Reused when a failed submission is retried, so the backend never creates it twice
+  const [idempotencyKey, setIdempotencyKey] = useState(() => crypto.randomUUID());
   
   const navigate = useNavigate();
   const { t } = useTranslation();
@@ -98,9 +100,10 @@ const RequestForm = () => {
         latitude: formData.latitude || 0,
         longitude: formData.longitude || 0,
         items: formData.items
-      });
+      }, idempotencyKey);
       
       setSuccess(true);
+      setIdempotencyKey(crypto.randomUUID());
       
       // Store the tracking number from the response
       if (response && response.tracking_number) {
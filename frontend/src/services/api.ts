@@ -5,6 +5,7 @@ import {
   InventoryItem,
   FoodBank,
   FoodBankWithInventory,
+  FoodbankWorkspace,
   Request,
   District,
   DashboardStats,
@@ -98,6 +99,12 @@ export const getFoodbank = async (id: number): Promise<FoodBankWithInventory> =>
   return response.data;
 };
 
+// Foodbank, inventory and request summaries for the logged-in foodbank admin in one call
+export const getFoodbankWorkspace = async (): Promise<FoodbankWorkspace> => {
+  const response = await api.get<FoodbankWorkspace>('/foodbanks/me/workspace');
+  return response.data;
+};
+
 // Inventory
 export const getFoodbankInventory = async (foodbankId: number): Promise<InventoryItem[]> => {
   const response = await api.get<InventoryItem[]>(`/foodbanks/${foodbankId}/inventory`);
@@ -174,8 +181,9 @@ export const createPublicRequest = async (requestData: {
   latitude: number;
   longitude: number;
   items: Array<{ food_item_id: number; quantity: number }>;
-}): Promise<any> => {
-  const response = await publicApi.post('/public/requests', requestData);
+}, idempotencyKey?: string): Promise<any> => {
+  const headers = idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {};
+  const response = await publicApi.post('/public/requests', requestData, { headers });
   return response.data;
 };
 
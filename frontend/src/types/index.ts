@@ -21,6 +21,7 @@ export interface InventoryItem {
   food_item: FoodItem;
   quantity: number;
   last_updated: string;
+  version: number;
 }
 
 export interface FoodBank {
@@ -58,9 +59,36 @@ export interface Request {
   assigned_to_id: number | null;
   created_at: string;
   fulfilled_at: string | null;
+  version: number;
   request_items: RequestItem[];
 }
 
+export interface RequestSummary {
+  id: number;
+  tracking_number: string;
+  status: 'Pending' | 'Assigned';
+  location: string;
+  district: string;
+  latitude: number | null;
+  longitude: number | null;
+  created_at: string;
+  item_count: number;
+  total_quantity: number;
+}
+
+export interface FoodbankWorkspace {
+  foodbank: FoodBank;
+  inventory: InventoryItem[];
+  requests: RequestSummary[];
+  counters: {
+    pending_requests: number;
+    assigned_requests: number;
+    fulfilled_requests: number;
+    inventory_items: number;
+    out_of_stock_items: number;
+  };
+}
+
 export interface District {
   id: number;
   name: string;